@@ -6,8 +6,10 @@ from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel
+from app.core.config import settings
+from app.core.password_hashing import password_hasher, pwd_context
+from app.core.principal_cache import PrincipalCache
 from app.db.database import get_users_collection
 
 # JWT Configuration
@@ -15,16 +17,17 @@ SECRET_KEY = "your-secret-key-change-this-in-production"  # TODO: Move to enviro
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Security scheme
 security = HTTPBearer()
 
+# Verified users, so most requests skip the users lookup
+principal_cache = PrincipalCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
+
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
 
 class TokenData(BaseModel):
@@ -62,7 +65,7 @@ async def register_user(username: str, password: str, email: Optional[str] = Non
     
     # Create new user
     user_id = f"user_{username}_{datetime.now(timezone.utc).timestamp()}"
-    hashed_password = get_password_hash(password)
+    hashed_password = await password_hasher.hash(password)
     
     user_doc = {
         "user_id": user_id,
@@ -92,12 +95,31 @@ async def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
         hashed_password=user_doc["hashed_password"]
     )
     
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
         return None
     
+    if new_hash:
+        # Stored hash uses an outdated cost; upgrade it while we have the password
+        await users_collection.update_one({"user_id": user.user_id}, {"$set": {"hashed_password": new_hash}})
+        user.hashed_password = new_hash
+    
     return user
 
 
+def user_claims(user: User) -> dict:
+    """Token claims for a user. username/email let claims-only mode skip the users lookup."""
+    return {"sub": user.user_id, "username": user.username, "email": user.email}
+
+
+def invalidate_user(user_id: str):
+    """Drop a user's cached principal. Call after changing or deleting the user.
+
+    Tokens verified in claims-only mode stay valid until they expire.
+    """
+    principal_cache.invalidate(user_id)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -110,6 +132,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> Optional[str]:
+    """User ID of a valid, unexpired access token, or None."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
     """Get the current authenticated user from the JWT token."""
     credentials_exception = HTTPException(
@@ -128,18 +159,33 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except JWTError:
         raise credentials_exception
     
+    # Trust the signed claims for the token's lifetime (tokens issued before
+    # claims carried the username still go through the lookup below)
+    if settings.AUTH_CLAIMS_ONLY and "username" in payload:
+        principal_cache.claims_only += 1
+        return User(user_id=token_data.user_id, username=payload["username"], email=payload.get("email"))
+    
+    cached_user = principal_cache.get(token_data.user_id)
+    if cached_user is not None:
+        return cached_user
+    
     # Find user in MongoDB
     users_collection = get_users_collection()
-    user_doc = await users_collection.find_one({"user_id": token_data.user_id})
+    user_doc = await users_collection.find_one(
+        {"user_id": token_data.user_id},
+        {"user_id": 1, "username": 1, "email": 1},
+    )
     
     if not user_doc:
         raise credentials_exception
     
-    return User(
+    user = User(
         user_id=user_doc["user_id"],
         username=user_doc["username"],
         email=user_doc.get("email")
     )
+    principal_cache.put(user.user_id, user)
+    return user
 
 
 async def get_current_user_id(current_user: User = Depends(get_current_user)) -> str:
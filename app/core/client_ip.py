@@ -0,0 +1,31 @@
+"""
+The client address used for per-IP limits.
+
+Behind a reverse proxy the socket peer is the proxy, so every client would
+share one login window and one quote bucket. With TRUSTED_PROXY_HOPS set to
+the number of proxies in front of the app, the address is read from
+X-Forwarded-For instead: each proxy appends the address it received the
+request from, so the entry that many places from the right was written by
+our outermost proxy and can't be forged by the client (anything further
+left can). Without the header, or with fewer entries than hops, the peer
+address is used.
+"""
+from fastapi import Request
+
+from app.core.config import settings
+
+
+def client_ip(request: Request, trusted_hops: int | None = None) -> str:
+    hops = settings.TRUSTED_PROXY_HOPS if trusted_hops is None else trusted_hops
+    peer = request.client.host if request.client else "unknown"
+    if hops <= 0:
+        return peer
+    forwarded = [
+        address.strip()
+        for header in request.headers.getlist("x-forwarded-for")
+        for address in header.split(",")
+        if address.strip()
+    ]
+    if len(forwarded) < hops:
+        return peer
+    return forwarded[-hops]
@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 from pathlib import Path
 
@@ -11,12 +12,74 @@ class Settings(BaseSettings):
     # Database
     MONGO_CONNECTION_STRING: str
     MONGO_DB_NAME: str
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 5  # Connections opened at startup
     
     # Price Service APIs
     FINNHUB_API_KEY: str
     EXCHANGE_RATE_API_KEY: str
     EXCHANGE_RATE_PROVIDER: str = "exchangerate-api"  # exchangerate-api, fixer, currencyapi
     USE_MOCK_PRICES: bool = False  # Default to real Finnhub
+    HTTP_POOL_SIZE: int = 10  # Keep-alive connections per upstream host
+    FINNHUB_CALLS_PER_MINUTE: int = 60
+    FINNHUB_CALLS_PER_MONTH: Optional[int] = None  # Free tier has no monthly cap
+    EXCHANGE_RATE_CALLS_PER_MONTH: Optional[int] = 1500
+    QUOTA_DB_PATH: str = str(PROJECT_ROOT / "data" / "quota.sqlite3")  # Upstream call counts, kept across restarts
+    CACHE_SNAPSHOT_PATH: str = str(PROJECT_ROOT / "data" / "price_cache.json.gz")  # Quote/FX caches, restored on startup
+    CACHE_SNAPSHOT_INTERVAL_SECONDS: int = 300  # Also written on shutdown; 0 writes only then
+    CACHE_REVALIDATE_PER_MINUTE: int = 10  # Stale restored quotes refreshed in the background; 0 disables
+    BREAKER_FAILURE_THRESHOLD: int = 5  # Consecutive upstream failures that open a provider's circuit
+    BREAKER_RESET_SECONDS: float = 5.0  # First open period; doubles on each failed probe
+    BREAKER_MAX_RESET_SECONDS: float = 300.0
+    QUOTE_HEDGE_PERCENTILE: Optional[float] = None  # e.g. 95: re-send quote requests slower than p95 (uses quota)
+    QUOTE_REQUESTS_PER_MINUTE_PER_USER: int = 60  # Beyond these, quotes are served from cache only
+    QUOTE_REQUESTS_PER_MINUTE_PER_IP: int = 120
+    QUOTE_BURST: int = 20
+    QUOTE_MAX_UPSTREAM_CONCURRENCY: int = 4  # Quote requests waiting on Finnhub/FX at once
+
+    # Authentication
+    AUTH_CACHE_TTL_SECONDS: int = 60  # How long a verified user is trusted without a DB lookup
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_CLAIMS_ONLY: bool = False  # Trust signed token claims, no DB lookup at all
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    BCRYPT_ROUNDS: int = 12  # Changing it rehashes passwords on their next login
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_LIMIT: int = 16  # Hashes allowed to wait for a worker
+    LOGIN_ATTEMPTS_PER_IP: int = 20
+    LOGIN_FAILURES_PER_USERNAME: int = 5
+    LOGIN_THROTTLE_WINDOW_SECONDS: int = 300
+
+    # Reverse proxy
+    TRUSTED_PROXY_HOPS: int = 0  # Proxies in front of the app that append to X-Forwarded-For (1 on Render)
+
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_SAMPLE_RATE: float = 0.01  # Share of high-volume messages (cache hits) that are logged
+    LOG_QUEUE_SIZE: int = 10000  # Records waiting for the writer thread before new ones are dropped
+
+    # Event-loop monitoring
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL_MS: int = 100
+    LOOP_BLOCK_THRESHOLD_MS: int = 100  # Stalls longer than this are recorded with their stack
+
+    # Request profiling (off unless a token or sample rate is set)
+    PROFILING_TOKEN: Optional[str] = None  # Requests sending it in X-Profile-Token are profiled
+    PROFILING_SAMPLE_RATE: float = 0.0  # Share of all requests profiled
+    PROFILING_INTERVAL_MS: float = 1.0
+    PROFILING_PROFILES_PER_ROUTE: int = 20
+
+    # Journal search
+    SEARCH_INDEX_MAX_USERS: int = 200  # Users whose notes index is kept in memory
+
+    # Scheduled jobs (one worker runs each slot)
+    SCHEDULER_ENABLED: bool = True
+    MARKET_TIMEZONE: str = "Asia/Kolkata"
+    MARKET_OPEN_TIME: str = "09:15"  # A snapshot missed while down is written late only before the next open
+    MARKET_CLOSE_TIME: str = "15:30"  # Daily portfolio snapshots are written at the close, Monday to Friday
+
+    # Historical candles (MAE/MFE analysis)
+    CANDLE_STORE_DIR: str = str(PROJECT_ROOT / "data" / "candles")
+    CANDLE_RESOLUTION: str = "D"
 
     # Pydantic v2 style model config
     model_config = {
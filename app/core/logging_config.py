@@ -0,0 +1,120 @@
+"""
+Structured logging that never blocks the caller.
+
+Loggers under `app` hand records to a bounded queue; a background listener
+thread formats them as JSON lines and writes them to stdout. If the queue
+is full, the record is dropped and counted rather than waiting on I/O.
+
+High-volume messages (cache hits and the like) pass a `sample_rate` in
+`extra` and only that fraction is kept. Other `extra` fields become JSON
+keys:
+
+    logger.debug("Quote cache hit", extra={"ticker": ticker, "sample_rate": LOG_SAMPLE_RATE})
+"""
+import atexit
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+import orjson
+
+from app.core.config import settings
+
+LOG_SAMPLE_RATE = settings.LOG_SAMPLE_RATE
+
+# LogRecord attributes that aren't user-supplied `extra` fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample_rate"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        return rate is None or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now, while their arguments are
+        # still current; formatting into JSON happens on the listener thread.
+        # This is the only handler on `app`, so the record is changed in place
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging():
+    """Route `app.*` loggers through the queue and start the writer thread (idempotent)."""
+    global _handler, _listener
+    if _handler is None:
+        log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        _handler = NonBlockingQueueHandler(log_queue)
+        _handler.addFilter(SamplingFilter())
+
+        # Per-record fields the JSON output doesn't use
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+
+        app_logger = logging.getLogger("app")
+        app_logger.setLevel(settings.LOG_LEVEL.upper())
+        app_logger.addHandler(_handler)
+        app_logger.propagate = False
+        atexit.register(shutdown_logging)
+
+    if _listener is None:
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter())
+        _listener = QueueListener(_handler.queue, stream)
+        _listener.start()
+
+
+def shutdown_logging():
+    """Write out what is queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_status() -> dict:
+    return {
+        "level": logging.getLevelName(logging.getLogger("app").level),
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+    }
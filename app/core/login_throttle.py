@@ -0,0 +1,89 @@
+"""
+Login admission control, checked before any password hashing.
+
+Two sliding windows: attempts per client IP, which caps login storms, and
+failed attempts per username, which slows password guessing against a
+single account. A successful login clears the username's failures.
+"""
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.core.config import settings
+
+
+class SlidingWindowCounter:
+    def __init__(self, limit: int, window_seconds: float, max_keys: int = 100000):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._events: Dict[str, Deque[float]] = {}
+
+    def _prune(self, key: str, now: float) -> Deque[float]:
+        events = self._events.get(key)
+        if events is None:
+            return deque()
+        while events and events[0] <= now - self.window_seconds:
+            events.popleft()
+        if not events:
+            del self._events[key]
+        return events
+
+    def retry_after(self, key: str) -> Optional[float]:
+        """Seconds until `key` is under its limit again, or None if it is now."""
+        now = time.monotonic()
+        events = self._prune(key, now)
+        if len(events) < self.limit:
+            return None
+        return events[0] + self.window_seconds - now
+
+    def add(self, key: str):
+        if key not in self._events and len(self._events) >= self.max_keys:
+            # Bound memory under a flood of distinct keys: forget the oldest key
+            self._events.pop(next(iter(self._events)))
+        self._events.setdefault(key, deque()).append(time.monotonic())
+
+    def reset(self, key: str):
+        self._events.pop(key, None)
+
+    def __len__(self):
+        return len(self._events)
+
+
+class LoginThrottle:
+    def __init__(self, attempts_per_ip: int, failures_per_username: int, window_seconds: float):
+        self.ip_attempts = SlidingWindowCounter(attempts_per_ip, window_seconds)
+        self.username_failures = SlidingWindowCounter(failures_per_username, window_seconds)
+        self.rejected = 0
+
+    def check(self, username: str, ip: str) -> Optional[float]:
+        """Record an attempt; returns seconds to wait if it must be rejected."""
+        wait = self.username_failures.retry_after(username.lower())
+        if wait is None:
+            wait = self.ip_attempts.retry_after(ip)
+        if wait is not None:
+            self.rejected += 1
+            return wait
+        self.ip_attempts.add(ip)
+        return None
+
+    def record_failure(self, username: str):
+        self.username_failures.add(username.lower())
+
+    def record_success(self, username: str):
+        self.username_failures.reset(username.lower())
+
+    def get_status(self) -> dict:
+        return {
+            "tracked_ips": len(self.ip_attempts),
+            "tracked_usernames": len(self.username_failures),
+            "rejected": self.rejected,
+        }
+
+
+# Singleton instance
+login_throttle = LoginThrottle(
+    settings.LOGIN_ATTEMPTS_PER_IP,
+    settings.LOGIN_FAILURES_PER_USERNAME,
+    settings.LOGIN_THROTTLE_WINDOW_SECONDS,
+)
@@ -0,0 +1,167 @@
+"""
+Opt-in sampling profiler for individual requests.
+
+A request is profiled when it carries `X-Profile-Token` matching
+PROFILING_TOKEN, or when it is picked at PROFILING_SAMPLE_RATE. While the
+request runs, a sampler thread reads the event-loop thread's stack every
+PROFILING_INTERVAL_MS. It keeps a sample only when this request's
+middleware frame is on that stack, so concurrent requests don't pollute
+each other's profiles. Time spent awaiting I/O or in thread-pool workers
+produces no samples, so the profile shows where the loop itself was busy.
+Busy Python code only yields the GIL every `sys.getswitchinterval()`
+(5 ms by default), which caps the effective sampling rate.
+
+Profiles are stored as collapsed stacks (one `frame;frame;frame count` line
+per distinct stack), which flamegraph.pl and speedscope read directly.
+When profiling is off, the middleware costs one branch per request.
+"""
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import route_template
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROFILE_HEADER = b"x-profile-token"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class RequestSampler:
+    """Samples the loop thread's stack, keeping frames above `root_frame`."""
+
+    def __init__(self, root_frame, thread_id: int, interval: float):
+        self.root_frame = root_frame
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0  # Including ones where another task was running
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            self.samples += 1
+            names = []
+            while frame is not None and frame is not self.root_frame:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            if frame is not None:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class ProfileStore:
+    """Most recent profiles per route."""
+
+    def __init__(self, per_route: int, max_routes: int = 200):
+        self.per_route = per_route
+        self.max_routes = max_routes
+        self._by_route: "OrderedDict[str, Deque[Dict]]" = OrderedDict()
+        self._ids = itertools.count(1)
+
+    def add(self, profile: Dict) -> Dict:
+        profile["id"] = next(self._ids)
+        route = profile["route"]
+        if route not in self._by_route and len(self._by_route) >= self.max_routes:
+            self._by_route.popitem(last=False)
+        self._by_route.setdefault(route, deque(maxlen=self.per_route)).append(profile)
+        self._by_route.move_to_end(route)
+        return profile
+
+    def list(self, route: Optional[str] = None) -> List[Dict]:
+        profiles = [
+            profile
+            for key, entries in self._by_route.items() if route is None or key == route
+            for profile in entries
+        ]
+        summaries = [{k: v for k, v in profile.items() if k != "stacks"} for profile in profiles]
+        return sorted(summaries, key=lambda p: p["id"], reverse=True)
+
+    def get(self, profile_id: int) -> Optional[Dict]:
+        for entries in self._by_route.values():
+            for profile in entries:
+                if profile["id"] == profile_id:
+                    return profile
+        return None
+
+
+def collapsed_stacks(profile: Dict) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].most_common())
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, store: ProfileStore):
+        self.app = app
+        self.store = store
+        self.token = settings.PROFILING_TOKEN.encode() if settings.PROFILING_TOKEN else None
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.interval = settings.PROFILING_INTERVAL_MS / 1000
+        self.enabled = bool(self.token) or self.sample_rate > 0
+
+    def _requested(self, scope) -> bool:
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        sampler = RequestSampler(sys._getframe(), threading.get_ident(), self.interval)
+        started_at = time.time()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            self.store.add({
+                "route": route_template(scope) or "unmatched",
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "started_at": started_at,
+                "wall_ms": round((time.perf_counter() - start) * 1000, 2),
+                "interval_ms": self.interval * 1000,
+                "samples": sampler.samples,
+                "loop_samples": sum(sampler.stacks.values()),
+                "stacks": sampler.stacks,
+            })
+
+
+# Singleton instance
+profile_store = ProfileStore(settings.PROFILING_PROFILES_PER_ROUTE)
@@ -0,0 +1,104 @@
+"""
+Admission control for the quote endpoint, which spends the shared Finnhub budget.
+
+Each request takes a token from its user's bucket and from its client IP's
+bucket; buckets refill at a steady rate up to a burst size. Separately, at
+most QUOTE_MAX_UPSTREAM_CONCURRENCY quote requests may be waiting on the
+upstream providers at once. A request that is over either limit is not
+rejected: it is answered from the quote cache only, so dashboards keep
+working while a misbehaving client stops costing upstream calls.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+from app.core.config import settings
+
+
+class TokenBuckets:
+    """One token bucket per key, refilled at `rate` tokens per second up to `burst`."""
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> [tokens, last refill]; least recently used first
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def _refill(self, key: str) -> List[float]:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                # Bound memory under a flood of distinct keys; an evicted key starts full again
+                self._buckets.popitem(last=False)
+            bucket = self._buckets[key] = [float(self.burst), now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def has_token(self, key: str) -> bool:
+        return self._refill(key)[0] >= 1
+
+    def take(self, key: str) -> bool:
+        bucket = self._refill(key)
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class QuoteAdmission:
+    def __init__(self, per_user_per_minute: int, per_ip_per_minute: int, burst: int, max_upstream: int):
+        self.users = TokenBuckets(per_user_per_minute / 60, burst)
+        self.ips = TokenBuckets(per_ip_per_minute / 60, burst)
+        self.max_upstream = max_upstream
+        # Only touched from the event loop, so a plain counter is enough
+        self.upstream_in_flight = 0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.concurrency_limited = 0
+
+    def acquire(self, user_id: str, ip: str) -> bool:
+        """Admit a request to go upstream; call `release()` after it if True."""
+        # Both buckets are checked first and charged together, so a request one of
+        # them turns away costs the other nothing
+        if not (self.users.has_token(user_id) and self.ips.has_token(ip)):
+            self.rate_limited += 1
+            return False
+        if self.upstream_in_flight >= self.max_upstream:
+            self.concurrency_limited += 1
+            return False
+        self.users.take(user_id)
+        self.ips.take(ip)
+        self.upstream_in_flight += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.upstream_in_flight -= 1
+
+    def get_status(self) -> Dict:
+        return {
+            "upstream_in_flight": self.upstream_in_flight,
+            "max_upstream": self.max_upstream,
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "concurrency_limited": self.concurrency_limited,
+            "tracked_users": len(self.users),
+            "tracked_ips": len(self.ips),
+        }
+
+
+# Singleton instance
+quote_admission = QuoteAdmission(
+    settings.QUOTE_REQUESTS_PER_MINUTE_PER_USER,
+    settings.QUOTE_REQUESTS_PER_MINUTE_PER_IP,
+    settings.QUOTE_BURST,
+    settings.QUOTE_MAX_UPSTREAM_CONCURRENCY,
+)
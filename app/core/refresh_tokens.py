@@ -0,0 +1,93 @@
+"""
+Rotating refresh tokens.
+
+A refresh token is an opaque random string; only its HMAC-SHA256 is stored
+(`refresh_tokens` collection, TTL-indexed on `expires_at`). Exchanging it at
+`/refresh` is an indexed lookup plus an HMAC, with no bcrypt. Each token is
+single use: it is marked used and a new token of the same family (login
+session) is issued. Presenting a used or revoked token means it was copied,
+so the whole family is revoked and that session has to log in again. A
+family's expiry is fixed at login and carried onto every rotated token, so
+a session lasts at most REFRESH_TOKEN_EXPIRE_DAYS however often it refreshes.
+"""
+import hashlib
+import hmac
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from app.core.auth import SECRET_KEY, User
+from app.core.config import settings
+from app.db.database import get_refresh_tokens_collection
+
+
+class RefreshTokenError(Exception):
+    """The refresh token is unknown, expired, revoked or was already used."""
+
+
+def _token_hash(token: str) -> str:
+    return hmac.new(SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
+async def issue_refresh_token(
+    user: User, family_id: Optional[str] = None, expires_at: Optional[datetime] = None
+) -> str:
+    """Create a refresh token for `user`, starting a new family unless one is given."""
+    token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    await get_refresh_tokens_collection().insert_one({
+        "token_hash": _token_hash(token),
+        "family_id": family_id or secrets.token_hex(16),
+        "user_id": user.user_id,
+        # Claims for the access tokens it mints, so refresh needs no users lookup
+        "username": user.username,
+        "email": user.email,
+        "created_at": now,
+        "expires_at": expires_at or now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        "used_at": None,
+        "revoked": False,
+    })
+    return token
+
+
+async def rotate_refresh_token(token: str) -> Tuple[User, str]:
+    """Consume a refresh token; returns (its user, replacement token)."""
+    collection = get_refresh_tokens_collection()
+    token_hash = _token_hash(token)
+    now = datetime.now(timezone.utc)
+
+    doc = await collection.find_one_and_update(
+        {"token_hash": token_hash, "used_at": None, "revoked": False, "expires_at": {"$gt": now}},
+        {"$set": {"used_at": now}},
+    )
+    if doc is None:
+        stale = await collection.find_one({"token_hash": token_hash}, {"family_id": 1, "used_at": 1, "revoked": 1})
+        if stale is not None and (stale.get("used_at") or stale.get("revoked")):
+            # Reuse of a rotated token: someone else may hold the family
+            await revoke_family(stale["family_id"])
+        raise RefreshTokenError("Invalid refresh token")
+
+    user = User(user_id=doc["user_id"], username=doc["username"], email=doc.get("email"))
+    new_token = await issue_refresh_token(user, family_id=doc["family_id"], expires_at=doc["expires_at"])
+    return user, new_token
+
+
+async def revoke_family(family_id: str):
+    await get_refresh_tokens_collection().update_many({"family_id": family_id}, {"$set": {"revoked": True}})
+
+
+async def revoke_refresh_token(token: str) -> bool:
+    """Revoke the session (family) a refresh token belongs to. Returns False if unknown."""
+    doc = await get_refresh_tokens_collection().find_one(
+        {"token_hash": _token_hash(token)}, {"family_id": 1}
+    )
+    if doc is None:
+        return False
+    await revoke_family(doc["family_id"])
+    return True
+
+
+async def revoke_user_sessions(user_id: str):
+    """Revoke every refresh token of a user (e.g. after a password change)."""
+    await get_refresh_tokens_collection().update_many({"user_id": user_id}, {"$set": {"revoked": True}})
+
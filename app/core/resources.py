@@ -0,0 +1,226 @@
+"""
+Process-wide resources, created and warmed in `lifespan`.
+
+Owns the MongoDB client (with a sized connection pool), the keep-alive HTTP
+session shared by the price services, and the service singletons. Startup
+pre-warms everything the first requests would otherwise pay for: the Mongo
+connection and indexes, the upstream quota ledger, the price caches saved
+by the previous run, the USD/INR rate, the bcrypt backend and the stop-loss
+and live P&L indexes. Each step is timed; `/ready` reports the result and
+stays 503 until the database is reachable. If it isn't at boot, a background
+task keeps pinging it with exponential backoff and runs the database steps
+once it answers. Once the database is up, the job scheduler starts.
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import requests
+from fastapi.concurrency import run_in_threadpool
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+from app.core.password_hashing import password_hasher
+from app.db import database
+from app.services.alert_service import stop_loss_index
+from app.services.backtest_service import shutdown_process_pool
+from app.services.cache_snapshot import cache_snapshotter
+from app.services.event_bus import event_bus
+from app.services.exchange_rate_service import get_exchange_rate_service
+from app.services.finnhub_service import FinnhubService, get_finnhub_service
+from app.services.live_pnl import live_pnl
+from app.services.loop_monitor import loop_monitor
+from app.services.portfolio_history_service import write_portfolio_snapshots
+from app.services.quota_service import QuotaLedger, close_quota_ledger, get_quota_ledger
+from app.services.scheduler import scheduler, weekdays_at
+from app.services.trade_close_service import recover_pending_closes
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_INITIAL_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+
+def create_http_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class Resources:
+    def __init__(self):
+        self.http_session: Optional[requests.Session] = None
+        self.finnhub: Optional[FinnhubService] = None
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.startup_ms: Optional[float] = None
+        self.steps: Dict[str, Dict] = {}
+        self.reconnect_attempts = 0
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    async def _step(self, name: str, action: Callable[[], Awaitable]) -> bool:
+        """Run one startup step, recording its duration and any error."""
+        start = time.perf_counter()
+        try:
+            await action()
+            self.steps[name] = {"ok": True}
+        except Exception as e:
+            self.steps[name] = {"ok": False, "error": str(e)}
+            logger.warning("Startup step failed", extra={"step": name, "error": str(e)})
+        self.steps[name]["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return self.steps[name]["ok"]
+
+    def _open_quota_ledger(self) -> Optional[QuotaLedger]:
+        # Without the ledger the price services still work, just without persistent quotas
+        try:
+            ledger = get_quota_ledger()
+            self.steps["quota_ledger"] = {"ok": True}
+            return ledger
+        except (sqlite3.Error, OSError) as e:
+            self.steps["quota_ledger"] = {"ok": False, "error": str(e)}
+            logger.warning("Startup step failed", extra={"step": "quota_ledger", "error": str(e)})
+            return None
+
+    async def _connect_database(self):
+        database.init_database()
+        await database.get_database().command("ping")
+
+    async def _warm_exchange_rate(self):
+        if settings.USE_MOCK_PRICES:
+            return
+        exchange_rate_svc = get_exchange_rate_service(settings.EXCHANGE_RATE_API_KEY, settings.EXCHANGE_RATE_PROVIDER)
+        await run_in_threadpool(exchange_rate_svc.get_usd_to_inr_rate)
+
+    async def _warm_password_hashing(self):
+        # passlib resolves and self-tests the bcrypt backend on first use
+        await password_hasher.hash("warm-up")
+
+    async def _recover_pending_closes(self):
+        recovered = await recover_pending_closes(database.get_trades_collection())
+        if recovered:
+            logger.warning("Completed interrupted partial closes", extra={"recovered": recovered})
+
+    async def _load_stop_loss_index(self):
+        await stop_loss_index.load(database.get_trades_collection())
+
+    async def _load_live_pnl_index(self):
+        await live_pnl.load(database.get_trades_collection())
+
+    async def _write_portfolio_snapshots(self, slot: datetime) -> Dict:
+        return await write_portfolio_snapshots(
+            database.get_trades_collection(), database.get_portfolio_snapshots_collection(), slot
+        )
+
+    def _database_warmups(self) -> List[Awaitable[bool]]:
+        # Alerts fall back to querying MongoDB until the index is loaded
+        return [
+            self._step("mongo_indexes", database.ensure_indexes),
+            self._step("pending_closes", self._recover_pending_closes),
+            self._step("stop_loss_index", self._load_stop_loss_index),
+            self._step("live_pnl_index", self._load_live_pnl_index),
+        ]
+
+    def _database_ready(self):
+        self.ready = True
+        if settings.SCHEDULER_ENABLED:
+            self._start_scheduler()
+
+    async def _reconnect(self):
+        """Retry the database until it answers, then finish the startup it missed."""
+        delay = RECONNECT_INITIAL_DELAY
+        while True:
+            await asyncio.sleep(delay)
+            self.reconnect_attempts += 1
+            if await self._step("mongo_connect", self._connect_database):
+                break
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        await asyncio.gather(*self._database_warmups())
+        self._database_ready()
+        logger.info("Database reachable", extra={"attempts": self.reconnect_attempts, "steps": self.steps})
+
+    def _start_scheduler(self):
+        if "portfolio_snapshots" not in scheduler.jobs:
+            scheduler.add_job(
+                "portfolio_snapshots",
+                weekdays_at(settings.MARKET_CLOSE_TIME, settings.MARKET_TIMEZONE),
+                self._write_portfolio_snapshots,
+                # Until the next open, current marks are still the close being recorded
+                catch_up_until=weekdays_at(settings.MARKET_OPEN_TIME, settings.MARKET_TIMEZONE),
+            )
+        scheduler.start()
+
+    async def start(self):
+        start = time.perf_counter()
+        self.started_at = time.time()
+
+        self.http_session = create_http_session(settings.HTTP_POOL_SIZE)
+        ledger = self._open_quota_ledger()
+        self.finnhub = get_finnhub_service(settings.FINNHUB_API_KEY, self.http_session, ledger)
+        exchange_rate_svc = get_exchange_rate_service(
+            settings.EXCHANGE_RATE_API_KEY, settings.EXCHANGE_RATE_PROVIDER, self.http_session, ledger
+        )
+        if not settings.USE_MOCK_PRICES:
+            cache_snapshotter.attach(self.finnhub, exchange_rate_svc)
+            # Before any warm-up fetches, so a rate restored within its TTL isn't fetched again
+            await self._step("cache_snapshot", cache_snapshotter.restore)
+        event_bus.start()
+        if settings.LOOP_MONITOR_ENABLED:
+            loop_monitor.start()
+
+        database_ok = await self._step("mongo_connect", self._connect_database)
+        warmups = [
+            self._step("exchange_rate", self._warm_exchange_rate),
+            self._step("password_hashing", self._warm_password_hashing),
+        ]
+        if database_ok:
+            warmups.extend(self._database_warmups())
+        await asyncio.gather(*warmups)
+
+        if database_ok:
+            self._database_ready()
+        else:
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+        cache_snapshotter.start()
+        self.startup_ms = round((time.perf_counter() - start) * 1000, 1)
+        logger.info("Startup finished", extra={"startup_ms": self.startup_ms, "ready": self.ready, "steps": self.steps})
+
+    async def stop(self):
+        self.ready = False
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            await asyncio.gather(self._reconnect_task, return_exceptions=True)
+            self._reconnect_task = None
+        await scheduler.stop()
+        await loop_monitor.stop()
+        await event_bus.stop()
+        await cache_snapshotter.stop()
+        shutdown_process_pool()
+        password_hasher.shutdown()
+        if self.finnhub is not None:
+            self.finnhub.shutdown()
+        if self.http_session is not None:
+            self.http_session.close()
+            self.http_session = None
+        close_quota_ledger()
+        database.close_database()
+
+    def get_status(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "started_at": self.started_at,
+            "startup_ms": self.startup_ms,
+            "steps": self.steps,
+            "reconnect_attempts": self.reconnect_attempts,
+            "stop_loss_index_loaded": stop_loss_index.loaded,
+            "scheduler": scheduler.get_status(),
+            "cache_snapshot": cache_snapshotter.get_status(),
+        }
+
+
+# Singleton instance
+resources = Resources()
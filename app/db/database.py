@@ -1,17 +1,101 @@
 import motor.motor_asyncio
+from typing import Optional
+from pymongo.errors import CollectionInvalid
 from app.core.config import settings
+from app.core.metrics import MongoCommandMetrics
 
-client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGO_CONNECTION_STRING)
-database = client[settings.MONGO_DB_NAME]
+# Created by the resource container in `lifespan` (or lazily on first use
+# outside the app, e.g. in scripts), not at import time
+client: Optional[motor.motor_asyncio.AsyncIOMotorClient] = None
+database: Optional[motor.motor_asyncio.AsyncIOMotorDatabase] = None
+
+
+def init_database():
+    """Create the Motor client with the configured connection pool."""
+    global client, database
+    if client is not None:
+        return
+    client = motor.motor_asyncio.AsyncIOMotorClient(
+        settings.MONGO_CONNECTION_STRING,
+        maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+        event_listeners=[MongoCommandMetrics()],
+    )
+    database = client[settings.MONGO_DB_NAME]
+
+
+def close_database():
+    global client, database
+    if client is not None:
+        client.close()
+    client = None
+    database = None
+
+
+def get_database():
+    if database is None:
+        init_database()
+    return database
 
 
 def get_trades_collection():
-    return database.get_collection("trades")
+    return get_database().get_collection("trades")
 
 
 def get_setups_collection():
-    return database.get_collection("setups")
+    return get_database().get_collection("setups")
 
 
 def get_users_collection():
-    return database.get_collection("users")
+    return get_database().get_collection("users")
+
+
+def get_refresh_tokens_collection():
+    return get_database().get_collection("refresh_tokens")
+
+
+def get_portfolio_snapshots_collection():
+    return get_database().get_collection("portfolio_snapshots")
+
+
+def get_job_runs_collection():
+    return get_database().get_collection("job_runs")
+
+
+async def ensure_portfolio_snapshots_collection():
+    """Daily portfolio points live in a time-series collection (MongoDB 5.0+)."""
+    db = get_database()
+    if await db.list_collection_names(filter={"name": "portfolio_snapshots"}):
+        return
+    try:
+        await db.create_collection(
+            "portfolio_snapshots",
+            timeseries={"timeField": "ts", "metaField": "meta", "granularity": "hours"},
+        )
+    except CollectionInvalid:
+        # Another worker created it first
+        pass
+
+
+async def ensure_indexes():
+    """Create the indexes the hot queries rely on (no-op when they exist)."""
+    trades = get_trades_collection()
+    await trades.create_index([("user_id", 1), ("status", 1)])
+    await trades.create_index([("user_id", 1), ("ticker", 1), ("status", 1)])
+    # Startup looks for partial closes interrupted between their two writes
+    await trades.create_index("pending_closes._id", sparse=True)
+    # Exports stream a user's trades in entry order
+    await trades.create_index([("user_id", 1), ("entryDate", 1)])
+    await get_setups_collection().create_index("user_id")
+    await get_users_collection().create_index("user_id")
+    await get_users_collection().create_index("username")
+    refresh_tokens = get_refresh_tokens_collection()
+    await refresh_tokens.create_index("token_hash", unique=True)
+    await refresh_tokens.create_index("family_id")
+    await refresh_tokens.create_index("user_id")
+    # MongoDB deletes tokens once expired
+    await refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+    await ensure_portfolio_snapshots_collection()
+    await get_portfolio_snapshots_collection().create_index([("meta.user_id", 1), ("ts", 1)])
+    # Scheduled-job claims are only needed while their slot is recent
+    await get_job_runs_collection().create_index("started_at", expireAfterSeconds=90 * 24 * 3600)
@@ -1,22 +1,48 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import logging
+from typing import Optional
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
+from app.core.auth import decode_access_token
 from app.core.config import settings
+from app.core.logging_config import configure_logging, shutdown_logging
+from app.core.metrics import MetricsMiddleware, registry
+from app.core.profiling import ProfilingMiddleware, profile_store
+from app.core.resources import resources
 from app.services.websocket_manager import ConnectionManager
-from app.routers import trades, setups, auth
+from app.services.event_bus import event_bus
+from app.services.live_pnl import live_pnl
+from app.services.event_handlers import register_event_handlers
+from app.services.metrics_collectors import register_metric_collectors
+from app.routers import trades, setups, auth, analytics, debug, portfolio
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # Create singleton WebSocket manager
 manager = ConnectionManager()
 
+# Wire trade/setup write events to their consumers
+register_event_handlers(event_bus, manager)
+register_metric_collectors(registry, manager)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # On startup
-    print("Trading Journal API starting...")
-    print(f"📊 Price Service: {'MOCK MODE (Development)' if settings.USE_MOCK_PRICES else 'Finnhub + Exchange Rate API (Production)'}")
+    configure_logging()
+    logger.info(
+        "Trading Journal API starting",
+        extra={"price_service": "mock" if settings.USE_MOCK_PRICES else "finnhub+exchange_rate"},
+    )
+    await resources.start()
     yield
     # On shutdown
-    print("Trading Journal API shutting down...")
+    await resources.stop()
+    logger.info("Trading Journal API shutting down")
+    shutdown_logging()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -41,10 +67,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses (cached reads arrive pre-compressed and pass through)
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Samples stacks of opted-in requests; a single branch otherwise
+app.add_middleware(ProfilingMiddleware, store=profile_store)
+
+# Outermost, so recorded latency covers every other middleware
+app.add_middleware(MetricsMiddleware)
+
 # Include HTTP Routers
 app.include_router(auth.router)
 app.include_router(trades.router)
 app.include_router(setups.router)
+app.include_router(analytics.router)
+app.include_router(portfolio.router)
+app.include_router(debug.router)
 
 
 # Root endpoint
@@ -53,12 +91,32 @@ def read_root():
     return {"status": "Trading Journal API is running"}
 
 
+# Readiness probe: 503 until startup has connected to MongoDB
+@app.get("/ready")
+def read_ready():
+    status_code = 200 if resources.ready else 503
+    return JSONResponse(status_code=status_code, content=resources.get_status())
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+def read_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 # Our server's WebSocket endpoint for frontend clients
-# Note: Currently used for future real-time features
-# Prices are fetched via polling from frontend
+# Prices are fetched via polling from frontend; each fresh price the server
+# sees is pushed back as unrealized P&L deltas ({"type": "pnl", ...}).
+# Browsers can't set headers on a WebSocket, so the access token comes as
+# ?token=; the connection belongs to the token's user, whatever the path says.
 @app.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
+async def websocket_endpoint(websocket: WebSocket, user_id: str, token: Optional[str] = None):
+    user_id = decode_access_token(token) if token else None
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     await manager.connect(user_id, websocket)
+    live_pnl.seed(user_id)
     try:
         while True:
             data = await websocket.receive_json()
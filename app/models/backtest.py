@@ -0,0 +1,35 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class BacktestRequest(BaseModel):
+    setup_id: Optional[str] = None
+    ticker: Optional[str] = None
+    resolution: Optional[str] = None
+    # Each list is one axis of the parameter sweep; every combination is evaluated
+    stop_offset_pcts: List[float] = Field(default_factory=lambda: [0.0])  # % of entry added to the stop distance
+    trailing_pcts: List[float] = Field(default_factory=lambda: [0.0])  # Trailing stop distance in %, 0 = off
+    target_r_multiples: List[float] = Field(default_factory=lambda: [0.0])  # Take profit at R multiple, 0 = off
+
+
+class BacktestRow(BaseModel):
+    stop_offset_pct: float
+    trailing_pct: float
+    target_r: float
+    total_pnl: float
+    actual_total_pnl: float
+    difference: float
+    avg_pnl: float
+    win_rate: float
+    stopped_out: int
+    target_hit: int
+    trades_improved: int
+
+
+class BacktestResult(BaseModel):
+    resolution: str
+    trades: int
+    skipped_trades: int  # Closed trades with no bars in the candle store
+    combinations: int
+    used_process_pool: bool
+    results: List[BacktestRow]
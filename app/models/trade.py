@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from app.models.common import MongoBaseModel, PyObjectId
 
 
@@ -35,6 +35,7 @@ class TradeDB(TradeBase):
     exitDate: Optional[datetime] = None
     lessonsLearned: Optional[str] = None
     result_pnl: Optional[float] = None  # Calculated on close
+    parent_trade_id: Optional[PyObjectId] = None  # Set on the closed part of a partial close
 
 
 class TradeClose(BaseModel):
@@ -44,3 +45,40 @@ class TradeClose(BaseModel):
 
 class TradeOut(TradeDB):
     pass
+
+
+class TradeBulkCloseItem(TradeClose):
+    trade_id: str
+    size: Optional[int] = None  # Close only this many shares, leaving the rest open
+
+
+class TradeBulkClose(BaseModel):
+    trades: List[TradeBulkCloseItem]
+
+
+class TradeBulkCloseResult(BaseModel):
+    trade_id: str
+    closed: bool
+    trade: Optional[TradeOut] = None
+    error: Optional[str] = None
+
+
+class TradeImportRow(TradeCreate):
+    """A single row from a broker export; closed rows carry their exit."""
+    status: str = "open"
+    exitPrice: Optional[float] = None
+    exitDate: Optional[datetime] = None
+    lessonsLearned: Optional[str] = None
+
+
+class TradeImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+
+class TradeImportResult(BaseModel):
+    total_rows: int
+    imported: int
+    failed: int  # Every failing row; `errors` lists at most the first MAX_REPORTED_ERRORS of them
+    errors: List[TradeImportError]
+    errors_truncated: bool = False
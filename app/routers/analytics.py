@@ -0,0 +1,105 @@
+import io
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+from app.core.auth import get_current_user_id
+from app.core.config import settings
+from app.db.database import get_trades_collection
+from app.services.analytics_service import (
+    TRADE_PROJECTION,
+    compute_excursions,
+    ensure_candles,
+    summarize_excursions,
+)
+from app.models.backtest import BacktestRequest, BacktestResult
+from app.services.backtest_service import run_backtest
+from app.services.candle_store import RESOLUTION_SECONDS, get_user_candle_store
+
+router = APIRouter(prefix="/api/v1/analytics", tags=["Analytics"])
+
+
+def _check_resolution(resolution: str):
+    if resolution not in RESOLUTION_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported resolution. Use one of: {', '.join(RESOLUTION_SECONDS)}",
+        )
+
+
+@router.get("/excursions")
+async def get_trade_excursions(
+    ticker: Optional[str] = None,
+    setup_id: Optional[str] = None,
+    resolution: Optional[str] = None,
+    collection=Depends(get_trades_collection),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Maximum adverse/favorable excursion (MAE/MFE) for each closed trade.
+    Bars come from the local candle store, which is filled from the price source on demand.
+    """
+    resolution = resolution or settings.CANDLE_RESOLUTION
+    _check_resolution(resolution)
+
+    query = {"user_id": user_id, "status": "closed"}
+    if ticker:
+        query["ticker"] = ticker
+    if setup_id:
+        query["setup_id"] = setup_id
+    trades = await collection.find(query, TRADE_PROJECTION).to_list(length=None)
+
+    store = get_user_candle_store(settings.CANDLE_STORE_DIR, user_id)
+    scales = await ensure_candles(store, trades, resolution)
+    results = await run_in_threadpool(compute_excursions, store, trades, resolution, scales)
+
+    return {
+        "resolution": resolution,
+        "summary": summarize_excursions(results),
+        "trades": results,
+    }
+
+
+@router.post("/backtest", response_model=BacktestResult)
+async def backtest_trades(
+    request: BacktestRequest,
+    collection=Depends(get_trades_collection),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Replay closed trades (optionally one setup or ticker) under alternate exit rules.
+    Every combination of stop offset, trailing stop and R-multiple target is evaluated
+    and compared with the actual result_pnl.
+    """
+    resolution = request.resolution or settings.CANDLE_RESOLUTION
+    _check_resolution(resolution)
+
+    store = get_user_candle_store(settings.CANDLE_STORE_DIR, user_id)
+    try:
+        return await run_backtest(collection, store, user_id, request, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.post("/candles/{ticker}/import")
+async def import_candles(
+    ticker: str,
+    file: UploadFile = File(...),
+    resolution: Optional[str] = None,
+    currency: str = "INR",
+    user_id: str = Depends(get_current_user_id)
+):
+    """Import bars for a ticker from CSV (timestamp, open, high, low, close, volume).
+    Lets the candle store work fully offline. Imported bars are visible to this user only,
+    and bars already stored for the same timestamps are kept.
+    """
+    resolution = resolution or settings.CANDLE_RESOLUTION
+    _check_resolution(resolution)
+    if currency not in ("INR", "USD"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Currency must be INR or USD")
+
+    store = get_user_candle_store(settings.CANDLE_STORE_DIR, user_id)
+    lines = io.TextIOWrapper(file.file, encoding="utf-8-sig")
+    try:
+        imported = await store.import_csv(ticker, resolution, lines, currency)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid candle file: {e}")
+
+    return {"ticker": ticker.upper(), "resolution": resolution, "imported": imported}
@@ -1,27 +1,74 @@
 """
 Authentication endpoints.
 """
+import math
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel
 from app.core.auth import (
     authenticate_user,
     register_user,
     create_access_token,
     get_current_user,
+    principal_cache,
+    user_claims,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     Token,
     User,
 )
+from app.core.client_ip import client_ip
+from app.core.login_throttle import login_throttle
+from app.core.password_hashing import HashingBusyError, password_hasher
+from app.core.refresh_tokens import (
+    RefreshTokenError,
+    issue_refresh_token,
+    revoke_refresh_token,
+    rotate_refresh_token,
+)
 
 router = APIRouter(prefix="/api/v1/auth", tags=["Authentication"])
 
 
+def _admit(username: str, http_request: Request):
+    """Reject throttled attempts before any password hashing is done."""
+    wait = login_throttle.check(username, client_ip(http_request))
+    if wait is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins in progress, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def _issue_tokens(user: User, refresh_token: str | None = None) -> dict:
+    """Access token plus a refresh token (a new session unless one is passed in)."""
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data=user_claims(user), expires_delta=access_token_expires
+    )
+    if refresh_token is None:
+        refresh_token = await issue_refresh_token(user)
+    
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
 class LoginRequest(BaseModel):
     username: str
     password: str
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
 class RegisterRequest(BaseModel):
     username: str
     password: str
@@ -29,7 +76,7 @@ class RegisterRequest(BaseModel):
 
 
 @router.post("/register", response_model=Token)
-async def register(request: RegisterRequest):
+async def register(request: RegisterRequest, http_request: Request):
     """
     Register a new user account.
     """
@@ -45,7 +92,11 @@ async def register(request: RegisterRequest):
             detail="Password must be at least 6 characters long",
         )
     
-    user = await register_user(request.username, request.password, request.email)
+    _admit(request.username, http_request)
+    try:
+        user = await register_user(request.username, request.password, request.email)
+    except HashingBusyError:
+        raise _hashing_busy()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -53,36 +104,67 @@ async def register(request: RegisterRequest):
         )
     
     # Auto-login after registration
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.user_id}, expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await _issue_tokens(user)
 
 
 @router.post("/login", response_model=Token)
-async def login(request: LoginRequest):
+async def login(request: LoginRequest, http_request: Request):
     """
     Login with username and password to get an access token.
     """
-    user = await authenticate_user(request.username, request.password)
+    _admit(request.username, http_request)
+    try:
+        user = await authenticate_user(request.username, request.password)
+    except HashingBusyError:
+        raise _hashing_busy()
     if not user:
+        login_throttle.record_failure(request.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    login_throttle.record_success(request.username)
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.user_id}, expires_delta=access_token_expires
-    )
+    return await _issue_tokens(user)
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh(request: RefreshRequest):
+    """
+    Exchange a refresh token for a new access token and a new refresh token.
+    Each refresh token works once; reusing one revokes its whole session.
+    """
+    try:
+        user, new_refresh_token = await rotate_refresh_token(request.refresh_token)
+    except RefreshTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await _issue_tokens(user, new_refresh_token)
+
+
+@router.post("/logout")
+async def logout(request: RefreshRequest):
+    """Revoke the session a refresh token belongs to."""
+    revoked = await revoke_refresh_token(request.refresh_token)
+    return {"revoked": revoked}
 
 
 @router.get("/me", response_model=User)
 async def read_users_me(current_user: User = Depends(get_current_user)):
     """Get current user information."""
     return current_user
+
+
+@router.get("/cache-status")
+async def read_cache_status(current_user: User = Depends(get_current_user)):
+    """Hit-rate metrics of the verified-user cache, plus hashing/throttling counters."""
+    return {
+        **principal_cache.get_status(),
+        "password_hashing": password_hasher.get_status(),
+        "login_throttle": login_throttle.get_status(),
+    }
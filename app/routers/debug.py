@@ -0,0 +1,61 @@
+"""
+Diagnostics endpoints.
+
+Stacks and profiles expose code paths from every user's requests, so these
+need PROFILING_TOKEN in X-Profile-Token as well as a login. Without a token
+configured they don't exist (404).
+"""
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from app.core.auth import get_current_user_id
+from app.core.config import settings
+from app.core.profiling import collapsed_stacks, profile_store
+from app.services.loop_monitor import loop_monitor
+
+
+def require_profiling_token(x_profile_token: Optional[str] = Header(None)):
+    if not settings.PROFILING_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_profile_token is None or not hmac.compare_digest(x_profile_token.encode(), settings.PROFILING_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiling token")
+
+
+router = APIRouter(prefix="/api/v1/debug", tags=["Debug"], dependencies=[Depends(require_profiling_token)])
+
+
+@router.get("/event-loop")
+async def get_event_loop_report(
+    limit: int = Query(20, ge=1, le=100),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Event-loop lag and the code that blocked the loop longest, with stacks."""
+    return {
+        **loop_monitor.get_status(),
+        "worst_offenders": loop_monitor.worst_offenders(limit),
+    }
+
+
+@router.get("/profiles")
+async def list_profiles(
+    route: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Recent request profiles, newest first (optionally for one route template)."""
+    return profile_store.list(route)
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(
+    profile_id: int,
+    user_id: str = Depends(get_current_user_id)
+):
+    """A profile as collapsed stacks, for flamegraph.pl or speedscope."""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found",
+        )
+    return PlainTextResponse(collapsed_stacks(profile))
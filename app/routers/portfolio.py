@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import Response, StreamingResponse
+from app.core.auth import get_current_user_id
+from app.core.client_ip import client_ip
+from app.core.serialization import dumps
+from app.db.database import get_portfolio_snapshots_collection, get_setups_collection, get_trades_collection
+from app.services.live_pnl import live_pnl
+from app.services.portfolio_history_service import get_portfolio_history
+from app.services.portfolio_service import build_portfolio_snapshot
+
+router = APIRouter(prefix="/api/v1/portfolio", tags=["Portfolio"])
+
+# Comment lines keep idle connections from being closed by proxies
+SSE_KEEPALIVE_SECONDS = 15
+
+
+@router.get("/snapshot")
+async def get_portfolio_snapshot(
+    http_request: Request,
+    trades_collection=Depends(get_trades_collection),
+    setups_collection=Depends(get_setups_collection),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Everything the dashboard shows, in one response: open positions marked to
+    current prices with unrealized P&L, exposure and risk-to-stop, portfolio totals,
+    statistics and setups.
+    """
+    snapshot = await build_portfolio_snapshot(trades_collection, setups_collection, user_id, client_ip(http_request))
+    return Response(content=dumps(snapshot), media_type="application/json")
+
+
+@router.get("/history")
+async def get_history(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_positions: bool = False,
+    snapshots_collection=Depends(get_portfolio_snapshots_collection),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Daily points written at each market close: unrealized and realized P&L,
+    exposure and risk-to-stop (and the positions, if asked for), oldest first.
+    """
+    points = await get_portfolio_history(snapshots_collection, user_id, start, end, include_positions)
+    return Response(content=dumps(points), media_type="application/json")
+
+
+@router.get("/stream")
+async def stream_live_pnl(user_id: str = Depends(get_current_user_id)):
+    """Server-Sent Events with the same P&L deltas as the WebSocket (`event: pnl`),
+    for clients behind proxies that block WebSockets. Load `/snapshot` first;
+    the stream then carries changes.
+    """
+    queue = live_pnl.listen(user_id)
+
+    async def events():
+        try:
+            yield b": connected\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield b"event: pnl\ndata: " + dumps(message) + b"\n\n"
+        finally:
+            live_pnl.unlisten(user_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            # Keeps GZipMiddleware from buffering the stream
+            "Content-Encoding": "identity",
+        },
+    )
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from app.db.database import get_setups_collection
 from app.models.setup import SetupCreate, SetupOut, SetupDB
 from bson import ObjectId
 from typing import List
 from app.core.auth import get_current_user_id
+from app.core.serialization import DocumentShape, encode_documents
+from app.services.read_cache import read_cache
+from app.services.event_bus import event_bus, SetupChanged
 
 router = APIRouter(prefix="/api/v1/setups", tags=["Setups"])
 
+SETUP_OUT_SHAPE = DocumentShape(SetupOut)
+
 
 @router.post("/", response_model=SetupOut, response_model_by_alias=True, status_code=status.HTTP_201_CREATED)
 async def create_setup(
@@ -16,18 +21,25 @@ async def create_setup(
 ):
     setup_db = SetupDB(**setup.model_dump(), user_id=user_id)
     # Exclude None values to let MongoDB auto-generate _id
-    new_setup = await collection.insert_one(setup_db.model_dump(by_alias=True, exclude_none=True))
-    created_setup = await collection.find_one({"_id": new_setup.inserted_id})
+    created_setup = setup_db.model_dump(by_alias=True, exclude_none=True)
+    new_setup = await collection.insert_one(created_setup)
+    created_setup["_id"] = new_setup.inserted_id
+    read_cache.bump(user_id)
+    event_bus.publish(SetupChanged(user_id=user_id, setup_id=str(new_setup.inserted_id)))
     return SetupOut.model_validate(created_setup)
 
 
 @router.get("/", response_model=List[SetupOut], response_model_by_alias=True)
 async def get_all_setups(
+    request: Request,
     collection=Depends(get_setups_collection),
     user_id: str = Depends(get_current_user_id)
 ):
-    setups = []
-    cursor = collection.find({"user_id": user_id})
-    async for doc in cursor:
-        setups.append(SetupOut.model_validate(doc))
-    return setups
+    cached = read_cache.respond(request, user_id, "setups")
+    if cached is not None:
+        return cached
+
+    version = read_cache.version(user_id)
+    cursor = collection.find({"user_id": user_id}, SETUP_OUT_SHAPE.projection)
+    body = encode_documents(await cursor.to_list(length=None), SETUP_OUT_SHAPE)
+    return read_cache.store(request, user_id, "setups", version, body)
@@ -1,17 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.db.database import get_trades_collection
-from app.models.trade import TradeCreate, TradeClose, TradeOut, TradeDB
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from app.db.database import get_setups_collection, get_trades_collection
+from app.models.trade import (
+    TradeCreate,
+    TradeClose,
+    TradeOut,
+    TradeDB,
+    TradeImportResult,
+    TradeBulkClose,
+    TradeBulkCloseItem,
+    TradeBulkCloseResult,
+)
 from bson import ObjectId
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from app.core.config import settings
 from app.core.auth import get_current_user_id
+from app.core.client_ip import client_ip
+from app.core.quote_admission import quote_admission
+from app.core.serialization import DocumentShape, dumps, encode_documents
+from app.services.read_cache import read_cache
+from app.services.mock_price_service import mock_price_service
+from app.services.finnhub_service import get_finnhub_service
+from app.services.exchange_rate_service import get_exchange_rate_service
+from app.services.event_bus import event_bus, PriceTick, TradeCreated, TradeClosed, TradeDeleted, TradesImported
+from app.services.search_service import OUTCOMES, search_trades
+from app.services.statistics_service import compute_statistics
+from app.services.trade_close_service import (
+    TradeCloseError,
+    TradeNotFoundError,
+    close_trade as close_trade_atomic,
+    partial_close_trade,
+)
+from app.services.trade_import_service import import_trades as run_trade_import, resolve_import_format
+from app.services.trade_export_service import (
+    EXPORT_FORMATS,
+    build_export_query,
+    open_export_cursor,
+    parse_export_fields,
+    stream_trades,
+)
 
 router = APIRouter(
     prefix="/api/v1/trades", 
     tags=["Trades"],
 )
 
+MAX_BULK_CLOSE = 500
+
+TRADE_OUT_SHAPE = DocumentShape(TradeOut)
+
 
 @router.post("/", response_model=TradeOut, response_model_by_alias=True, status_code=status.HTTP_201_CREATED)
 async def create_trade(
@@ -30,34 +70,146 @@ async def create_trade(
         status="open"
     )
     # Exclude None values to let MongoDB auto-generate _id
-    new_trade = await collection.insert_one(trade_db.model_dump(by_alias=True, exclude_none=True))
-    created_trade = await collection.find_one({"_id": new_trade.inserted_id})
-    # TODO: Notify the WebSocket manager to subscribe to this new ticker
+    created_trade = trade_db.model_dump(by_alias=True, exclude_none=True)
+    new_trade = await collection.insert_one(created_trade)
+    created_trade["_id"] = new_trade.inserted_id
+    read_cache.bump(user_id)
+    event_bus.publish(TradeCreated(
+        user_id=user_id,
+        trade_id=str(new_trade.inserted_id),
+        ticker=trade_db.ticker,
+        direction=trade_db.direction,
+        stop_loss=trade_db.stopLoss,
+        entry_price=trade_db.entryPrice,
+        size=trade_db.size,
+    ))
     return TradeOut.model_validate(created_trade)
 
 
+@router.post("/import", response_model=TradeImportResult)
+async def import_trades(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    collection=Depends(get_trades_collection),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Bulk import trade history from a broker CSV or NDJSON export.
+    The format is taken from `format` (csv/ndjson), the file extension or the content type.
+    Rows are validated individually; invalid rows are reported and skipped.
+    """
+    file_format = resolve_import_format(format, file.filename, file.content_type)
+    if file_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unsupported import format. Use 'csv' or 'ndjson'.",
+        )
+
+    result = await run_trade_import(file, file_format, user_id, collection)
+    if result.imported:
+        read_cache.bump(user_id)
+        event_bus.publish(TradesImported(user_id=user_id, imported=result.imported))
+    return result
+
+
+@router.get("/export")
+async def export_trades(
+    format: str = "csv",
+    trade_status: Optional[str] = Query(None, alias="status"),
+    ticker: Optional[str] = None,
+    setup_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    collection=Depends(get_trades_collection),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Stream the user's trades as CSV or NDJSON.
+    Filter by status, ticker, setup_id and entryDate range; `fields` is a comma-separated column list.
+    """
+    file_format = format.lower()
+    if file_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unsupported export format. Use 'csv' or 'ndjson'.",
+        )
+
+    selected_fields = parse_export_fields(fields)
+    if selected_fields is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unknown export field requested",
+        )
+
+    query = build_export_query(user_id, trade_status, ticker, setup_id, start_date, end_date)
+    cursor = open_export_cursor(collection, query, selected_fields)
+    return StreamingResponse(
+        stream_trades(cursor, selected_fields, file_format),
+        media_type=EXPORT_FORMATS[file_format],
+        headers={"Content-Disposition": f'attachment; filename="trades.{file_format}"'},
+    )
+
+
 @router.get("/open", response_model=List[TradeOut], response_model_by_alias=True)
 async def get_open_trades(
+    request: Request,
     collection=Depends(get_trades_collection),
     user_id: str = Depends(get_current_user_id)
 ):
-    trades = []
-    cursor = collection.find({"user_id": user_id, "status": "open"})
-    async for doc in cursor:
-        trades.append(TradeOut.model_validate(doc))
-    return trades
+    cached = read_cache.respond(request, user_id, "trades:open")
+    if cached is not None:
+        return cached
+
+    version = read_cache.version(user_id)
+    cursor = collection.find({"user_id": user_id, "status": "open"}, TRADE_OUT_SHAPE.projection)
+    body = encode_documents(await cursor.to_list(length=None), TRADE_OUT_SHAPE)
+    return read_cache.store(request, user_id, "trades:open", version, body)
 
 
 @router.get("/closed", response_model=List[TradeOut], response_model_by_alias=True)
 async def get_closed_trades(
+    request: Request,
+    collection=Depends(get_trades_collection),
+    user_id: str = Depends(get_current_user_id)
+):
+    cached = read_cache.respond(request, user_id, "trades:closed")
+    if cached is not None:
+        return cached
+
+    version = read_cache.version(user_id)
+    cursor = collection.find({"user_id": user_id, "status": "closed"}, TRADE_OUT_SHAPE.projection)
+    body = encode_documents(await cursor.to_list(length=None), TRADE_OUT_SHAPE)
+    return read_cache.store(request, user_id, "trades:closed", version, body)
+
+
+@router.get("/search")
+async def search_journal(
+    q: str = Query(..., min_length=1, max_length=200),
+    ticker: Optional[str] = None,
+    setup_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    outcome: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
     collection=Depends(get_trades_collection),
+    setups_collection=Depends(get_setups_collection),
     user_id: str = Depends(get_current_user_id)
 ):
-    trades = []
-    cursor = collection.find({"user_id": user_id, "status": "closed"})
-    async for doc in cursor:
-        trades.append(TradeOut.model_validate(doc))
-    return trades
+    """Search market conditions, emotions, lessons learned and setup notes.
+    Results are ranked, filterable by ticker, setup_id, entryDate range and outcome
+    (win, loss, breakeven, open), and carry snippets with highlight ranges.
+    """
+    if outcome is not None and outcome not in OUTCOMES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unknown outcome. Use 'win', 'loss', 'breakeven' or 'open'.",
+        )
+    results = await search_trades(
+        collection, setups_collection, user_id, q,
+        ticker=ticker, setup_id=setup_id, start_date=start_date, end_date=end_date,
+        outcome=outcome, offset=offset, limit=limit,
+    )
+    return Response(content=dumps(results), media_type="application/json")
 
 
 @router.put("/{trade_id}/close", response_model=TradeOut, response_model_by_alias=True)
@@ -68,36 +220,70 @@ async def close_trade(
     user_id: str = Depends(get_current_user_id)
 ):
     trade_oid = ObjectId(trade_id)
-    trade_db = await collection.find_one({"_id": trade_oid, "user_id": user_id})
-    
-    if not trade_db:
+    try:
+        updated_trade = await close_trade_atomic(
+            collection, user_id, trade_oid, trade_close.exitPrice, trade_close.lessonsLearned
+        )
+    except TradeNotFoundError:
         raise HTTPException(status_code=404, detail="Trade not found")
-    
-    trade = TradeDB.model_validate(trade_db)
-    
-    if trade.status == "closed":
-        raise HTTPException(status_code=400, detail="Trade is already closed")
+    except TradeCloseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    read_cache.bump(user_id)
+    event_bus.publish(TradeClosed(
+        user_id=user_id,
+        trade_id=trade_id,
+        ticker=updated_trade["ticker"],
+        result_pnl=updated_trade.get("result_pnl"),
+    ))
 
-    # This is the core P&L calculation logic
-    result_pnl = (trade_close.exitPrice - trade.entryPrice) * trade.size
-    
-    update_data = {
-        "$set": {
-            "exitPrice": trade_close.exitPrice,
-            "lessonsLearned": trade_close.lessonsLearned,
-            "exitDate": datetime.now(),
-            "status": "closed",
-            "result_pnl": result_pnl
-        }
-    }
-    
-    await collection.update_one({"_id": trade_oid}, update_data)
-    # TODO: Notify WebSocket manager to unsubscribe from this ticker if no other open trades exist for it
-    
-    updated_trade = await collection.find_one({"_id": trade_oid})
     return TradeOut.model_validate(updated_trade)
 
 
+@router.post("/close", response_model=List[TradeBulkCloseResult], response_model_by_alias=True)
+async def bulk_close_trades(
+    request: TradeBulkClose,
+    collection=Depends(get_trades_collection),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Close several trades at once. Items with `size` close only part of the position.
+    Each item succeeds or fails on its own; failures are reported per trade.
+    """
+    if len(request.trades) > MAX_BULK_CLOSE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_CLOSE} trades can be closed per request",
+        )
+
+    async def close_one(item: TradeBulkCloseItem) -> TradeBulkCloseResult:
+        if not ObjectId.is_valid(item.trade_id):
+            return TradeBulkCloseResult(trade_id=item.trade_id, closed=False, error="Invalid trade id")
+        trade_oid = ObjectId(item.trade_id)
+        try:
+            if item.size is None:
+                closed = await close_trade_atomic(
+                    collection, user_id, trade_oid, item.exitPrice, item.lessonsLearned
+                )
+            else:
+                closed = await partial_close_trade(
+                    collection, user_id, trade_oid, item.exitPrice, item.size, item.lessonsLearned
+                )
+        except (TradeNotFoundError, TradeCloseError) as e:
+            return TradeBulkCloseResult(trade_id=item.trade_id, closed=False, error=str(e))
+        event_bus.publish(TradeClosed(
+            user_id=user_id,
+            trade_id=item.trade_id,
+            ticker=closed["ticker"],
+            result_pnl=closed.get("result_pnl"),
+            partial=closed.get("parent_trade_id") is not None,
+        ))
+        return TradeBulkCloseResult(trade_id=item.trade_id, closed=True, trade=TradeOut.model_validate(closed))
+
+    results = await asyncio.gather(*(close_one(item) for item in request.trades))
+    if any(result.closed for result in results):
+        read_cache.bump(user_id)
+    return results
+
+
 @router.delete("/{trade_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_trade(
     trade_id: str,
@@ -106,74 +292,74 @@ async def delete_trade(
 ):
     """Permanently delete a trade from the database."""
     trade_oid = ObjectId(trade_id)
-    result = await collection.delete_one({"_id": trade_oid, "user_id": user_id})
+    deleted = await collection.find_one_and_delete(
+        {"_id": trade_oid, "user_id": user_id},
+        projection={"ticker": 1, "status": 1},
+    )
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Trade not found")
+    read_cache.bump(user_id)
+    event_bus.publish(TradeDeleted(
+        user_id=user_id,
+        trade_id=trade_id,
+        ticker=deleted["ticker"],
+        was_open=deleted.get("status") == "open",
+    ))
     
     return None
 
 
 @router.get("/statistics")
 async def get_statistics(
+    request: Request,
     collection=Depends(get_trades_collection),
     user_id: str = Depends(get_current_user_id)
 ):
     """Get trading statistics including win rate."""
-    # Get all closed trades
-    closed_trades = []
-    cursor = collection.find({"user_id": user_id, "status": "closed"})
-    async for doc in cursor:
-        closed_trades.append(doc)
-    
-    total_closed = len(closed_trades)
-    winning_trades = sum(1 for trade in closed_trades if trade.get("result_pnl", 0) > 0)
-    losing_trades = sum(1 for trade in closed_trades if trade.get("result_pnl", 0) < 0)
-    breakeven_trades = sum(1 for trade in closed_trades if trade.get("result_pnl", 0) == 0)
-    
-    win_rate = (winning_trades / total_closed * 100) if total_closed > 0 else 0
-    
-    total_pnl = sum(trade.get("result_pnl", 0) for trade in closed_trades)
-    
-    return {
-        "total_closed_trades": total_closed,
-        "winning_trades": winning_trades,
-        "losing_trades": losing_trades,
-        "breakeven_trades": breakeven_trades,
-        "win_rate": round(win_rate, 2),
-        "total_pnl": round(total_pnl, 2)
-    }
+    cached = read_cache.respond(request, user_id, "statistics")
+    if cached is not None:
+        return cached
+
+    version = read_cache.version(user_id)
+    statistics = await compute_statistics(collection, user_id)
+    return read_cache.store(request, user_id, "statistics", version, dumps(statistics))
 
 
 
 @router.get('/quotes/{ticker}')
-async def get_quote(ticker: str, use_mock: bool = False):
+async def get_quote(
+    ticker: str,
+    http_request: Request,
+    use_mock: bool = False,
+    user_id: str = Depends(get_current_user_id)
+):
     """Fetch a current quote for a ticker from Finnhub (US stocks).
     Converts USD prices to INR using exchange rate API.
     Returns: {found: bool, price_inr: float | None, price_usd: float | None, warning: str | None, suggestions: list}.
     Set use_mock=true to use mock data during development.
+    Clients over their request rate, or arriving while too many quotes are already
+    waiting on Finnhub, are answered from the quote cache only (cache_only: true).
     """
     # Use mock service if requested or if configured in settings
     use_mock_data = use_mock or settings.USE_MOCK_PRICES
     
     if use_mock_data:
-        from app.services.mock_price_service import mock_price_service
         price_service = mock_price_service
     else:
         # Use Finnhub API
-        from app.services.finnhub_service import get_finnhub_service
-        from app.services.exchange_rate_service import get_exchange_rate_service
-        
         finnhub = get_finnhub_service(settings.FINNHUB_API_KEY)
         exchange_rate_svc = get_exchange_rate_service(
             settings.EXCHANGE_RATE_API_KEY,
             settings.EXCHANGE_RATE_PROVIDER
         )
     
+    admitted = False
     try:
         if use_mock_data:
             # Mock service returns INR prices
             quote = price_service.get_quote(ticker)
+            event_bus.publish(PriceTick(ticker=ticker, price=quote['price']))
             return {
                 "found": True,
                 "ticker": quote['ticker'],
@@ -186,12 +372,44 @@ async def get_quote(ticker: str, use_mock: bool = False):
                 "suggestions": []
             }
         
-        # Get quote from Finnhub
-        quote = finnhub.get_quote(ticker)
+        admitted = quote_admission.acquire(user_id, client_ip(http_request))
+        if admitted:
+            # Get quote from Finnhub (blocking HTTP, so off the event loop)
+            quote = await run_in_threadpool(finnhub.get_quote, ticker)
+        else:
+            # Over a limit: answer from the cache without calling upstream
+            quote = finnhub.get_cached_quote(ticker)
+            if quote is None:
+                return {
+                    "found": False,
+                    "ticker": ticker,
+                    "name": None,
+                    "price_inr": None,
+                    "price_usd": None,
+                    "exchange_rate": None,
+                    "cache_only": True,
+                    "warning": f"Too many quote requests and no cached price for '{ticker}'. Try again shortly.",
+                    "suggestions": []
+                }
+        
+        if quote.get('unavailable'):
+            # Finnhub down or out of quota, nothing cached: answer now with mock data
+            fallback = mock_price_service.get_quote(ticker)
+            return {
+                "found": True,
+                "ticker": fallback['ticker'],
+                "name": fallback.get('name', ticker),
+                "price_inr": fallback.get('price'),
+                "price_usd": None,
+                "exchange_rate": None,
+                "mock": True,
+                "warning": f"{quote['warning'].rstrip('.')}. Showing mock data.",
+                "suggestions": []
+            }
         
         if not quote['found']:
             # Ticker not found - get suggestions
-            suggestions = finnhub.search_symbol(ticker) if ticker.strip() else []
+            suggestions = await run_in_threadpool(finnhub.search_symbol, ticker) if admitted and ticker.strip() else []
             return {
                 "found": False,
                 "ticker": ticker,
@@ -205,8 +423,13 @@ async def get_quote(ticker: str, use_mock: bool = False):
         
         # Quote found - convert USD to INR
         price_usd = quote['price']
-        exchange_rate = exchange_rate_svc.get_usd_to_inr_rate()
+        if admitted:
+            exchange_rate = await run_in_threadpool(exchange_rate_svc.get_usd_to_inr_rate)
+        else:
+            exchange_rate = exchange_rate_svc.get_cached_rate()
         price_inr = price_usd * exchange_rate
+        if not quote.get('stale'):
+            event_bus.publish(PriceTick(ticker=ticker, price=round(price_inr, 2)))
         
         response_data = {
             "found": True,
@@ -216,6 +439,8 @@ async def get_quote(ticker: str, use_mock: bool = False):
             "price_usd": round(price_usd, 2),
             "exchange_rate": round(exchange_rate, 2),
             "warning": quote.get('warning'),
+            "stale": quote.get('stale', False),
+            "cache_only": not admitted,
             "suggestions": []
         }
         
@@ -233,18 +458,17 @@ async def get_quote(ticker: str, use_mock: bool = False):
             "warning": f"Error fetching quote: {str(e)}",
             "suggestions": []
         }
+    finally:
+        if admitted:
+            quote_admission.release()
 
 
 @router.get('/service-status')
-async def get_service_status():
+async def get_service_status(user_id: str = Depends(get_current_user_id)):
     """Get price service status (Finnhub or Mock)."""
     if settings.USE_MOCK_PRICES:
-        from app.services.mock_price_service import mock_price_service
         return mock_price_service.get_status()
     else:
-        from app.services.finnhub_service import get_finnhub_service
-        from app.services.exchange_rate_service import get_exchange_rate_service
-        
         finnhub = get_finnhub_service(settings.FINNHUB_API_KEY)
         exchange_rate_svc = get_exchange_rate_service(
             settings.EXCHANGE_RATE_API_KEY,
@@ -253,5 +477,6 @@ async def get_service_status():
         
         return {
             "finnhub": finnhub.get_status(),
-            "exchange_rate": exchange_rate_svc.get_status()
+            "exchange_rate": exchange_rate_svc.get_status(),
+            "quote_admission": quote_admission.get_status()
         }
@@ -1,8 +1,102 @@
+from typing import Dict, List, NamedTuple, Optional, Set
 from app.services.websocket_manager import ConnectionManager
 from app.db.database import get_trades_collection
+from app.core.metrics import ALERT_EVALUATIONS, ALERTS_TRIGGERED, WEBSOCKET_MESSAGES_SENT
+
+
+class StopEntry(NamedTuple):
+    user_id: str
+    trade_id: str
+    direction: str
+    stop_loss: float
+
+
+class StopLossIndex:
+    """In-memory index of open trades' stops by ticker.
+
+    Loaded once at startup and kept current by trade events, so a price tick
+    can be checked without querying MongoDB.
+    """
+
+    def __init__(self):
+        self._by_ticker: Dict[str, Dict[str, StopEntry]] = {}
+        self._ticker_of: Dict[str, str] = {}
+        # Trades already alerted, so a stop breached over many ticks alerts once
+        self._alerted: Set[str] = set()
+        self.loaded = False
+
+    async def load(self, collection, user_id: Optional[str] = None):
+        """Load open trades (all users, or one user after an import)."""
+        query = {"status": "open"}
+        if user_id is not None:
+            query["user_id"] = user_id
+        projection = {"user_id": 1, "ticker": 1, "direction": 1, "stopLoss": 1}
+        async for trade in collection.find(query, projection):
+            self.add(trade["user_id"], str(trade["_id"]), trade["ticker"], trade["direction"], trade["stopLoss"])
+        if user_id is None:
+            self.loaded = True
+
+    def add(self, user_id: str, trade_id: str, ticker: str, direction: str, stop_loss: float):
+        self._by_ticker.setdefault(ticker, {})[trade_id] = StopEntry(user_id, trade_id, direction, stop_loss)
+        self._ticker_of[trade_id] = ticker
+
+    def remove(self, trade_id: str):
+        self._alerted.discard(trade_id)
+        ticker = self._ticker_of.pop(trade_id, None)
+        if ticker is None:
+            return
+        entries = self._by_ticker.get(ticker)
+        if entries is not None:
+            entries.pop(trade_id, None)
+            if not entries:
+                del self._by_ticker[ticker]
+
+    def triggered(self, ticker: str, price: float) -> List[StopEntry]:
+        """Open trades on `ticker` whose stop is hit at `price`."""
+        return [
+            entry for entry in self._by_ticker.get(ticker, {}).values()
+            if (entry.direction == "bullish" and entry.stop_loss >= price)
+            or (entry.direction == "bearish" and entry.stop_loss <= price)
+        ]
+
+    def first_alert(self, trade_id: str) -> bool:
+        """True the first time a trade's stop alert is sent."""
+        if trade_id in self._alerted:
+            return False
+        self._alerted.add(trade_id)
+        return True
+
+    def __len__(self):
+        return len(self._ticker_of)
+
+
+stop_loss_index = StopLossIndex()
 
 
 async def check_for_alerts(ticker: str, price: float, manager: ConnectionManager):
+    if stop_loss_index.loaded:
+        ALERT_EVALUATIONS.inc("index")
+        for entry in stop_loss_index.triggered(ticker, price):
+            if ticker not in manager.user_subscriptions.get(entry.user_id, ()):
+                continue
+            connection = manager.active_connections.get(entry.user_id)
+            if connection and stop_loss_index.first_alert(entry.trade_id):
+                await connection.send_json({
+                    "type": "alert",
+                    "ticker": ticker,
+                    "trade_id": entry.trade_id,
+                    "message": f"Stop loss triggered for {ticker} at ${price}"
+                })
+                ALERTS_TRIGGERED.inc()
+                WEBSOCKET_MESSAGES_SENT.inc("alert")
+        return
+
+    await _check_for_alerts_in_db(ticker, price, manager)
+
+
+async def _check_for_alerts_in_db(ticker: str, price: float, manager: ConnectionManager):
+    """Fallback used until the stop-loss index has been loaded."""
+    ALERT_EVALUATIONS.inc("database")
     collection = get_trades_collection()
     
     # Check for alerts for all users subscribed to this ticker
@@ -29,6 +123,8 @@ async def check_for_alerts(ticker: str, price: float, manager: ConnectionManager
                     "trade_id": str(trade["_id"]),
                     "message": f"Stop loss triggered for {ticker} at ${price}"
                 })
+                ALERTS_TRIGGERED.inc()
+                WEBSOCKET_MESSAGES_SENT.inc("alert")
         
         # Find any open trade for this user/ticker where stop loss is hit (bearish)
         query_bearish = {
@@ -49,3 +145,5 @@ async def check_for_alerts(ticker: str, price: float, manager: ConnectionManager
                     "trade_id": str(trade["_id"]),
                     "message": f"Stop loss triggered for {ticker} at ${price}"
                 })
+                ALERTS_TRIGGERED.inc()
+                WEBSOCKET_MESSAGES_SENT.inc("alert")
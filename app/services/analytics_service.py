@@ -0,0 +1,157 @@
+"""
+Trade analytics over locally stored candles.
+
+Maximum adverse/favorable excursion (MAE/MFE) is computed per closed trade
+from the bars between its entry and exit, using array reductions over
+memory-mapped slices of the candle store.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services.candle_store import RESOLUTION_SECONDS, UserCandleStore
+from app.services.exchange_rate_service import get_exchange_rate_service
+from app.services.finnhub_service import get_finnhub_service
+from app.services.mock_price_service import mock_price_service
+
+TRADE_PROJECTION = {
+    "ticker": 1,
+    "direction": 1,
+    "entryPrice": 1,
+    "stopLoss": 1,
+    "size": 1,
+    "entryDate": 1,
+    "exitPrice": 1,
+    "exitDate": 1,
+    "result_pnl": 1,
+    "setup_id": 1,
+}
+
+
+def fetch_candles(ticker: str, resolution: str, from_ts: int, to_ts: int) -> Tuple[Dict, str]:
+    """Fetch bars from the configured price source. Returns (columns, currency)."""
+    if settings.USE_MOCK_PRICES:
+        return mock_price_service.get_candles(ticker, resolution, from_ts, to_ts), "INR"
+
+    finnhub = get_finnhub_service(settings.FINNHUB_API_KEY)
+    return finnhub.get_candles(ticker, resolution, from_ts, to_ts), "USD"
+
+
+async def get_usd_to_inr_rate() -> float:
+    exchange_rate_svc = get_exchange_rate_service(
+        settings.EXCHANGE_RATE_API_KEY,
+        settings.EXCHANGE_RATE_PROVIDER
+    )
+    return await run_in_threadpool(exchange_rate_svc.get_usd_to_inr_rate)
+
+
+def to_timestamp(value: Optional[datetime]) -> Optional[int]:
+    return int(value.timestamp()) if value else None
+
+
+def trade_window(trade: Dict, resolution: str) -> Tuple[int, int]:
+    """Bar range covering a trade: entry bar (floored to the resolution) through exit."""
+    step = RESOLUTION_SECONDS.get(resolution, 86400)
+    start = to_timestamp(trade["entryDate"]) // step * step
+    end = to_timestamp(trade.get("exitDate")) or int(datetime.now().timestamp())
+    return start, max(start, end)
+
+
+async def ensure_candles(store: UserCandleStore, trades: List[Dict], resolution: str) -> Dict[str, float]:
+    """Make sure the store covers every trade's window; returns the price scale per ticker.
+
+    One fill per ticker spanning all of its trades, so many trades share a fetch.
+    Stored USD bars are scaled to INR, the currency trades are journaled in.
+    """
+    windows: Dict[str, Tuple[int, int]] = {}
+    for trade in trades:
+        start, end = trade_window(trade, resolution)
+        ticker = trade["ticker"].upper()
+        if ticker in windows:
+            start, end = min(start, windows[ticker][0]), max(end, windows[ticker][1])
+        windows[ticker] = (start, end)
+
+    for ticker, (start, end) in windows.items():
+        await store.ensure_range(ticker, resolution, start, end, fetch_candles)
+
+    scales: Dict[str, float] = {}
+    usd_rate: Optional[float] = None
+    for ticker in windows:
+        if store.read_meta(ticker, resolution).get("currency") == "USD":
+            if usd_rate is None:
+                usd_rate = await get_usd_to_inr_rate()
+            scales[ticker] = usd_rate
+        else:
+            scales[ticker] = 1.0
+    return scales
+
+
+def compute_excursions(store: UserCandleStore, trades: List[Dict], resolution: str, scales: Dict[str, float]) -> List[Dict]:
+    results = []
+    for trade in trades:
+        ticker = trade["ticker"].upper()
+        start, end = trade_window(trade, resolution)
+        bars = store.series(ticker, resolution).slice(start, end)
+        entry = trade["entryPrice"]
+        size = trade["size"]
+
+        result = {
+            "trade_id": str(trade["_id"]),
+            "ticker": trade["ticker"],
+            "direction": trade["direction"],
+            "entryPrice": entry,
+            "exitPrice": trade.get("exitPrice"),
+            "size": size,
+            "result_pnl": trade.get("result_pnl"),
+            "bars": len(bars["t"]),
+            "mae": None,
+            "mfe": None,
+            "mae_pct": None,
+            "mfe_pct": None,
+            "mae_value": None,
+            "mfe_value": None,
+        }
+        if len(bars["t"]):
+            scale = scales.get(ticker, 1.0)
+            high = float(np.max(bars["h"])) * scale
+            low = float(np.min(bars["l"])) * scale
+            if trade["direction"] == "bearish":
+                mfe, mae = entry - low, high - entry
+            else:
+                mfe, mae = high - entry, entry - low
+            mfe, mae = max(mfe, 0.0), max(mae, 0.0)
+            result.update({
+                "mae": round(mae, 4),
+                "mfe": round(mfe, 4),
+                "mae_pct": round(mae / entry * 100, 2) if entry else None,
+                "mfe_pct": round(mfe / entry * 100, 2) if entry else None,
+                "mae_value": round(mae * size, 2),
+                "mfe_value": round(mfe * size, 2),
+            })
+        results.append(result)
+    return results
+
+
+def summarize_excursions(results: List[Dict]) -> Dict:
+    analyzed = [r for r in results if r["bars"]]
+    if not analyzed:
+        return {"trades": len(results), "analyzed": 0}
+
+    mae_pct = np.array([r["mae_pct"] or 0.0 for r in analyzed])
+    mfe_pct = np.array([r["mfe_pct"] or 0.0 for r in analyzed])
+    mfe_value = np.array([r["mfe_value"] for r in analyzed])
+    pnl = np.array([r["result_pnl"] or 0.0 for r in analyzed])
+    captured = np.divide(pnl, mfe_value, out=np.zeros_like(pnl), where=mfe_value > 0)
+
+    return {
+        "trades": len(results),
+        "analyzed": len(analyzed),
+        "avg_mae_pct": round(float(mae_pct.mean()), 2),
+        "avg_mfe_pct": round(float(mfe_pct.mean()), 2),
+        "max_mae_pct": round(float(mae_pct.max()), 2),
+        # Share of the best available move that was actually realized
+        "avg_mfe_capture": round(float(captured.mean()), 4),
+    }
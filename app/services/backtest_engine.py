@@ -0,0 +1,148 @@
+"""
+Vectorized what-if simulation of journaled trades under alternate exit rules.
+
+Each trade is replayed over its bars once for every parameter combination
+at the same time: combinations are rows and bars are columns of a NumPy
+matrix. This module only depends on NumPy so process-pool workers can
+import it cheaply.
+
+Bearish trades are simulated as bullish trades on negated prices, which
+turns their stop above entry into a stop below entry.
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.services.pnl_service import calculate_result_pnl
+
+OUTCOME_ACTUAL_EXIT = 0
+OUTCOME_STOPPED = 1
+OUTCOME_TARGET = 2
+
+# Combinations x bars per intermediate matrix (about 8 MB of float64 each)
+MAX_BLOCK_CELLS = 1_000_000
+
+
+def parameter_grid(stop_offsets_pct: List[float], trailing_pcts: List[float], target_r_multiples: List[float]) -> Dict[str, np.ndarray]:
+    """Cartesian product of the parameter lists, flattened into aligned arrays."""
+    offsets, trails, targets = np.meshgrid(
+        np.asarray(stop_offsets_pct, dtype=np.float64),
+        np.asarray(trailing_pcts, dtype=np.float64),
+        np.asarray(target_r_multiples, dtype=np.float64),
+        indexing="ij",
+    )
+    return {
+        "stop_offset_pct": offsets.ravel(),
+        "trailing_pct": trails.ravel(),
+        "target_r": targets.ravel(),
+    }
+
+
+def _simulate_rows(
+    entry: float,
+    actual_exit: float,
+    fixed_stop: np.ndarray,
+    trails: np.ndarray,
+    targets: np.ndarray,
+    highs: np.ndarray,
+    lows: np.ndarray,
+    prior_high: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Exit price and outcome for a block of combinations (rows) over all bars."""
+    n = len(highs)
+    trail_stop = prior_high[None, :] - np.abs(prior_high)[None, :] * trails[:, None] / 100.0
+    trail_stop = np.where(trails[:, None] > 0, trail_stop, -np.inf)
+    stop_levels = np.maximum(fixed_stop[:, None], trail_stop)
+
+    risk = entry - fixed_stop
+    target_levels = np.where((targets > 0) & (risk > 0), entry + targets * risk, np.inf)
+
+    stop_hit = lows[None, :] <= stop_levels
+    target_hit = highs[None, :] >= target_levels[:, None]
+    first_stop = np.where(stop_hit.any(axis=1), stop_hit.argmax(axis=1), n)
+    first_target = np.where(target_hit.any(axis=1), target_hit.argmax(axis=1), n)
+
+    stopped = (first_stop < n) & (first_stop <= first_target)
+    targeted = (first_target < n) & ~stopped
+    stop_price = stop_levels[np.arange(len(fixed_stop)), np.minimum(first_stop, n - 1)]
+    exit_price = np.where(stopped, stop_price, np.where(targeted, target_levels, actual_exit))
+    outcome = np.where(stopped, OUTCOME_STOPPED, np.where(targeted, OUTCOME_TARGET, OUTCOME_ACTUAL_EXIT))
+    return exit_price, outcome
+
+
+def simulate_trade(trade: Dict, grid: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """P&L and outcome of one trade under every parameter combination.
+
+    `trade` holds entry, stop, exit, size, bearish and the `highs`/`lows`
+    arrays of the bars between entry and the actual exit. A rule that never
+    triggers leaves the actual exit in place. When a stop and a target fall
+    in the same bar the stop is assumed to come first. Combinations are
+    processed in blocks of at most MAX_BLOCK_CELLS matrix cells, so memory
+    stays bounded for long holds on minute bars.
+    """
+    offsets, trails, targets = grid["stop_offset_pct"], grid["trailing_pct"], grid["target_r"]
+    sign = -1.0 if trade["bearish"] else 1.0
+    entry = sign * trade["entry"]
+    stop = sign * trade["stop"]
+    actual_exit = sign * trade["exit"]
+    highs, lows = (-trade["lows"], -trade["highs"]) if trade["bearish"] else (trade["highs"], trade["lows"])
+    n = len(highs)
+    reference = abs(trade["entry"])
+
+    # Wider stop = further away from entry
+    fixed_stop = stop - reference * offsets / 100.0
+
+    if n:
+        prior_high = np.maximum.accumulate(np.concatenate(([entry], highs[:-1])))
+        exit_price = np.empty(len(offsets))
+        outcome = np.empty(len(offsets), dtype=np.int64)
+        rows = max(1, MAX_BLOCK_CELLS // n)
+        for i in range(0, len(offsets), rows):
+            block = slice(i, i + rows)
+            exit_price[block], outcome[block] = _simulate_rows(
+                entry, actual_exit, fixed_stop[block], trails[block], targets[block], highs, lows, prior_high
+            )
+    else:
+        exit_price = np.full(len(offsets), actual_exit)
+        outcome = np.full(len(offsets), OUTCOME_ACTUAL_EXIT)
+
+    pnl = calculate_result_pnl(trade["entry"], sign * exit_price, trade["size"])
+    return pnl, outcome
+
+
+def simulate_trades(trades: List[Dict], grid: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Simulate many trades; returns (pnl, outcome) matrices of shape (trades, combinations)."""
+    combinations = len(grid["stop_offset_pct"])
+    pnl = np.zeros((len(trades), combinations))
+    outcome = np.zeros((len(trades), combinations), dtype=np.int8)
+    for i, trade in enumerate(trades):
+        pnl[i], outcome[i] = simulate_trade(trade, grid)
+    return pnl, outcome
+
+
+def summarize(pnl: np.ndarray, outcome: np.ndarray, actual_pnl: np.ndarray, grid: Dict[str, np.ndarray]) -> List[Dict]:
+    """One summary row per parameter combination, best total P&L first."""
+    actual_total = float(actual_pnl.sum())
+    trades = pnl.shape[0]
+    totals = pnl.sum(axis=0)
+    wins = (pnl > 0).sum(axis=0)
+    stopped = (outcome == OUTCOME_STOPPED).sum(axis=0)
+    targeted = (outcome == OUTCOME_TARGET).sum(axis=0)
+    improved = (pnl > actual_pnl[:, None]).sum(axis=0)
+
+    rows = []
+    for j in np.argsort(-totals):
+        rows.append({
+            "stop_offset_pct": float(grid["stop_offset_pct"][j]),
+            "trailing_pct": float(grid["trailing_pct"][j]),
+            "target_r": float(grid["target_r"][j]),
+            "total_pnl": round(float(totals[j]), 2),
+            "actual_total_pnl": round(actual_total, 2),
+            "difference": round(float(totals[j]) - actual_total, 2),
+            "avg_pnl": round(float(totals[j]) / trades, 2) if trades else 0,
+            "win_rate": round(float(wins[j]) / trades * 100, 2) if trades else 0,
+            "stopped_out": int(stopped[j]),
+            "target_hit": int(targeted[j]),
+            "trades_improved": int(improved[j]),
+        })
+    return rows
@@ -0,0 +1,126 @@
+"""
+What-if backtests of a user's journaled trades.
+
+Loads the closed trades, makes sure the candle store covers them and runs
+the vectorized engine. Large sweeps are split across a process pool so
+they don't hold the event loop's thread pool or the GIL.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from app.models.backtest import BacktestRequest, BacktestResult
+from app.services.analytics_service import TRADE_PROJECTION, ensure_candles, trade_window
+from app.services.backtest_engine import parameter_grid, simulate_trades, summarize
+from app.services.candle_store import UserCandleStore
+
+MAX_COMBINATIONS = 5000
+# Sweeps above this many bar x combination cells go to the process pool
+PROCESS_POOL_THRESHOLD = 5_000_000
+PROCESS_POOL_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get or create the backtest process pool (spawned, so workers don't inherit open sockets)."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def _load_paths(store: UserCandleStore, trades: List[Dict], resolution: str, scales: Dict[str, float]) -> Tuple[List[Dict], np.ndarray]:
+    """Copy each trade's bars out of the memory maps into plain arrays for the engine."""
+    payload = []
+    actual_pnl = []
+    for trade in trades:
+        ticker = trade["ticker"].upper()
+        start, end = trade_window(trade, resolution)
+        bars = store.series(ticker, resolution).slice(start, end)
+        if not len(bars["t"]):
+            continue
+        scale = scales.get(ticker, 1.0)
+        payload.append({
+            "entry": float(trade["entryPrice"]),
+            "stop": float(trade["stopLoss"]),
+            "exit": float(trade["exitPrice"]),
+            "size": int(trade["size"]),
+            "bearish": trade["direction"] == "bearish",
+            "highs": np.array(bars["h"]) * scale,
+            "lows": np.array(bars["l"]) * scale,
+        })
+        actual_pnl.append(trade.get("result_pnl") or 0.0)
+    return payload, np.asarray(actual_pnl, dtype=np.float64)
+
+
+async def _simulate(payload: List[Dict], grid: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray, bool]:
+    combinations = len(grid["stop_offset_pct"])
+    cells = sum(len(trade["highs"]) for trade in payload) * combinations
+    if cells < PROCESS_POOL_THRESHOLD or len(payload) < 2:
+        pnl, outcome = await run_in_threadpool(simulate_trades, payload, grid)
+        return pnl, outcome, False
+
+    pool = get_process_pool()
+    chunk_size = -(-len(payload) // PROCESS_POOL_WORKERS)
+    loop = asyncio.get_running_loop()
+    chunks = await asyncio.gather(*(
+        loop.run_in_executor(pool, simulate_trades, payload[i:i + chunk_size], grid)
+        for i in range(0, len(payload), chunk_size)
+    ))
+    pnl = np.vstack([chunk[0] for chunk in chunks])
+    outcome = np.vstack([chunk[1] for chunk in chunks])
+    return pnl, outcome, True
+
+
+async def run_backtest(
+    collection,
+    store: UserCandleStore,
+    user_id: str,
+    request: BacktestRequest,
+    resolution: str,
+) -> BacktestResult:
+    grid = parameter_grid(request.stop_offset_pcts, request.trailing_pcts, request.target_r_multiples)
+    combinations = len(grid["stop_offset_pct"])
+    if combinations > MAX_COMBINATIONS:
+        raise ValueError(f"Too many parameter combinations ({combinations}); the limit is {MAX_COMBINATIONS}")
+
+    query = {"user_id": user_id, "status": "closed", "exitPrice": {"$ne": None}}
+    if request.setup_id:
+        query["setup_id"] = request.setup_id
+    if request.ticker:
+        query["ticker"] = request.ticker
+    trades = await collection.find(query, TRADE_PROJECTION).to_list(length=None)
+
+    scales = await ensure_candles(store, trades, resolution)
+    payload, actual_pnl = await run_in_threadpool(_load_paths, store, trades, resolution, scales)
+
+    if payload:
+        pnl, outcome, used_pool = await _simulate(payload, grid)
+        rows = summarize(pnl, outcome, actual_pnl, grid)
+    else:
+        rows, used_pool = [], False
+
+    return BacktestResult(
+        resolution=resolution,
+        trades=len(payload),
+        skipped_trades=len(trades) - len(payload),
+        combinations=combinations,
+        used_process_pool=used_pool,
+        results=rows,
+    )
@@ -0,0 +1,159 @@
+"""
+Warm-start snapshots of the price caches.
+
+The Finnhub quote and symbol-search cache and the USD/INR rate are written
+to a gzipped JSON file on shutdown and every CACHE_SNAPSHOT_INTERVAL_SECONDS,
+and read back at startup before anything is fetched. Entries keep their
+original timestamps, so a restored quote is only served as fresh for what
+is left of its TTL; older ones are still there as stale fallbacks. After
+startup, stale quotes cached within the last hour (the tickers people were
+actually looking at) are refreshed in the background at
+CACHE_REVALIDATE_PER_MINUTE, newest first, through the normal rate limiter,
+quota ledger and circuit breaker. A restart then costs no burst of upstream
+calls.
+"""
+import asyncio
+import gzip
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services.exchange_rate_service import ExchangeRateService
+from app.services.finnhub_service import FinnhubService
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+REVALIDATE_WINDOW = timedelta(hours=1)
+
+
+class CacheSnapshotter:
+    def __init__(self, path: str, interval: float, revalidate_per_minute: int):
+        self.path = path
+        self.interval = interval
+        self.revalidate_per_minute = revalidate_per_minute
+        self.finnhub: Optional[FinnhubService] = None
+        self.exchange_rate: Optional[ExchangeRateService] = None
+        self._tasks: List[asyncio.Task] = []
+        self.restored_entries = 0
+        self.restored_age_seconds: Optional[float] = None
+        self.writes = 0
+        self.write_errors = 0
+        self.last_write: Optional[float] = None
+        self.revalidated = 0
+
+    def attach(self, finnhub: FinnhubService, exchange_rate: ExchangeRateService):
+        self.finnhub = finnhub
+        self.exchange_rate = exchange_rate
+
+    def _read(self) -> Optional[Dict]:
+        try:
+            with open(self.path, "rb") as f:
+                snapshot = orjson.loads(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        if snapshot.get("format") != SNAPSHOT_FORMAT:
+            logger.warning("Ignoring cache snapshot in an unknown format", extra={"path": self.path})
+            return None
+        return snapshot
+
+    def _write(self):
+        snapshot = {
+            "format": SNAPSHOT_FORMAT,
+            "written_at": time.time(),
+            "finnhub": self.finnhub.export_cache() if self.finnhub is not None else {},
+            "exchange_rate": self.exchange_rate.export_cache() if self.exchange_rate is not None else None,
+        }
+        body = gzip.compress(orjson.dumps(snapshot), compresslevel=6)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Write then rename, so a crash mid-write never leaves a truncated snapshot
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, self.path)
+
+    async def restore(self):
+        """Load the last snapshot into the attached services (a missing file is a cold start)."""
+        snapshot = await run_in_threadpool(self._read)
+        if snapshot is None:
+            return
+        if self.finnhub is not None:
+            self.restored_entries += self.finnhub.import_cache(snapshot.get("finnhub") or {})
+        if self.exchange_rate is not None and snapshot.get("exchange_rate"):
+            self.exchange_rate.import_cache(snapshot["exchange_rate"])
+            self.restored_entries += 1
+        self.restored_age_seconds = round(time.time() - snapshot["written_at"], 1)
+        logger.info(
+            "Restored price caches",
+            extra={"entries": self.restored_entries, "snapshot_age_seconds": self.restored_age_seconds},
+        )
+
+    async def save(self) -> bool:
+        try:
+            await run_in_threadpool(self._write)
+        except (OSError, TypeError, ValueError) as e:
+            self.write_errors += 1
+            logger.warning("Cache snapshot write failed", extra={"path": self.path, "error": str(e)})
+            return False
+        self.writes += 1
+        self.last_write = time.time()
+        return True
+
+    async def _save_periodically(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save()
+
+    async def _revalidate(self):
+        tickers = self.finnhub.stale_quotes(since=datetime.now() - REVALIDATE_WINDOW)
+        pause = 60 / self.revalidate_per_minute
+        for ticker in tickers:
+            await asyncio.sleep(pause)
+            # Skipped if a request has refreshed it meanwhile
+            cached = self.finnhub.get_cached_quote(ticker)
+            if cached is not None and cached["stale"]:
+                await run_in_threadpool(self.finnhub.get_quote, ticker)
+                self.revalidated += 1
+
+    def start(self):
+        """Start periodic saves and revalidation; does nothing until services are attached."""
+        if self._tasks or self.finnhub is None:
+            return
+        if self.interval > 0:
+            self._tasks.append(asyncio.create_task(self._save_periodically()))
+        if self.revalidate_per_minute > 0:
+            self._tasks.append(asyncio.create_task(self._revalidate()))
+
+    async def stop(self):
+        """Stop the background tasks and write a final snapshot."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.finnhub is not None:
+            await self.save()
+
+    def get_status(self) -> Dict:
+        return {
+            "path": self.path,
+            "restored_entries": self.restored_entries,
+            "restored_age_seconds": self.restored_age_seconds,
+            "writes": self.writes,
+            "write_errors": self.write_errors,
+            "last_write": self.last_write,
+            "revalidated": self.revalidated,
+        }
+
+
+# Singleton instance
+cache_snapshotter = CacheSnapshotter(
+    settings.CACHE_SNAPSHOT_PATH,
+    settings.CACHE_SNAPSHOT_INTERVAL_SECONDS,
+    settings.CACHE_REVALIDATE_PER_MINUTE,
+)
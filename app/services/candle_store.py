@@ -0,0 +1,356 @@
+"""
+Local store of historical price bars (candles) per ticker.
+
+Bars are kept in columnar files, one per field, under
+`<CANDLE_STORE_DIR>/<TICKER>/<resolution>/`:
+
+    t.i8  timestamps (int64 unix seconds, ascending)
+    o.f8 h.f8 l.f8 c.f8 v.f8  open/high/low/close/volume (float64)
+    meta.json  covered time range and price currency
+
+Reads memory-map the column files, so slicing a date range is a
+`searchsorted` plus a view, shared by every trade and user on that ticker.
+New bars are appended; only filling in a range *before* the stored data
+rewrites the files. Bars come from Finnhub `/stock/candle` or the mock
+price service (offline development).
+
+Bars a user imports from CSV are kept apart, under
+`<CANDLE_STORE_DIR>/imports/<user_id>/`, and only that user's analytics
+read them: for a ticker and resolution the user has imported, their own
+series is used (gaps are still filled from the provider), otherwise the
+shared one. Importing never replaces a bar that is already stored.
+
+Tickers become directory names, so only plain symbols (letters, digits, `.`
+and `-`) are stored; other tickers read as having no bars.
+"""
+import asyncio
+import csv
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+COLUMNS = (
+    ("t", np.int64),
+    ("o", np.float64),
+    ("h", np.float64),
+    ("l", np.float64),
+    ("c", np.float64),
+    ("v", np.float64),
+)
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION_SECONDS = {
+    "1": 60,
+    "5": 300,
+    "15": 900,
+    "30": 1800,
+    "60": 3600,
+    "D": 86400,
+    "W": 7 * 86400,
+    "M": 30 * 86400,
+}
+
+Bars = Dict[str, np.ndarray]
+
+TICKER_PATTERN = re.compile(r"^[A-Z0-9.\-]{1,15}$")
+
+# Users whose store (and its locks and open series) is kept between requests
+MAX_USER_STORES = 256
+
+
+def empty_bars() -> Bars:
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+
+
+def as_bars(data: Dict[str, Iterable]) -> Bars:
+    """Coerce provider/CSV columns into sorted, de-duplicated typed arrays."""
+    bars = {name: np.asarray(data.get(name, []), dtype=dtype) for name, dtype in COLUMNS}
+    length = min(len(column) for column in bars.values())
+    bars = {name: column[:length] for name, column in bars.items()}
+    _, first = np.unique(bars["t"], return_index=True)
+    return {name: column[first] for name, column in bars.items()}
+
+
+def _parse_timestamp(value: str) -> int:
+    """Unix seconds, or an ISO date/datetime string."""
+    value = value.strip()
+    try:
+        return int(float(value))
+    except ValueError:
+        return int(datetime.fromisoformat(value).timestamp())
+
+
+def valid_ticker(ticker: str) -> bool:
+    """A symbol that is safe to use as a directory name."""
+    return bool(TICKER_PATTERN.match(ticker.upper())) and ticker.strip(".") != ""
+
+
+def _column_path(directory: Path, name: str, dtype) -> Path:
+    return directory / f"{name}.{np.dtype(dtype).kind}8"
+
+
+class CandleSeries:
+    """Read-only, memory-mapped view of one ticker/resolution."""
+
+    def __init__(self, directory: Optional[Path]):
+        columns = {}
+        for name, dtype in COLUMNS:
+            path = _column_path(directory, name, dtype) if directory is not None else None
+            if path is not None and path.exists() and path.stat().st_size > 0:
+                columns[name] = np.memmap(path, dtype=dtype, mode="r")
+            else:
+                columns[name] = np.empty(0, dtype=dtype)
+        # A crash mid-append can leave columns of different lengths; trust the shortest
+        length = min(len(column) for column in columns.values())
+        self.columns: Bars = {name: column[:length] for name, column in columns.items()}
+
+    def __len__(self):
+        return len(self.columns["t"])
+
+    @property
+    def first_timestamp(self) -> Optional[int]:
+        return int(self.columns["t"][0]) if len(self) else None
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        return int(self.columns["t"][-1]) if len(self) else None
+
+    def slice(self, start_ts: int, end_ts: int) -> Bars:
+        """Bars with start_ts <= t <= end_ts (views, no copy)."""
+        t = self.columns["t"]
+        i = int(np.searchsorted(t, start_ts, side="left"))
+        j = int(np.searchsorted(t, end_ts, side="right"))
+        return {name: column[i:j] for name, column in self.columns.items()}
+
+
+class CandleStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._series: Dict[Tuple[str, str], CandleSeries] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self.fetches = 0
+        self.fetch_errors = 0
+
+    def _directory(self, ticker: str, resolution: str) -> Path:
+        if not valid_ticker(ticker):
+            raise ValueError(f"Invalid ticker: {ticker!r}")
+        directory = self.root / ticker.upper() / resolution
+        if not directory.resolve().is_relative_to(self.root.resolve()):
+            raise ValueError(f"Invalid ticker: {ticker!r}")
+        return directory
+
+    def lock(self, ticker: str, resolution: str) -> asyncio.Lock:
+        """Serializes writes to one ticker/resolution."""
+        return self._locks.setdefault((ticker.upper(), resolution), asyncio.Lock())
+
+    def _meta_path(self, ticker: str, resolution: str) -> Path:
+        return self._directory(ticker, resolution) / "meta.json"
+
+    def read_meta(self, ticker: str, resolution: str) -> Dict:
+        if not valid_ticker(ticker):
+            return {}
+        path = self._meta_path(ticker, resolution)
+        if not path.exists():
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self, ticker: str, resolution: str, meta: Dict):
+        path = self._meta_path(ticker, resolution)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    def series(self, ticker: str, resolution: str) -> CandleSeries:
+        if not valid_ticker(ticker):
+            return CandleSeries(None)
+        key = (ticker.upper(), resolution)
+        if key not in self._series:
+            self._series[key] = CandleSeries(self._directory(ticker, resolution))
+        return self._series[key]
+
+    def write_bars(
+        self,
+        ticker: str,
+        resolution: str,
+        bars: Bars,
+        currency: str,
+        covered: Optional[Tuple[int, int]] = None,
+        keep_existing: bool = False,
+    ) -> int:
+        """Add bars to the store, appending when they are all newer than what's stored.
+
+        `covered` is the requested time range the bars answer, recorded so the
+        same gap (e.g. a weekend with no bars) isn't fetched again. Stored bars
+        with the same timestamp are replaced unless `keep_existing`. Returns
+        the number of bars added.
+        """
+        directory = self._directory(ticker, resolution)
+        directory.mkdir(parents=True, exist_ok=True)
+        existing = self.series(ticker, resolution)
+        meta = self.read_meta(ticker, resolution)
+
+        added = 0
+        if len(bars["t"]):
+            if not len(existing) or bars["t"][0] > existing.last_timestamp:
+                for name, dtype in COLUMNS:
+                    with open(_column_path(directory, name, dtype), "ab") as f:
+                        f.write(np.ascontiguousarray(bars[name], dtype=dtype).tobytes())
+                added = len(bars["t"])
+            else:
+                # as_bars keeps the first of duplicate timestamps
+                parts = [existing.columns, bars] if keep_existing else [bars, existing.columns]
+                merged = as_bars({
+                    name: np.concatenate([np.asarray(part[name]) for part in parts])
+                    for name, _ in COLUMNS
+                })
+                added = len(merged["t"]) - len(existing)
+                for name, dtype in COLUMNS:
+                    path = _column_path(directory, name, dtype)
+                    tmp = path.with_suffix(".tmp")
+                    merged[name].astype(dtype).tofile(tmp)
+                    os.replace(tmp, path)
+            self._series.pop((ticker.upper(), resolution), None)
+
+        if covered is not None:
+            start, end = covered
+            step = RESOLUTION_SECONDS.get(resolution, 86400)
+            if "start" not in meta:
+                meta["start"], meta["end"] = start, end
+            elif start <= meta["end"] + step and end >= meta["start"] - step:
+                meta["start"] = min(start, meta["start"])
+                meta["end"] = max(end, meta["end"])
+            # A disjoint range (e.g. an imported file) keeps its bars but isn't
+            # recorded, so the gap between the two ranges is still fetched
+        meta["currency"] = currency
+        self._write_meta(ticker, resolution, meta)
+        return added
+
+    def import_csv(self, ticker: str, resolution: str, lines: Iterable[str], currency: str) -> int:
+        """Import bars from CSV with a header of t/timestamp, open, high, low, close, volume.
+
+        Bars already stored are kept; returns the number of new bars.
+        """
+        aliases = {"timestamp": "t", "time": "t", "open": "o", "high": "h", "low": "l", "close": "c", "volume": "v"}
+        data: Dict[str, list] = {name: [] for name, _ in COLUMNS}
+        for row in csv.DictReader(lines):
+            values = {aliases.get(key.strip().lower(), key.strip().lower()): value for key, value in row.items() if key}
+            data["t"].append(_parse_timestamp(values.get("t", "")))
+            for name, _ in COLUMNS[1:]:
+                data[name].append(float(values.get(name) or 0))
+
+        bars = as_bars(data)
+        if not len(bars["t"]):
+            return 0
+        covered = (int(bars["t"][0]), int(bars["t"][-1]))
+        return self.write_bars(ticker, resolution, bars, currency, covered, keep_existing=True)
+
+    def missing_ranges(self, ticker: str, resolution: str, start_ts: int, end_ts: int):
+        """Sub-ranges of [start_ts, end_ts] not yet covered by the store."""
+        meta = self.read_meta(ticker, resolution)
+        if "start" not in meta:
+            return [(start_ts, end_ts)]
+        missing = []
+        if start_ts < meta["start"]:
+            missing.append((start_ts, meta["start"] - 1))
+        if end_ts > meta["end"]:
+            missing.append((meta["end"] + 1, end_ts))
+        return missing
+
+    async def ensure_range(self, ticker: str, resolution: str, start_ts: int, end_ts: int, fetch) -> None:
+        """Fill any uncovered part of the range using `fetch(ticker, resolution, from, to) -> (bars, currency)`.
+
+        `fetch` is a blocking provider call and runs in the thread pool.
+        """
+        if not valid_ticker(ticker):
+            return
+        async with self.lock(ticker, resolution):
+            for missing_start, missing_end in self.missing_ranges(ticker, resolution, start_ts, end_ts):
+                self.fetches += 1
+                try:
+                    data, currency = await run_in_threadpool(fetch, ticker, resolution, missing_start, missing_end)
+                except Exception as e:
+                    self.fetch_errors += 1
+                    logger.error("Candle fetch failed", extra={"ticker": ticker, "resolution": resolution, "error": str(e)})
+                    continue
+                # Don't mark the still-forming latest bar as covered, so it is fetched again later
+                covered_end = min(missing_end, int(time.time()) - RESOLUTION_SECONDS.get(resolution, 86400))
+                covered = (missing_start, covered_end) if covered_end >= missing_start else None
+                await run_in_threadpool(self.write_bars, ticker, resolution, as_bars(data), currency, covered)
+
+    def get_status(self) -> Dict:
+        return {
+            "root": str(self.root),
+            "open_series": len(self._series),
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+        }
+
+
+class UserCandleStore:
+    """One user's imported bars layered over the shared store.
+
+    Each ticker/resolution is read from exactly one layer: the user's own if
+    they have imported it, the shared one otherwise.
+    """
+
+    def __init__(self, shared: CandleStore, user_id: str):
+        self.shared = shared
+        self.own = CandleStore(shared.root / "imports" / user_id)
+
+    def _layer(self, ticker: str, resolution: str) -> CandleStore:
+        if valid_ticker(ticker) and self.own._meta_path(ticker, resolution).exists():
+            return self.own
+        return self.shared
+
+    def read_meta(self, ticker: str, resolution: str) -> Dict:
+        return self._layer(ticker, resolution).read_meta(ticker, resolution)
+
+    def series(self, ticker: str, resolution: str) -> CandleSeries:
+        return self._layer(ticker, resolution).series(ticker, resolution)
+
+    async def ensure_range(self, ticker: str, resolution: str, start_ts: int, end_ts: int, fetch) -> None:
+        await self._layer(ticker, resolution).ensure_range(ticker, resolution, start_ts, end_ts, fetch)
+
+    async def import_csv(self, ticker: str, resolution: str, lines: Iterable[str], currency: str) -> int:
+        """Import CSV bars into the user's own layer (parsing and writing run in the thread pool)."""
+        if not valid_ticker(ticker):
+            raise ValueError(f"Invalid ticker: {ticker!r}")
+        async with self.own.lock(ticker, resolution):
+            return await run_in_threadpool(self.own.import_csv, ticker, resolution, lines, currency)
+
+
+# Singleton instance
+candle_store: Optional[CandleStore] = None
+_user_stores: "OrderedDict[str, UserCandleStore]" = OrderedDict()
+
+
+def get_candle_store(root: str) -> CandleStore:
+    """Get or create candle store singleton."""
+    global candle_store
+    if candle_store is None:
+        candle_store = CandleStore(Path(root))
+    return candle_store
+
+
+def get_user_candle_store(root: str, user_id: str) -> UserCandleStore:
+    """The shared store as seen by one user, including their imported bars."""
+    store = _user_stores.get(user_id)
+    if store is None:
+        store = _user_stores[user_id] = UserCandleStore(get_candle_store(root), user_id)
+        while len(_user_stores) > MAX_USER_STORES:
+            _user_stores.popitem(last=False)
+    else:
+        _user_stores.move_to_end(user_id)
+    return store
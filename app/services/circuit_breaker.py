@@ -0,0 +1,149 @@
+"""
+Circuit breakers and request hedging for upstream price providers.
+
+A breaker counts consecutive failures (timeouts, connection errors, 5xx and
+429 responses) per provider. At BREAKER_FAILURE_THRESHOLD it opens: calls
+fail immediately with `CircuitOpenError` so callers serve stale or mock data
+instead of waiting out a timeout. After a jittered backoff it lets a single
+probe through (half-open); success closes it, failure reopens it with the
+backoff doubled, up to BREAKER_MAX_RESET_SECONDS.
+
+`LatencyTracker` keeps a window of recent latencies so a caller can hedge:
+if the first request is slower than the chosen percentile, send a second
+one and take whichever answers first.
+"""
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.core.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, max_reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = CLOSED
+        self.failures = 0  # Consecutive
+        self.opened = 0  # Times opened since the last success; drives the backoff
+        self.rejected = 0
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _backoff(self) -> float:
+        delay = min(self.max_reset_timeout, self.reset_timeout * 2 ** (self.opened - 1))
+        # Equal jitter: providers recovering from an outage don't get probed in lockstep
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def retry_after(self) -> float:
+        return max(0.0, self._open_until - time.monotonic())
+
+    def _rejecting(self) -> bool:
+        if self.state == OPEN:
+            return time.monotonic() < self._open_until
+        return self.state == HALF_OPEN and self._probe_in_flight
+
+    def is_open(self) -> bool:
+        """True (and counted as a rejection) while calls would be rejected.
+
+        Lets callers skip work ahead of the call, such as waiting on a rate
+        limiter. Doesn't claim the half-open probe.
+        """
+        with self._lock:
+            rejecting = self._rejecting()
+            if rejecting:
+                self.rejected += 1
+            return rejecting
+
+    def before_call(self):
+        """Admit a call or raise `CircuitOpenError`."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() >= self._open_until:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(self.name, self.retry_after())
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened += 1
+                self._open_until = time.monotonic() + self._backoff()
+                self._probe_in_flight = False
+
+    def get_status(self) -> Dict:
+        with self._lock:
+            state = OPEN if self._rejecting() else self.state
+        return {
+            "state": state,
+            "consecutive_failures": self.failures,
+            "retry_after_seconds": round(self.retry_after(), 1) if self.state == OPEN else None,
+            "rejected": self.rejected,
+        }
+
+
+class LatencyTracker:
+    """Recent request latencies, for choosing a hedging delay."""
+
+    def __init__(self, percentile: float, window: int = 200, min_samples: int = 20):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._latencies.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Latency at the percentile, or None until there are enough samples."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+
+
+# One breaker per provider, shared by every service instance that calls it
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Get or create the breaker for a provider."""
+    breaker = circuit_breakers.get(name)
+    if breaker is None:
+        breaker = circuit_breakers[name] = CircuitBreaker(
+            name,
+            settings.BREAKER_FAILURE_THRESHOLD,
+            settings.BREAKER_RESET_SECONDS,
+            settings.BREAKER_MAX_RESET_SECONDS,
+        )
+    return breaker
@@ -0,0 +1,175 @@
+"""
+In-process event bus for trade and setup writes, and for price ticks.
+
+Routes publish an event after a successful write (or when they learn a
+new price); `publish` only enqueues
+it, and background workers started in `lifespan` deliver events to the
+subscribed handlers. Adding consumers therefore doesn't add latency to the
+write path. Handler failures are reported and never reach the publisher.
+
+Write events and price ticks travel separately. Write events keep the
+in-memory indexes (stop losses, live P&L, search) in step with MongoDB, so
+they go through an unbounded queue and are never dropped. Ticks only matter
+as the latest price: a pending tick is replaced by a newer one for the same
+ticker, and only the oldest pending tickers are dropped if too many pile
+up. Each kind has its own worker, so a slow WebSocket push on a tick never
+holds up a trade event.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Type
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TradeCreated:
+    user_id: str
+    trade_id: str
+    ticker: str
+    direction: str
+    stop_loss: float
+    entry_price: float
+    size: int
+
+
+@dataclass(frozen=True)
+class TradeClosed:
+    user_id: str
+    trade_id: str
+    ticker: str
+    result_pnl: Optional[float]
+    partial: bool = False  # The original trade stays open with a smaller size
+
+
+@dataclass(frozen=True)
+class TradeDeleted:
+    user_id: str
+    trade_id: str
+    ticker: str
+    was_open: bool
+
+
+@dataclass(frozen=True)
+class TradesImported:
+    user_id: str
+    imported: int
+
+
+@dataclass(frozen=True)
+class SetupChanged:
+    user_id: str
+    setup_id: str
+
+
+@dataclass(frozen=True)
+class PriceTick:
+    ticker: str
+    price: float  # INR
+
+
+Event = TradeCreated | TradeClosed | TradeDeleted | TradesImported | SetupChanged | PriceTick
+Handler = Callable[[Event], Awaitable[None]]
+
+
+class EventBus:
+    def __init__(self, max_pending_ticks: int = 10000):
+        self._handlers: Dict[Type, List[Handler]] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # ticker -> latest undelivered tick, oldest ticker first
+        self._ticks: "OrderedDict[str, PriceTick]" = OrderedDict()
+        self._ticks_ready = asyncio.Event()
+        self.max_pending_ticks = max_pending_ticks
+        self._worker: Optional[asyncio.Task] = None
+        self._tick_worker: Optional[asyncio.Task] = None
+        self.published = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.handler_errors = 0
+
+    def subscribe(self, event_type: Type, handler: Handler):
+        self._handlers.setdefault(event_type, []).append(handler)
+
+    def publish(self, event: Event):
+        """Queue an event for delivery. Never blocks; only price ticks are ever coalesced or dropped."""
+        self.published += 1
+        if not isinstance(event, PriceTick):
+            self._queue.put_nowait(event)
+            return
+        if event.ticker in self._ticks:
+            self.coalesced += 1
+        elif len(self._ticks) >= self.max_pending_ticks:
+            self._ticks.popitem(last=False)
+            self.dropped += 1
+            logger.warning("Too many pending price ticks, dropped the oldest")
+        self._ticks[event.ticker] = event
+        self._ticks_ready.set()
+
+    async def _dispatch(self, event: Event):
+        for handler in self._handlers.get(type(event), []):
+            try:
+                await handler(event)
+            except Exception as e:
+                self.handler_errors += 1
+                logger.exception(
+                    "Event handler failed",
+                    extra={"handler": handler.__name__, "event": type(event).__name__},
+                )
+        self.delivered += 1
+
+    async def _run(self):
+        while True:
+            event = await self._queue.get()
+            try:
+                await self._dispatch(event)
+            finally:
+                self._queue.task_done()
+
+    async def _run_ticks(self):
+        while True:
+            await self._ticks_ready.wait()
+            while self._ticks:
+                _, tick = self._ticks.popitem(last=False)
+                await self._dispatch(tick)
+            self._ticks_ready.clear()
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+            self._tick_worker = asyncio.create_task(self._run_ticks())
+
+    async def stop(self, timeout: float = 5.0):
+        """Deliver what is already queued (up to `timeout`), then stop the worker."""
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Event bus stopped with undelivered events", extra={"undelivered": self._queue.qsize()})
+        # Pending ticks are only prices, which the next process fetches anew
+        workers = [self._worker, self._tick_worker]
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._worker = None
+        self._tick_worker = None
+        self._ticks.clear()
+
+    def get_status(self) -> Dict:
+        return {
+            "running": self._worker is not None,
+            "queued": self._queue.qsize(),
+            "pending_ticks": len(self._ticks),
+            "coalesced": self.coalesced,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "handler_errors": self.handler_errors,
+        }
+
+
+# Singleton instance
+event_bus = EventBus()
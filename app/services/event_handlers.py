@@ -0,0 +1,127 @@
+"""
+Consumers of trade, setup and price events.
+
+All of these run on the event bus worker, off the request path.
+"""
+from app.core.serialization import dumps
+from app.db.database import get_setups_collection, get_trades_collection
+from app.services.alert_service import check_for_alerts, stop_loss_index
+from app.services.event_bus import (
+    EventBus,
+    PriceTick,
+    SetupChanged,
+    TradeClosed,
+    TradeCreated,
+    TradeDeleted,
+    TradesImported,
+)
+from app.services.live_pnl import live_pnl
+from app.services.read_cache import read_cache
+from app.services.search_service import search_index
+from app.services.statistics_service import compute_statistics
+from app.services.websocket_manager import ConnectionManager
+
+
+def register_event_handlers(bus: EventBus, manager: ConnectionManager):
+    async def subscribe_to_ticker(event: TradeCreated):
+        # Only connected users have a subscription set to add to
+        if event.user_id in manager.user_subscriptions:
+            await manager.subscribe(event.user_id, [event.ticker])
+
+    async def unsubscribe_from_ticker(event):
+        if isinstance(event, TradeClosed) and event.partial:
+            return
+        if isinstance(event, TradeDeleted) and not event.was_open:
+            return
+        if event.ticker not in manager.user_subscriptions.get(event.user_id, ()):
+            return
+        still_open = await get_trades_collection().count_documents(
+            {"user_id": event.user_id, "ticker": event.ticker, "status": "open"}, limit=1
+        )
+        if not still_open:
+            manager.unsubscribe(event.user_id, [event.ticker])
+
+    async def index_stop_loss(event: TradeCreated):
+        stop_loss_index.add(event.user_id, event.trade_id, event.ticker, event.direction, event.stop_loss)
+
+    async def unindex_stop_loss(event):
+        if isinstance(event, TradeClosed) and event.partial:
+            return
+        stop_loss_index.remove(event.trade_id)
+
+    async def reindex_user_stops(event: TradesImported):
+        await stop_loss_index.load(get_trades_collection(), event.user_id)
+
+    async def index_position(event: TradeCreated):
+        live_pnl.add(event.user_id, event.trade_id, event.ticker, event.direction, event.entry_price, event.size)
+
+    async def unindex_position(event):
+        if isinstance(event, TradeClosed) and event.partial:
+            # The trade stays open with fewer shares
+            await live_pnl.reload_trade(get_trades_collection(), event.trade_id)
+            return
+        live_pnl.remove(event.trade_id)
+
+    async def reindex_user_positions(event: TradesImported):
+        await live_pnl.load(get_trades_collection(), event.user_id)
+
+    async def push_live_pnl(event: PriceTick):
+        await live_pnl.on_price(event.ticker, event.price, manager)
+
+    async def push_stop_alerts(event: PriceTick):
+        await check_for_alerts(event.ticker, event.price, manager)
+
+    async def reindex_notes(event):
+        # Also covers the remaining part of a partial close; the closed part is new and forces a rebuild
+        await search_index.refresh_trade(get_trades_collection(), event.user_id, event.trade_id)
+
+    async def unindex_notes(event: TradeDeleted):
+        search_index.remove_trade(event.user_id, event.trade_id)
+
+    async def drop_notes_index(event: TradesImported):
+        search_index.drop(event.user_id)
+
+    async def reindex_setup_notes(event: SetupChanged):
+        await search_index.refresh_setups(get_setups_collection(), event.user_id)
+
+    async def purge_read_cache(event):
+        # Versions were already bumped by the route; this just frees the old bodies
+        read_cache.purge(event.user_id)
+
+    async def refresh_statistics(event):
+        # Recompute now so the dashboard's next /statistics read is a cache hit
+        version = read_cache.version(event.user_id)
+        statistics = await compute_statistics(get_trades_collection(), event.user_id)
+        read_cache.put(event.user_id, "statistics", version, dumps(statistics))
+
+    bus.subscribe(TradeCreated, subscribe_to_ticker)
+    bus.subscribe(TradeCreated, index_stop_loss)
+    bus.subscribe(TradeCreated, index_position)
+    bus.subscribe(TradeCreated, reindex_notes)
+    bus.subscribe(TradeCreated, purge_read_cache)
+
+    bus.subscribe(TradeClosed, unsubscribe_from_ticker)
+    bus.subscribe(TradeClosed, unindex_stop_loss)
+    bus.subscribe(TradeClosed, unindex_position)
+    bus.subscribe(TradeClosed, reindex_notes)
+    bus.subscribe(TradeClosed, purge_read_cache)
+    bus.subscribe(TradeClosed, refresh_statistics)
+
+    bus.subscribe(TradeDeleted, unsubscribe_from_ticker)
+    bus.subscribe(TradeDeleted, unindex_stop_loss)
+    bus.subscribe(TradeDeleted, unindex_position)
+    bus.subscribe(TradeDeleted, unindex_notes)
+    bus.subscribe(TradeDeleted, purge_read_cache)
+    bus.subscribe(TradeDeleted, refresh_statistics)
+
+    bus.subscribe(TradesImported, reindex_user_stops)
+    bus.subscribe(TradesImported, reindex_user_positions)
+    bus.subscribe(TradesImported, drop_notes_index)
+    bus.subscribe(TradesImported, purge_read_cache)
+    bus.subscribe(TradesImported, refresh_statistics)
+
+    bus.subscribe(SetupChanged, purge_read_cache)
+    bus.subscribe(SetupChanged, reindex_setup_notes)
+
+    bus.subscribe(PriceTick, push_live_pnl)
+    bus.subscribe(PriceTick, push_stop_alerts)
@@ -13,14 +13,36 @@ Sign up: https://www.exchangerate-api.com/
 import requests
 from typing import Dict, Optional
 from datetime import datetime, timedelta
+import logging
+import time
+
+from app.core.logging_config import LOG_SAMPLE_RATE
+from app.core.metrics import CACHE_REQUESTS, UPSTREAM_REQUEST_DURATION, UPSTREAM_REQUESTS
+from app.services.circuit_breaker import get_circuit_breaker
+from app.services.quota_service import QuotaLedger
+
+
+logger = logging.getLogger(__name__)
+
+# Approximate rate used when nothing has been fetched yet
+FALLBACK_RATE = 83.0
 
 
 class ExchangeRateService:
     """Service for fetching USD to INR exchange rates."""
     
-    def __init__(self, api_key: str, provider: str = "exchangerate-api"):
+    def __init__(
+        self,
+        api_key: str,
+        provider: str = "exchangerate-api",
+        session: Optional[requests.Session] = None,
+        ledger: Optional[QuotaLedger] = None,
+    ):
         self.api_key = api_key
         self.provider = provider
+        self.session = session or requests.Session()
+        self.ledger = ledger  # Monthly quota accounting (free tier: 1500 requests/month)
+        self.breaker = get_circuit_breaker("exchange_rate")
         
         # Caching - exchange rates don't change frequently
         self._cached_rate: Optional[float] = None
@@ -44,8 +66,22 @@ class ExchangeRateService:
         # Check cache first
         if self._cached_rate and self._cache_timestamp:
             if datetime.now() - self._cache_timestamp < self._cache_duration:
-                print(f"💱 Using cached exchange rate: 1 USD = ₹{self._cached_rate:.2f}")
+                logger.debug("Exchange rate cache hit", extra={"rate": self._cached_rate, "sample_rate": LOG_SAMPLE_RATE})
+                CACHE_REQUESTS.inc("exchange_rate", "hit")
                 return self._cached_rate
+        CACHE_REQUESTS.inc("exchange_rate", "miss")
+        
+        # Provider is failing: keep the stale rate instead of waiting out a timeout
+        if self.breaker.is_open():
+            rate = self._cached_rate or FALLBACK_RATE
+            logger.debug("Exchange rate circuit open, not refreshing", extra={"rate": rate, "stale": bool(self._cached_rate)})
+            return rate
+        
+        # Stretch the monthly quota: keep using the stale rate while ahead of budget
+        if self.ledger is not None and not self.ledger.should_call("exchange_rate", have_stale=bool(self._cached_rate)):
+            rate = self._cached_rate or FALLBACK_RATE
+            logger.info("Exchange rate quota reserved, not refreshing", extra={"rate": rate, "stale": bool(self._cached_rate)})
+            return rate
         
         # Fetch fresh rate
         try:
@@ -55,29 +91,47 @@ class ExchangeRateService:
             self._cached_rate = rate
             self._cache_timestamp = datetime.now()
             
-            print(f"💱 Fetched exchange rate: 1 USD = ₹{rate:.2f}")
+            logger.info("Fetched exchange rate", extra={"provider": self.provider, "rate": rate})
             return rate
             
         except Exception as e:
-            print(f"❌ Exchange rate API error: {e}")
+            logger.error("Exchange rate request failed", extra={"provider": self.provider, "error": str(e)})
             
             # Fallback to cached rate if available
             if self._cached_rate:
-                print(f"⚠️ Using stale cached rate: 1 USD = ₹{self._cached_rate:.2f}")
+                logger.warning("Using stale cached exchange rate", extra={"rate": self._cached_rate})
                 return self._cached_rate
             
             # Ultimate fallback: approximate rate
-            fallback_rate = 83.0
-            print(f"⚠️ Using fallback rate: 1 USD = ₹{fallback_rate:.2f}")
+            fallback_rate = FALLBACK_RATE
+            logger.warning("Using fallback exchange rate", extra={"rate": fallback_rate})
             return fallback_rate
     
+    def get_cached_rate(self) -> float:
+        """Last fetched rate (however old) or the fallback, without calling the provider."""
+        return self._cached_rate or FALLBACK_RATE
+    
     def _fetch_rate(self) -> float:
         """Fetch rate from the configured provider."""
         if self.provider not in self.endpoints:
             raise ValueError(f"Unknown provider: {self.provider}")
         
         url = self.endpoints[self.provider]
-        response = requests.get(url, timeout=10)
+        self.breaker.before_call()
+        if self.ledger is not None:
+            self.ledger.record("exchange_rate")
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = self.session.get(url, timeout=10)
+            outcome = str(response.status_code)
+        finally:
+            UPSTREAM_REQUEST_DURATION.observe("exchange_rate", self.provider, value=time.perf_counter() - start)
+            UPSTREAM_REQUESTS.inc("exchange_rate", self.provider, outcome)
+            if outcome in ("error", "429") or outcome.startswith("5"):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
         response.raise_for_status()
         data = response.json()
         
@@ -109,6 +163,19 @@ class ExchangeRateService:
         rate = self.get_usd_to_inr_rate()
         return usd_amount * rate
     
+    def export_cache(self) -> Optional[Dict]:
+        """The cached rate with its Unix timestamp, for a warm-start snapshot."""
+        if not (self._cached_rate and self._cache_timestamp):
+            return None
+        return {'rate': self._cached_rate, 'cached_at': self._cache_timestamp.timestamp()}
+    
+    def import_cache(self, entry: Dict):
+        """Restore a snapshot rate with its original timestamp, unless a newer one is cached."""
+        cached_at = datetime.fromtimestamp(entry['cached_at'])
+        if self._cache_timestamp is None or self._cache_timestamp < cached_at:
+            self._cached_rate = entry['rate']
+            self._cache_timestamp = cached_at
+    
     def get_status(self) -> Dict:
         """Get service status."""
         cache_valid = False
@@ -125,6 +192,8 @@ class ExchangeRateService:
             'cache_valid': cache_valid,
             'cache_age_seconds': cache_age_seconds,
             'cache_duration_seconds': int(self._cache_duration.total_seconds()),
+            'quota': self.ledger.forecast("exchange_rate") if self.ledger is not None else None,
+            'circuit_breaker': self.breaker.get_status(),
             'message': f"1 USD = ₹{self._cached_rate:.2f}" if self._cached_rate else "No rate cached yet"
         }
 
@@ -133,9 +202,14 @@ class ExchangeRateService:
 exchange_rate_service: Optional[ExchangeRateService] = None
 
 
-def get_exchange_rate_service(api_key: str, provider: str = "exchangerate-api") -> ExchangeRateService:
+def get_exchange_rate_service(
+    api_key: str,
+    provider: str = "exchangerate-api",
+    session: Optional[requests.Session] = None,
+    ledger: Optional[QuotaLedger] = None,
+) -> ExchangeRateService:
     """Get or create exchange rate service singleton."""
     global exchange_rate_service
     if exchange_rate_service is None:
-        exchange_rate_service = ExchangeRateService(api_key, provider)
+        exchange_rate_service = ExchangeRateService(api_key, provider, session, ledger)
     return exchange_rate_service
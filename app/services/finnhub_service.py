@@ -9,19 +9,59 @@ import requests
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import logging
+import threading
 import time
 
+from app.core.config import settings
+from app.core.logging_config import LOG_SAMPLE_RATE
+from app.core.metrics import (
+    CACHE_REQUESTS,
+    RATE_LIMIT_WAIT_SECONDS,
+    RATE_LIMIT_WAITS,
+    UPSTREAM_HEDGED_REQUESTS,
+    UPSTREAM_REQUEST_DURATION,
+    UPSTREAM_REQUESTS,
+)
+from app.services.circuit_breaker import CircuitOpenError, LatencyTracker, get_circuit_breaker
+from app.services.quota_service import QuotaLedger
+
+
+logger = logging.getLogger(__name__)
+
 
 class FinnhubService:
     """Service for fetching stock data from Finnhub API."""
     
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        session: Optional[requests.Session] = None,
+        ledger: Optional[QuotaLedger] = None,
+        hedge_percentile: Optional[float] = None,
+    ):
         self.api_key = api_key
         self.base_url = "https://finnhub.io/api/v1"
+        # Shared keep-alive session, so each call doesn't pay a new TLS handshake
+        self.session = session or requests.Session()
         
         # Rate limiting: 60 calls per minute
         self.max_calls_per_minute = 60
-        self.call_timestamps = deque()  # Track request timestamps
+        self.call_timestamps = deque()  # Track request timestamps (reserved slots may be in the future)
+        # Calls come from pool threads; slots are reserved under the lock, waited for outside it
+        self._rate_lock = threading.Lock()
+        
+        # Persistent quota accounting; picks up calls made before a restart
+        self.ledger = ledger
+        if ledger is not None:
+            self.max_calls_per_minute = ledger.budgets["finnhub"].per_minute or self.max_calls_per_minute
+            self.call_timestamps.extend(ledger.recent_calls("finnhub"))
+        
+        # Fail fast while Finnhub is down; hedge slow quote requests if enabled
+        self.breaker = get_circuit_breaker("finnhub")
+        self.quote_latency = LatencyTracker(hedge_percentile) if hedge_percentile else None
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
         
         # Caching to reduce API calls
         self._cache: Dict[str, Dict] = {}
@@ -39,27 +79,115 @@ class FinnhubService:
             "SIFY": "Sify Technologies Limited"
         }
     
+    def _recent_calls(self, now: float) -> int:
+        return sum(1 for ts in list(self.call_timestamps) if ts > now - 60)
+
     def _wait_for_rate_limit(self):
         """Enforce rate limit of 60 calls per minute."""
-        now = time.time()
+        with self._rate_lock:
+            now = time.time()
+            # Remove timestamps older than 1 minute
+            while self.call_timestamps and self.call_timestamps[0] < now - 60:
+                self.call_timestamps.popleft()
+            # With the minute full, the next free slot opens 60s after the call
+            # max_calls_per_minute back (counting slots other threads reserved)
+            slot = now
+            if len(self.call_timestamps) >= self.max_calls_per_minute:
+                slot = max(now, self.call_timestamps[-self.max_calls_per_minute] + 60)
+            self.call_timestamps.append(slot)
         
-        # Remove timestamps older than 1 minute
-        while self.call_timestamps and self.call_timestamps[0] < now - 60:
-            self.call_timestamps.popleft()
+        sleep_time = slot - now
+        if sleep_time > 0:
+            logger.warning("Finnhub rate limit reached, sleeping", extra={"sleep_seconds": round(sleep_time, 1)})
+            RATE_LIMIT_WAITS.inc("finnhub")
+            RATE_LIMIT_WAIT_SECONDS.inc("finnhub", amount=sleep_time)
+            time.sleep(sleep_time)
+        if self.ledger is not None:
+            self.ledger.record("finnhub", slot)
+    
+    def _take_spare_call(self) -> bool:
+        """Use a rate-limit slot for a hedged request, only if one is free without waiting."""
+        with self._rate_lock:
+            now = time.time()
+            # Leave one slot for the next regular request
+            if self._recent_calls(now) >= self.max_calls_per_minute - 1:
+                return False
+            self.call_timestamps.append(now)
+        if self.ledger is not None:
+            self.ledger.record("finnhub", now)
+        return True
+    
+    def _request(self, endpoint: str, params: Dict) -> requests.Response:
+        """GET an API endpoint through the circuit breaker, recording call count, latency and outcome."""
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            UPSTREAM_REQUESTS.inc("finnhub", endpoint, "circuit_open")
+            raise
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = self.session.get(
+                f"{self.base_url}/{endpoint}",
+                params={**params, "token": self.api_key},
+                timeout=10
+            )
+            outcome = str(response.status_code)
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            UPSTREAM_REQUEST_DURATION.observe("finnhub", endpoint, value=elapsed)
+            UPSTREAM_REQUESTS.inc("finnhub", endpoint, outcome)
+            # 4xx other than 429 is about the request (unknown ticker, bad key), not Finnhub's health
+            if outcome in ("error", "429") or outcome.startswith("5"):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+                if endpoint == "quote" and self.quote_latency is not None:
+                    self.quote_latency.observe(elapsed)
+    
+    def _fetch_quote(self, ticker: str) -> requests.Response:
+        """Request a quote; if hedging is on and it's slower than usual, race a second request."""
+        delay = self.quote_latency.hedge_delay() if self.quote_latency is not None else None
+        if delay is None:
+            return self._request("quote", {"symbol": ticker})
         
-        # If we've made 60 calls in the last minute, wait
-        if len(self.call_timestamps) >= self.max_calls_per_minute:
-            sleep_time = 60 - (now - self.call_timestamps[0])
-            if sleep_time > 0:
-                print(f"⏳ Rate limit: sleeping {sleep_time:.1f}s")
-                time.sleep(sleep_time)
-                # Clear old timestamps after sleeping
-                now = time.time()
-                while self.call_timestamps and self.call_timestamps[0] < now - 60:
-                    self.call_timestamps.popleft()
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="finnhub-hedge")
+        primary = self._hedge_executor.submit(self._request, "quote", {"symbol": ticker})
+        done, _ = wait((primary,), timeout=delay)
+        if done or not self._take_spare_call():
+            return primary.result()
         
-        # Record this call
-        self.call_timestamps.append(now)
+        UPSTREAM_HEDGED_REQUESTS.inc("finnhub")
+        pending = {primary, self._hedge_executor.submit(self._request, "quote", {"symbol": ticker})}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                # First success wins; an error only counts once both have failed
+                if future.exception() is None or not pending:
+                    return future.result()
+    
+    def _serve_stale(self, ticker: str, cached: Optional[Dict], warning: str) -> Dict:
+        """The expired cached quote, or an `unavailable` result when there is none."""
+        if cached is not None:
+            CACHE_REQUESTS.inc("finnhub_quote", "stale")
+            result = {k: v for k, v in cached.items() if k != 'cached_at'}
+            result['stale'] = True
+            return result
+        return {
+            'ticker': ticker,
+            'price': None,
+            'found': False,
+            'is_indian_adr': False,
+            'unavailable': True,
+            'warning': warning
+        }
+    
+    def shutdown(self):
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+            self._hedge_executor = None
     
     def get_quote(self, ticker: str) -> Dict:
         """
@@ -89,14 +217,28 @@ class FinnhubService:
         
         # Check cache first
         cache_key = f"quote_{ticker}"
-        if cache_key in self._cache:
-            cached = self._cache[cache_key]
+        cached = self._cache.get(cache_key)
+        if cached is not None:
             if datetime.now() - cached['cached_at'] < self._cache_duration:
-                print(f"📦 Cache HIT for {ticker}")
+                logger.debug("Quote cache hit", extra={"ticker": ticker, "sample_rate": LOG_SAMPLE_RATE})
+                CACHE_REQUESTS.inc("finnhub_quote", "hit")
                 result = {k: v for k, v in cached.items() if k != 'cached_at'}
                 return result
         
-        print(f"📭 Cache MISS for {ticker} - querying Finnhub API...")
+        # Finnhub is failing: don't wait out another timeout
+        if self.breaker.is_open():
+            logger.info("Finnhub circuit open, serving stale quote", extra={"ticker": ticker, "stale": cached is not None})
+            return self._serve_stale(ticker, cached, "⚠️ Finnhub is unavailable right now. Try again shortly.")
+        
+        # Out of quota: a stale quote beats waiting on (or exceeding) the limit
+        if self.ledger is not None and not self.ledger.should_call("finnhub", have_stale=cached is not None):
+            logger.info("Finnhub quota reserved, serving stale quote", extra={"ticker": ticker, "stale": cached is not None})
+            return self._serve_stale(
+                ticker, cached, "Finnhub monthly quota exhausted. Try again next month or raise FINNHUB_CALLS_PER_MONTH."
+            )
+        
+        logger.debug("Quote cache miss, querying Finnhub", extra={"ticker": ticker})
+        CACHE_REQUESTS.inc("finnhub_quote", "miss")
         
         # Check if it's a known Indian stock
         is_indian_adr = ticker in self.indian_stocks_adr
@@ -110,14 +252,7 @@ class FinnhubService:
         
         # Fetch from Finnhub
         try:
-            response = requests.get(
-                f"{self.base_url}/quote",
-                params={
-                    "symbol": ticker,
-                    "token": self.api_key
-                },
-                timeout=10
-            )
+            response = self._fetch_quote(ticker)
             response.raise_for_status()
             data = response.json()
             
@@ -148,13 +283,13 @@ class FinnhubService:
                 **result,
                 'cached_at': datetime.now()
             }
-            print(f"✅ Cached quote for {ticker}: ${result['price']:.2f} USD (valid for 5 min)")
+            logger.info("Cached Finnhub quote", extra={"ticker": ticker, "price_usd": result['price'], "found": result['found']})
             
             return result
             
         except requests.exceptions.HTTPError as e:
             if '403' in str(e) or 'Forbidden' in str(e):
-                print(f"❌ Finnhub API 403 Forbidden for {ticker} - API key may be invalid or ticker not supported")
+                logger.warning("Finnhub returned 403; API key invalid or ticker not supported", extra={"ticker": ticker})
                 return {
                     'ticker': ticker,
                     'price': None,
@@ -163,23 +298,45 @@ class FinnhubService:
                     'warning': f"⚠️ Ticker '{ticker}' not available. Finnhub free tier supports US stocks only. Check your API key or try US tickers."
                 }
             else:
-                print(f"❌ Finnhub API HTTP error for {ticker}: {e}")
-                return {
-                    'ticker': ticker,
-                    'price': None,
-                    'found': False,
-                    'is_indian_adr': False,
-                    'warning': f"API error: {str(e)}"
-                }
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Finnhub API error for {ticker}: {e}")
-            return {
-                'ticker': ticker,
-                'price': None,
-                'found': False,
-                'is_indian_adr': False,
-                'warning': f"Failed to fetch quote: {str(e)}"
-            }
+                logger.error("Finnhub HTTP error", extra={"ticker": ticker, "error": str(e)})
+                return self._serve_stale(ticker, cached, f"API error: {str(e)}")
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
+            logger.error("Finnhub request failed", extra={"ticker": ticker, "error": str(e)})
+            return self._serve_stale(ticker, cached, f"Failed to fetch quote: {str(e)}")
+    
+    def get_cached_quote(self, ticker: str) -> Optional[Dict]:
+        """The cached quote, possibly expired (flagged `stale`), without calling Finnhub."""
+        cached = self._cache.get(f"quote_{ticker.upper().strip()}")
+        if cached is None:
+            return None
+        result = {k: v for k, v in cached.items() if k != 'cached_at'}
+        result['stale'] = datetime.now() - cached['cached_at'] >= self._cache_duration
+        return result
+    
+    def stale_quotes(self, since: datetime) -> List[str]:
+        """Tickers whose cached quote has expired but was fetched after `since`, newest first."""
+        now = datetime.now()
+        entries = [
+            (entry['cached_at'], key[len("quote_"):])
+            for key, entry in list(self._cache.items())
+            if key.startswith("quote_") and since <= entry['cached_at'] and now - entry['cached_at'] >= self._cache_duration
+        ]
+        return [ticker for _, ticker in sorted(entries, reverse=True)]
+    
+    def export_cache(self) -> Dict[str, Dict]:
+        """Cache entries with `cached_at` as a Unix timestamp, for a warm-start snapshot."""
+        return {key: {**entry, 'cached_at': entry['cached_at'].timestamp()} for key, entry in list(self._cache.items())}
+    
+    def import_cache(self, entries: Dict[str, Dict]) -> int:
+        """Restore snapshot entries with their original timestamps, so TTLs still apply. Newer entries win."""
+        restored = 0
+        for key, entry in entries.items():
+            cached_at = datetime.fromtimestamp(entry['cached_at'])
+            current = self._cache.get(key)
+            if current is None or current['cached_at'] < cached_at:
+                self._cache[key] = {**entry, 'cached_at': cached_at}
+                restored += 1
+        return restored
     
     def search_symbol(self, query: str) -> List[str]:
         """
@@ -196,20 +353,19 @@ class FinnhubService:
         if cache_key in self._cache:
             cached = self._cache[cache_key]
             if datetime.now() - cached['cached_at'] < timedelta(hours=1):  # Cache searches for 1 hour
+                CACHE_REQUESTS.inc("finnhub_search", "hit")
                 return cached['results']
+        CACHE_REQUESTS.inc("finnhub_search", "miss")
+        
+        # Suggestions are optional; skip them while Finnhub is failing
+        if self.breaker.is_open():
+            return []
         
         # Enforce rate limit
         self._wait_for_rate_limit()
         
         try:
-            response = requests.get(
-                f"{self.base_url}/search",
-                params={
-                    "q": query,
-                    "token": self.api_key
-                },
-                timeout=10
-            )
+            response = self._request("search", {"q": query})
             response.raise_for_status()
             data = response.json()
             
@@ -234,15 +390,46 @@ class FinnhubService:
             
             return suggestions
             
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Finnhub search error for '{query}': {e}")
+        except (requests.exceptions.RequestException, CircuitOpenError) as e:
+            logger.error("Finnhub search failed", extra={"query": query, "error": str(e)})
             return []
     
+    def get_candles(self, ticker: str, resolution: str, from_ts: int, to_ts: int) -> Dict[str, List]:
+        """
+        Get historical bars from `/stock/candle`.
+        
+        Returns columns {'t', 'o', 'h', 'l', 'c', 'v'} (empty lists when Finnhub has no data).
+        Raises requests exceptions on API errors, or CircuitOpenError while Finnhub is failing.
+        """
+        ticker = ticker.upper().strip()
+        
+        # Fail fast rather than spend a rate-limit slot on a call that would be rejected
+        if self.breaker.is_open():
+            raise CircuitOpenError("finnhub", self.breaker.retry_after())
+        
+        # Enforce rate limit
+        self._wait_for_rate_limit()
+        
+        response = self._request("stock/candle", {
+            "symbol": ticker,
+            "resolution": resolution,
+            "from": from_ts,
+            "to": to_ts,
+        })
+        response.raise_for_status()
+        data = response.json()
+        
+        # Finnhub returns {"s": "ok", "t": [...], "o": [...], ...} or {"s": "no_data"}
+        if data.get('s') != 'ok':
+            return {key: [] for key in ('t', 'o', 'h', 'l', 'c', 'v')}
+        return {key: data.get(key, []) for key in ('t', 'o', 'h', 'l', 'c', 'v')}
+    
     def get_status(self) -> Dict:
         """Get service status."""
         now = time.time()
         # Count calls in last minute
-        recent_calls = sum(1 for ts in self.call_timestamps if ts > now - 60)
+        recent_calls = self._recent_calls(now)
+        hedge_delay = self.quote_latency.hedge_delay() if self.quote_latency is not None else None
         
         return {
             'service': 'Finnhub',
@@ -251,6 +438,9 @@ class FinnhubService:
             'rate_limit': f"{self.max_calls_per_minute} calls/min",
             'calls_last_minute': recent_calls,
             'calls_remaining': max(0, self.max_calls_per_minute - recent_calls),
+            'quota': self.ledger.forecast("finnhub") if self.ledger is not None else None,
+            'circuit_breaker': self.breaker.get_status(),
+            'hedge_after_ms': round(hedge_delay * 1000, 1) if hedge_delay is not None else None,
             'message': f"Finnhub operational. {recent_calls}/{self.max_calls_per_minute} calls used in last minute."
         }
 
@@ -259,9 +449,13 @@ class FinnhubService:
 finnhub_service: Optional[FinnhubService] = None
 
 
-def get_finnhub_service(api_key: str) -> FinnhubService:
+def get_finnhub_service(
+    api_key: str,
+    session: Optional[requests.Session] = None,
+    ledger: Optional[QuotaLedger] = None,
+) -> FinnhubService:
     """Get or create Finnhub service singleton."""
     global finnhub_service
     if finnhub_service is None:
-        finnhub_service = FinnhubService(api_key)
+        finnhub_service = FinnhubService(api_key, session, ledger, settings.QUOTE_HEDGE_PERCENTILE)
     return finnhub_service
@@ -0,0 +1,201 @@
+"""
+Live unrealized P&L, pushed to connected clients as prices arrive.
+
+Open positions are indexed by ticker and then by user, loaded once at
+startup and kept current by trade events (like the stop-loss index). When
+the server learns a new price for a ticker (a `PriceTick`), only the
+positions on that ticker are recomputed, and only for users with a live
+WebSocket or SSE connection, so the work per tick scales with the affected
+positions rather than all open trades. When a user connects, their P&L is
+recomputed for every position whose ticker has a known price; from then on
+each trade's last P&L is kept, so the portfolio total covers all of those
+positions and is updated by difference.
+
+Messages carry absolute values, so a client that misses one is corrected
+by the next:
+
+    {"type": "pnl", "ticker": "TCS", "price": 3512.5,
+     "trades": {"<trade_id>": 1125.0}, "total": 2210.0}
+"""
+import asyncio
+import logging
+from typing import Dict, NamedTuple, Optional, Set
+
+from bson import ObjectId
+
+from app.core.metrics import WEBSOCKET_MESSAGES_SENT
+from app.services.pnl_service import calculate_unrealized_pnl
+from app.services.websocket_manager import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+SSE_QUEUE_SIZE = 100
+
+
+class Position(NamedTuple):
+    user_id: str
+    trade_id: str
+    ticker: str
+    direction: str
+    entry_price: float
+    size: int
+
+
+class LivePnl:
+    def __init__(self):
+        # ticker -> user_id -> trade_id -> position
+        self._by_ticker: Dict[str, Dict[str, Dict[str, Position]]] = {}
+        self._positions: Dict[str, Position] = {}
+        # user_id -> trade_id -> position
+        self._by_user: Dict[str, Dict[str, Position]] = {}
+        self._last_price: Dict[str, float] = {}
+        # user_id -> trade_id -> last pushed P&L, and their sum
+        self._pnl: Dict[str, Dict[str, float]] = {}
+        self._totals: Dict[str, float] = {}
+        self._listeners: Dict[str, Set[asyncio.Queue]] = {}
+        self.loaded = False
+        self.ticks = 0
+        self.recomputed = 0
+        self.sse_dropped = 0
+
+    async def load(self, collection, user_id: Optional[str] = None):
+        """Load open trades (all users, or one user after an import)."""
+        query = {"status": "open"}
+        if user_id is not None:
+            query["user_id"] = user_id
+        projection = {"user_id": 1, "ticker": 1, "direction": 1, "entryPrice": 1, "size": 1}
+        async for trade in collection.find(query, projection):
+            self.add(trade["user_id"], str(trade["_id"]), trade["ticker"], trade["direction"], trade["entryPrice"], trade["size"])
+        if user_id is None:
+            self.loaded = True
+
+    async def reload_trade(self, collection, trade_id: str):
+        """Re-read one trade, e.g. after a partial close changed its size."""
+        self.remove(trade_id)
+        trade = await collection.find_one(
+            {"_id": ObjectId(trade_id), "status": "open"},
+            {"user_id": 1, "ticker": 1, "direction": 1, "entryPrice": 1, "size": 1},
+        )
+        if trade is not None:
+            self.add(trade["user_id"], trade_id, trade["ticker"], trade["direction"], trade["entryPrice"], trade["size"])
+
+    def add(self, user_id: str, trade_id: str, ticker: str, direction: str, entry_price: float, size: int):
+        self.remove(trade_id)
+        position = Position(user_id, trade_id, ticker, direction, entry_price, size)
+        self._by_ticker.setdefault(ticker, {}).setdefault(user_id, {})[trade_id] = position
+        self._positions[trade_id] = position
+        self._by_user.setdefault(user_id, {})[trade_id] = position
+
+    def remove(self, trade_id: str):
+        position = self._positions.pop(trade_id, None)
+        if position is None:
+            return
+        holders = self._by_ticker.get(position.ticker, {})
+        trades = holders.get(position.user_id, {})
+        trades.pop(trade_id, None)
+        if not trades:
+            holders.pop(position.user_id, None)
+        if not holders:
+            self._by_ticker.pop(position.ticker, None)
+        user_positions = self._by_user.get(position.user_id, {})
+        user_positions.pop(trade_id, None)
+        if not user_positions:
+            self._by_user.pop(position.user_id, None)
+        pnl = self._pnl.get(position.user_id, {}).pop(trade_id, None)
+        if pnl is not None:
+            self._totals[position.user_id] -= pnl
+
+    def seed(self, user_id: str):
+        """Recompute a user's P&L for all their positions from the last known prices.
+
+        Called when they connect: ticks are only applied for connected users,
+        so what was kept from an earlier connection may be out of date.
+        """
+        user_pnl: Dict[str, float] = {}
+        for position in self._by_user.get(user_id, {}).values():
+            price = self._last_price.get(position.ticker)
+            if price is not None:
+                user_pnl[position.trade_id] = round(
+                    calculate_unrealized_pnl(position.direction, position.entry_price, price, position.size), 2
+                )
+        self._pnl[user_id] = user_pnl
+        self._totals[user_id] = sum(user_pnl.values())
+
+    def listen(self, user_id: str) -> asyncio.Queue:
+        """Queue receiving this user's P&L messages (for an SSE stream)."""
+        self.seed(user_id)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        self._listeners.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unlisten(self, user_id: str, queue: asyncio.Queue):
+        queues = self._listeners.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._listeners[user_id]
+
+    async def on_price(self, ticker: str, price: float, manager: ConnectionManager):
+        """Recompute the positions on `ticker` for connected users and push what changed."""
+        if self._last_price.get(ticker) == price:
+            return
+        self._last_price[ticker] = price
+        self.ticks += 1
+
+        for user_id, trades in self._by_ticker.get(ticker, {}).items():
+            connection = manager.active_connections.get(user_id)
+            queues = self._listeners.get(user_id)
+            if connection is None and not queues:
+                continue
+
+            user_pnl = self._pnl.setdefault(user_id, {})
+            changed: Dict[str, float] = {}
+            for position in trades.values():
+                pnl = round(calculate_unrealized_pnl(position.direction, position.entry_price, price, position.size), 2)
+                previous = user_pnl.get(position.trade_id)
+                if pnl != previous:
+                    user_pnl[position.trade_id] = pnl
+                    self._totals[user_id] = self._totals.get(user_id, 0.0) + pnl - (previous or 0.0)
+                    changed[position.trade_id] = pnl
+            self.recomputed += len(trades)
+            if not changed:
+                continue
+
+            message = {
+                "type": "pnl",
+                "ticker": ticker,
+                "price": price,
+                "trades": changed,
+                "total": round(self._totals[user_id], 2),
+            }
+            if connection is not None:
+                try:
+                    await connection.send_json(message)
+                    WEBSOCKET_MESSAGES_SENT.inc("pnl")
+                except Exception as e:
+                    # The socket's own receive loop notices the disconnect and cleans up
+                    logger.debug("P&L push failed", extra={"user_id": user_id, "error": str(e)})
+            for queue in queues or ():
+                if queue.full():
+                    # Values are absolute, so the oldest message is the one to lose
+                    queue.get_nowait()
+                    self.sse_dropped += 1
+                queue.put_nowait(message)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def get_status(self) -> Dict:
+        return {
+            "loaded": self.loaded,
+            "positions": len(self._positions),
+            "tickers": len(self._by_ticker),
+            "sse_listeners": sum(len(queues) for queues in self._listeners.values()),
+            "ticks": self.ticks,
+            "positions_recomputed": self.recomputed,
+            "sse_dropped": self.sse_dropped,
+        }
+
+
+# Singleton instance
+live_pnl = LivePnl()
@@ -0,0 +1,159 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A task on the loop sleeps for a fixed interval and records how late it
+wakes up: that delay is the scheduling lag every other coroutine saw.
+A watchdog thread watches the task's heartbeat; when the loop hasn't come
+back within the threshold, something is blocking it, and the watchdog
+captures the loop thread's stack at that moment. Stalls are grouped by the
+innermost application frame, so the worst offenders can be listed with the
+code that caused them.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+EVENT_LOOP_LAG = registry.histogram("event_loop_lag_seconds", "Event-loop scheduling delay", buckets=LAG_BUCKETS)
+EVENT_LOOP_BLOCKED = registry.counter("event_loop_blocked_total", "Event-loop stalls longer than the threshold")
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_OFFENDERS = 100
+STACK_DEPTH = 20
+
+
+def _offender_key(stack: List[traceback.FrameSummary]) -> str:
+    """Innermost frame in application code (or the innermost frame at all)."""
+    for frame in reversed(stack):
+        if frame.filename.startswith(APP_ROOT) and not frame.filename.endswith("loop_monitor.py"):
+            return f"{os.path.relpath(frame.filename, os.path.dirname(APP_ROOT))}:{frame.lineno} in {frame.name}"
+    frame = stack[-1]
+    return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+
+class LoopMonitor:
+    def __init__(self, interval: float, block_threshold: float):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        # Heartbeat during which the current stall was captured, and its offender
+        self._stalled_beat: Optional[float] = None
+        self._stall_key: Optional[str] = None
+        self.offenders: Dict[str, Dict] = {}
+        self.samples = 0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, loop.time() - expected)
+            self._last_beat = now
+            self.samples += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            EVENT_LOOP_LAG.observe(value=lag)
+            if self._stall_key is not None:
+                self._finish_stall(lag)
+
+    def _finish_stall(self, lag: float):
+        with self._lock:
+            offender = self.offenders.get(self._stall_key)
+            if offender is not None:
+                blocked_ms = lag * 1000
+                offender["total_ms"] += blocked_ms
+                offender["max_ms"] = max(offender["max_ms"], blocked_ms)
+            self._stall_key = None
+
+    def _watch(self):
+        check_every = self.block_threshold / 2
+        while not self._stop.wait(check_every):
+            beat = self._last_beat
+            # The heartbeat is due every `interval`; only lateness beyond that counts
+            if time.monotonic() - beat < self.interval + self.block_threshold or self._stalled_beat == beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)[-STACK_DEPTH:]
+            self._stalled_beat = beat
+            self._record_stall(stack)
+
+    def _record_stall(self, stack: List[traceback.FrameSummary]):
+        key = _offender_key(stack)
+        EVENT_LOOP_BLOCKED.inc()
+        with self._lock:
+            offender = self.offenders.get(key)
+            if offender is None:
+                if len(self.offenders) >= MAX_OFFENDERS:
+                    # Keep the worst; forget the offender with the least blocked time
+                    del self.offenders[min(self.offenders, key=lambda k: self.offenders[k]["total_ms"])]
+                offender = self.offenders[key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            offender["count"] += 1
+            offender["last_seen"] = time.time()
+            offender["stack"] = traceback.format_list(stack)
+            self._stall_key = key
+        logger.warning("Event loop blocked", extra={"offender": key, "threshold_ms": self.block_threshold * 1000})
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog = None
+
+    def worst_offenders(self, limit: int = 20) -> List[Dict]:
+        with self._lock:
+            ranked = sorted(self.offenders.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:limit]
+            return [
+                {"location": key, **{k: round(v, 1) if isinstance(v, float) else v for k, v in offender.items()}}
+                for key, offender in ranked
+            ]
+
+    def get_status(self) -> Dict:
+        return {
+            "running": self._task is not None,
+            "interval_ms": self.interval * 1000,
+            "block_threshold_ms": self.block_threshold * 1000,
+            "samples": self.samples,
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "offenders": len(self.offenders),
+        }
+
+
+# Singleton instance
+loop_monitor = LoopMonitor(settings.LOOP_MONITOR_INTERVAL_MS / 1000, settings.LOOP_BLOCK_THRESHOLD_MS / 1000)
@@ -0,0 +1,118 @@
+"""
+Scrape-time collectors for counters that services already keep.
+
+Nothing here runs on the request path: each collector reads a service's
+existing `get_status()` numbers when `/metrics` is scraped.
+"""
+from app.core import logging_config
+from app.core.auth import principal_cache
+from app.core.login_throttle import login_throttle
+from app.core.metrics import CACHE_REQUESTS, Registry
+from app.core.password_hashing import password_hasher
+from app.core.resources import resources
+from app.services.alert_service import stop_loss_index
+from app.services.circuit_breaker import circuit_breakers
+from app.services.event_bus import event_bus
+from app.services.live_pnl import live_pnl
+from app.services.loop_monitor import loop_monitor
+from app.services.read_cache import read_cache
+from app.services.search_service import search_index
+from app.services.websocket_manager import ConnectionManager
+
+
+def register_metric_collectors(registry: Registry, manager: ConnectionManager):
+    def cache_collector():
+        read_status = read_cache.get_status()
+        principal_status = principal_cache.get_status()
+        search_status = search_index.get_status()
+        yield CACHE_REQUESTS.name, "counter", CACHE_REQUESTS.documentation, [
+            *((labels, value) for _, labels, value in CACHE_REQUESTS.samples()),
+            ({"cache": "read_cache", "result": "hit"}, read_status["hits"]),
+            ({"cache": "read_cache", "result": "miss"}, read_status["misses"]),
+            ({"cache": "read_cache", "result": "not_modified"}, read_status["not_modified"]),
+            ({"cache": "principal", "result": "hit"}, principal_status["hits"]),
+            ({"cache": "principal", "result": "miss"}, principal_status["misses"]),
+            ({"cache": "principal", "result": "claims_only"}, principal_status["claims_only"]),
+            ({"cache": "search_index", "result": "hit"}, search_status["hits"]),
+            ({"cache": "search_index", "result": "miss"}, search_status["builds"]),
+        ]
+        yield "cache_entries", "gauge", "Entries held per cache", [
+            ({"cache": "read_cache"}, read_status["entries"]),
+            ({"cache": "principal"}, principal_status["entries"]),
+            ({"cache": "search_index"}, search_status["users"]),
+        ]
+
+    def websocket_collector():
+        yield "websocket_connections", "gauge", "Open WebSocket connections", [
+            ({}, len(manager.active_connections)),
+        ]
+        yield "websocket_subscribed_tickers", "gauge", "Distinct tickers with at least one subscriber", [
+            ({}, len(manager.get_all_unique_subscriptions())),
+        ]
+        yield "stop_loss_index_entries", "gauge", "Open trades in the stop-loss index", [
+            ({}, len(stop_loss_index)),
+        ]
+        live_status = live_pnl.get_status()
+        yield "live_pnl_sse_listeners", "gauge", "Open P&L event streams", [({}, live_status["sse_listeners"])]
+        yield "live_pnl_positions_recomputed_total", "counter", "Positions re-marked by price ticks", [
+            ({}, live_status["positions_recomputed"]),
+        ]
+
+    def event_bus_collector():
+        status = event_bus.get_status()
+        yield "event_bus_events_total", "counter", "Events by delivery state", [
+            ({"state": state}, status[state]) for state in ("published", "delivered", "coalesced", "dropped")
+        ]
+        yield "event_bus_handler_errors_total", "counter", "Event handler failures", [({}, status["handler_errors"])]
+        yield "event_bus_queued", "gauge", "Events waiting for delivery", [({}, status["queued"])]
+        yield "event_bus_pending_ticks", "gauge", "Price tickers waiting for delivery", [({}, status["pending_ticks"])]
+
+    def auth_collector():
+        hashing = password_hasher.get_status()
+        yield "password_hashes_total", "counter", "Password hashes by result", [
+            ({"result": "completed"}, hashing["completed"]),
+            ({"result": "rejected"}, hashing["rejected"]),
+        ]
+        yield "password_hashes_pending", "gauge", "Password hashes running or waiting", [({}, hashing["pending"])]
+        yield "login_throttle_rejections_total", "counter", "Logins rejected by throttling", [
+            ({}, login_throttle.get_status()["rejected"]),
+        ]
+
+    def circuit_breaker_collector():
+        states = {"closed": 0, "half_open": 1, "open": 2}
+        yield "circuit_breaker_state", "gauge", "Upstream breaker state (0 closed, 1 half-open, 2 open)", [
+            ({"service": name}, states[breaker.get_status()["state"]]) for name, breaker in circuit_breakers.items()
+        ]
+        yield "circuit_breaker_rejections_total", "counter", "Upstream calls rejected by an open breaker", [
+            ({"service": name}, breaker.rejected) for name, breaker in circuit_breakers.items()
+        ]
+
+    def startup_collector():
+        yield "app_ready", "gauge", "1 once startup connected to MongoDB", [({}, int(resources.ready))]
+        yield "app_startup_seconds", "gauge", "Duration of startup and pre-warming", [
+            ({}, resources.startup_ms / 1000 if resources.startup_ms is not None else None),
+        ]
+
+    def loop_collector():
+        yield "event_loop_max_lag_seconds", "gauge", "Largest event-loop lag seen since startup", [
+            ({}, loop_monitor.max_lag),
+        ]
+
+    def logging_collector():
+        status = logging_config.get_status()
+        yield "log_records_dropped_total", "counter", "Log records dropped because the log queue was full", [
+            ({}, status["dropped"]),
+        ]
+        yield "log_records_queued", "gauge", "Log records waiting for the writer thread", [({}, status["queued"])]
+
+    for collector in (
+        cache_collector,
+        websocket_collector,
+        event_bus_collector,
+        auth_collector,
+        circuit_breaker_collector,
+        startup_collector,
+        logging_collector,
+        loop_collector,
+    ):
+        registry.register_collector(collector)
@@ -3,9 +3,12 @@ Mock price service for development to avoid API calls to Finnhub/Exchange Rate A
 Returns realistic but fake prices that update periodically.
 """
 import random
-from typing import Dict
+import zlib
+from typing import Dict, List
 from datetime import datetime, timedelta
 
+import numpy as np
+
 
 class MockPriceService:
     """Mock service that returns fake prices without hitting any external APIs."""
@@ -65,6 +68,29 @@ class MockPriceService:
             'mock': True  # Flag to indicate this is mock data
         }
     
+    def get_candles(self, ticker: str, resolution: str, from_ts: int, to_ts: int) -> Dict[str, List]:
+        """Generate deterministic mock bars, so repeated fetches of a range agree."""
+        step = {"1": 60, "5": 300, "15": 900, "30": 1800, "60": 3600, "D": 86400, "W": 604800, "M": 2592000}.get(resolution, 86400)
+        ticker_upper = ticker.upper()
+        seed = zlib.crc32(ticker_upper.encode())
+        base_price = self._base_prices.get(ticker_upper) or 100 + seed % 2900
+        
+        index = np.arange(-(-from_ts // step), to_ts // step + 1, dtype=np.int64)
+        # Smooth waves plus per-bar jitter derived from the bar index (not a shared RNG state)
+        jitter = ((index * 2654435761 + seed) % 1000) / 1000.0
+        close = base_price * (1 + 0.05 * np.sin(index / 7.0) + 0.08 * np.sin(index / 31.0 + seed % 7) + 0.01 * (jitter - 0.5))
+        open_ = close * (1 + 0.006 * (0.5 - jitter))
+        spread = close * (0.004 + 0.012 * jitter)
+        
+        return {
+            't': (index * step).tolist(),
+            'o': open_.round(2).tolist(),
+            'h': (np.maximum(open_, close) + spread).round(2).tolist(),
+            'l': (np.minimum(open_, close) - spread).round(2).tolist(),
+            'c': close.round(2).tolist(),
+            'v': (1000 + (jitter * 100000)).round().tolist(),
+        }
+    
     def get_status(self) -> Dict:
         """Get service status."""
         return {
@@ -0,0 +1,23 @@
+"""
+P&L calculations shared by the trade routes and the importers.
+"""
+
+
+def calculate_result_pnl(entry_price: float, exit_price: float, size: int) -> float:
+    """Realized P&L for a closed trade (same formula as `close_trade`)."""
+    return (exit_price - entry_price) * size
+
+
+def result_pnl_expression(exit_price: float) -> dict:
+    """Aggregation expression computing `calculate_result_pnl` from the stored trade.
+
+    Used in pipeline updates so a trade can be closed in a single round trip.
+    """
+    return {"$multiply": [{"$subtract": [exit_price, "$entryPrice"]}, "$size"]}
+
+
+def calculate_unrealized_pnl(direction: str, entry_price: float, mark_price: float, size: int) -> float:
+    """Open P&L at `mark_price`; bearish positions gain as the price falls (as the dashboard shows it)."""
+    if direction == "bearish":
+        return (entry_price - mark_price) * size
+    return (mark_price - entry_price) * size
@@ -0,0 +1,98 @@
+"""
+Daily portfolio history: one point per user per market close.
+
+The scheduled job reads every open trade in one pass, prices each distinct
+ticker once and totals realized P&L per user with a single aggregation. It
+then writes one document per user, carrying the positions and the same
+totals as the live snapshot, to the `portfolio_snapshots` time-series
+collection in unordered batches. History charts read these points back
+instead of recomputing from trades and prices.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from app.services.portfolio_service import TRADE_OUT_SHAPE, get_marks, mark_position, summarize_positions
+
+INSERT_BATCH_SIZE = 1000
+MAX_HISTORY_POINTS = 2000
+
+# Stored per position; enough to chart exposure and P&L by trade
+POSITION_FIELDS = ("ticker", "direction", "size", "entryPrice", "mark", "stale", "unrealized_pnl", "exposure", "risk_to_stop")
+
+
+async def _insert_batch(collection, docs: List[Dict]) -> int:
+    try:
+        result = await collection.insert_many(docs, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        return e.details.get("nInserted", 0)
+
+
+async def write_portfolio_snapshots(trades_collection, snapshots_collection, ts: datetime) -> Dict:
+    """Write every user's portfolio as of `ts`; returns counts for the job history."""
+    open_trades: Dict[str, List[Dict]] = {}
+    async for trade in trades_collection.find({"status": "open"}, TRADE_OUT_SHAPE.projection):
+        open_trades.setdefault(trade["user_id"], []).append(trade)
+
+    realized: Dict[str, float] = {}
+    pipeline = [
+        {"$match": {"status": "closed"}},
+        {"$group": {"_id": "$user_id", "realized_pnl": {"$sum": "$result_pnl"}}},
+    ]
+    async for row in trades_collection.aggregate(pipeline):
+        realized[row["_id"]] = row["realized_pnl"] or 0.0
+
+    tickers = sorted({trade["ticker"] for trades in open_trades.values() for trade in trades})
+    marks = await get_marks(tickers)
+
+    written = 0
+    batch: List[Dict] = []
+    for user_id in open_trades.keys() | realized.keys():
+        positions = [mark_position(trade, marks[trade["ticker"]]) for trade in open_trades.get(user_id, ())]
+        batch.append({
+            "ts": ts,
+            "meta": {"user_id": user_id},
+            **summarize_positions(positions),
+            "realized_pnl": round(realized.get(user_id, 0.0), 2),
+            "positions": [
+                {"trade_id": position["_id"], **{field: position.get(field) for field in POSITION_FIELDS}}
+                for position in positions
+            ],
+        })
+        if len(batch) >= INSERT_BATCH_SIZE:
+            written += await _insert_batch(snapshots_collection, batch)
+            batch = []
+    if batch:
+        written += await _insert_batch(snapshots_collection, batch)
+
+    return {
+        "users": len(open_trades.keys() | realized.keys()),
+        "written": written,
+        "open_positions": sum(len(trades) for trades in open_trades.values()),
+        "tickers": len(tickers),
+        "unpriced_tickers": sum(1 for mark in marks.values() if mark is None),
+    }
+
+
+async def get_portfolio_history(
+    collection,
+    user_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_positions: bool = False,
+) -> List[Dict]:
+    """A user's daily points, oldest first."""
+    query: Dict = {"meta.user_id": user_id}
+    if start is not None or end is not None:
+        query["ts"] = {}
+        if start is not None:
+            query["ts"]["$gte"] = start
+        if end is not None:
+            query["ts"]["$lte"] = end
+    projection = {"_id": 0, "meta": 0}
+    if not include_positions:
+        projection["positions"] = 0
+    cursor = collection.find(query, projection).sort("ts", 1).limit(MAX_HISTORY_POINTS)
+    return await cursor.to_list(length=None)
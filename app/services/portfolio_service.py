@@ -0,0 +1,171 @@
+"""
+Portfolio snapshot: open trades marked to current prices, with statistics
+and setups, for the dashboard to load in one round trip.
+
+Open trades, statistics and setups are read concurrently. Each distinct
+open ticker is priced once: from the quote cache while it is fresh,
+otherwise through the same admission control as the quote endpoint. A
+ticker that can't go upstream right now keeps its stale cached price or is
+left unpriced. Scheduled jobs price without a user: they skip admission
+control and are paced by the Finnhub rate limiter instead. Amounts are in INR, the currency trades are journaled in;
+unrealized P&L follows the dashboard's direction-aware formula.
+"""
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.quote_admission import quote_admission
+from app.core.serialization import DocumentShape, dumps
+from app.models.setup import SetupOut
+from app.models.trade import TradeOut
+from app.services.event_bus import PriceTick, event_bus
+from app.services.exchange_rate_service import get_exchange_rate_service
+from app.services.finnhub_service import get_finnhub_service
+from app.services.mock_price_service import mock_price_service
+from app.services.pnl_service import calculate_unrealized_pnl
+from app.services.read_cache import read_cache
+from app.services.statistics_service import compute_statistics
+
+TRADE_OUT_SHAPE = DocumentShape(TradeOut)
+SETUP_OUT_SHAPE = DocumentShape(SetupOut)
+
+# Upstream quote requests a scheduled job may have waiting at once
+BACKGROUND_QUOTE_CONCURRENCY = 2
+
+
+async def get_marks(tickers: List[str], user_id: Optional[str] = None, ip: Optional[str] = None) -> Dict[str, Optional[Dict]]:
+    """INR price per ticker ({price, price_usd, stale}), or None where none is available."""
+    if settings.USE_MOCK_PRICES:
+        # Mock prices are already INR
+        marks = {
+            ticker: {"price": mock_price_service.get_quote(ticker)["price"], "price_usd": None, "stale": False}
+            for ticker in tickers
+        }
+        publish_ticks(marks)
+        return marks
+
+    finnhub = get_finnhub_service(settings.FINNHUB_API_KEY)
+    exchange_rate_svc = get_exchange_rate_service(settings.EXCHANGE_RATE_API_KEY, settings.EXCHANGE_RATE_PROVIDER)
+    cached = {ticker: finnhub.get_cached_quote(ticker) for ticker in tickers}
+    to_fetch = [ticker for ticker, quote in cached.items() if quote is None or quote["stale"]]
+
+    background = user_id is None
+    pending = iter(to_fetch)
+    fetched: Dict[str, Optional[Dict]] = {}
+
+    async def fetch_worker():
+        for ticker in pending:
+            # Each fetch is admitted like a quote request: a token from the user and
+            # the IP and a global upstream slot. Once refused, the rest are served from cache
+            if not background and not quote_admission.acquire(user_id, ip):
+                return
+            try:
+                fetched[ticker] = await run_in_threadpool(finnhub.get_quote, ticker)
+            finally:
+                if not background:
+                    quote_admission.release()
+
+    workers = BACKGROUND_QUOTE_CONCURRENCY if background else quote_admission.max_upstream
+    await asyncio.gather(*(fetch_worker() for _ in range(min(workers, len(to_fetch)))))
+    cached.update(fetched)
+    quotes = [cached[ticker] for ticker in tickers]
+    found = {ticker: quote for ticker, quote in zip(tickers, quotes) if quote and quote.get("found")}
+    rate = await run_in_threadpool(exchange_rate_svc.get_usd_to_inr_rate) if found else None
+
+    marks: Dict[str, Optional[Dict]] = dict.fromkeys(tickers)
+    for ticker, quote in found.items():
+        marks[ticker] = {
+            "price": round(quote["price"] * rate, 2),
+            "price_usd": quote["price"],
+            "stale": quote.get("stale", False),
+        }
+    publish_ticks(marks)
+    return marks
+
+
+def publish_ticks(marks: Dict[str, Optional[Dict]]):
+    """Share freshly fetched prices with the live P&L stream."""
+    for ticker, mark in marks.items():
+        if mark is not None and not mark["stale"]:
+            event_bus.publish(PriceTick(ticker=ticker, price=mark["price"]))
+
+
+def mark_position(trade: Dict, mark: Optional[Dict]) -> Dict:
+    """A trade with its mark, unrealized P&L, exposure and the open P&L at risk if the stop is hit."""
+    position = {
+        **TRADE_OUT_SHAPE.apply(trade),
+        "mark": None,
+        "stale": False,
+        "unrealized_pnl": None,
+        "exposure": None,
+        "risk_to_stop": None,
+    }
+    if mark is None:
+        return position
+
+    price = mark["price"]
+    direction, size = trade["direction"], trade["size"]
+    # What would be given back from here if the stop fills; 0 once the stop is already through
+    stop_move = calculate_unrealized_pnl(direction, price, trade["stopLoss"], size)
+    position.update({
+        "mark": price,
+        "stale": mark["stale"],
+        "unrealized_pnl": round(calculate_unrealized_pnl(direction, trade["entryPrice"], price, size), 2),
+        "exposure": round(price * size, 2),
+        "risk_to_stop": round(max(0.0, -stop_move), 2),
+    })
+    return position
+
+
+def summarize_positions(positions: List[Dict]) -> Dict:
+    priced = [p for p in positions if p["mark"] is not None]
+    return {
+        "open_positions": len(positions),
+        "priced_positions": len(priced),
+        "stale_positions": sum(1 for p in priced if p["stale"]),
+        "unrealized_pnl": round(sum(p["unrealized_pnl"] for p in priced), 2),
+        "exposure": round(sum(p["exposure"] for p in priced), 2),
+        "risk_to_stop": round(sum(p["risk_to_stop"] for p in priced), 2),
+    }
+
+
+async def load_statistics(collection, user_id: str) -> Dict:
+    """Statistics from the read cache (kept warm by the event handlers), else computed and cached."""
+    body = read_cache.get(user_id, "statistics")
+    if body is not None:
+        return orjson.loads(body)
+    version = read_cache.version(user_id)
+    statistics = await compute_statistics(collection, user_id)
+    read_cache.put(user_id, "statistics", version, dumps(statistics))
+    return statistics
+
+
+async def build_portfolio_snapshot(trades_collection, setups_collection, user_id: str, ip: str) -> Dict:
+    async def open_positions():
+        cursor = trades_collection.find({"user_id": user_id, "status": "open"}, TRADE_OUT_SHAPE.projection)
+        trades = await cursor.to_list(length=None)
+        marks = await get_marks(sorted({trade["ticker"] for trade in trades}), user_id, ip)
+        return [mark_position(trade, marks[trade["ticker"]]) for trade in trades]
+
+    async def setups():
+        cursor = setups_collection.find({"user_id": user_id}, SETUP_OUT_SHAPE.projection)
+        return [SETUP_OUT_SHAPE.apply(doc) for doc in await cursor.to_list(length=None)]
+
+    positions, statistics, setup_list = await asyncio.gather(
+        open_positions(),
+        load_statistics(trades_collection, user_id),
+        setups(),
+    )
+    totals = summarize_positions(positions)
+    totals["realized_pnl"] = statistics["total_pnl"]
+    return {
+        "as_of": datetime.now(timezone.utc),
+        "totals": totals,
+        "positions": positions,
+        "statistics": statistics,
+        "setups": setup_list,
+    }
@@ -0,0 +1,189 @@
+"""
+Upstream quota accounting that survives restarts.
+
+Every call to a metered provider is written to a small SQLite file: the
+timestamps of the last minute (for per-minute limits) and a running count
+per calendar month (UTC). A restarted process seeds its rate limiter from
+the file instead of starting from zero, so a restart storm can't blow
+through Finnhub's 60 calls/min, and the 1500 calls/month exchange-rate tier
+is tracked at all.
+
+The price services ask `should_call()` before going upstream. When they
+already hold a stale value, a call is only made while the provider is
+within its per-minute limit and on pace for its monthly budget; otherwise
+the stale value is served. Once a monthly budget is used up, nothing is
+called until the next month.
+
+SQLite is used because the price services are synchronous and run in
+worker threads; each write is a single small transaction in WAL mode.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+# Spending may run this share of the monthly budget ahead of an even pace
+PACE_HEADROOM = 0.05
+
+
+class Budget(NamedTuple):
+    per_minute: Optional[int]
+    per_month: Optional[int]
+
+
+def _month_bounds(now: datetime):
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+class QuotaLedger:
+    def __init__(self, path: str, budgets: Dict[str, Budget]):
+        self.path = path
+        self.budgets = budgets
+        self.write_errors = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Reopened on demand, so the services can keep a reference across a restart of the app
+        if self._db is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS recent_calls (provider TEXT NOT NULL, ts REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS recent_calls_provider_ts ON recent_calls (provider, ts)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS monthly_usage ("
+                "provider TEXT NOT NULL, month TEXT NOT NULL, calls INTEGER NOT NULL, "
+                "PRIMARY KEY (provider, month))"
+            )
+            self._db = db
+        return self._db
+
+    def record(self, provider: str, ts: Optional[float] = None):
+        """Count one upstream call. Accounting errors never fail the call itself."""
+        ts = time.time() if ts is None else ts
+        month = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m")
+        try:
+            with self._lock:
+                db = self._connect()
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    db.execute("INSERT INTO recent_calls (provider, ts) VALUES (?, ?)", (provider, ts))
+                    db.execute("DELETE FROM recent_calls WHERE provider = ? AND ts <= ?", (provider, ts - MINUTE))
+                    db.execute(
+                        "INSERT INTO monthly_usage (provider, month, calls) VALUES (?, ?, 1) "
+                        "ON CONFLICT (provider, month) DO UPDATE SET calls = calls + 1",
+                        (provider, month),
+                    )
+                    db.execute("COMMIT")
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            self.write_errors += 1
+            logger.warning("Quota ledger write failed", extra={"provider": provider, "error": str(e)})
+
+    def recent_calls(self, provider: str, window: float = MINUTE) -> List[float]:
+        """Timestamps of calls in the last `window` seconds, oldest first."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT ts FROM recent_calls WHERE provider = ? AND ts > ? ORDER BY ts",
+                (provider, time.time() - window),
+            ).fetchall()
+        return [ts for (ts,) in rows]
+
+    def month_usage(self, provider: str, now: Optional[datetime] = None) -> int:
+        month = (now or datetime.now(timezone.utc)).strftime("%Y-%m")
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT calls FROM monthly_usage WHERE provider = ? AND month = ?", (provider, month)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def should_call(self, provider: str, have_stale: bool) -> bool:
+        """Whether to go upstream now, or serve the stale value (if there is one)."""
+        budget = self.budgets.get(provider)
+        if budget is None:
+            return True
+        now = datetime.now(timezone.utc)
+        used = self.month_usage(provider, now) if budget.per_month else 0
+        if budget.per_month and used >= budget.per_month:
+            return False
+        if not have_stale:
+            return True
+        if budget.per_minute and len(self.recent_calls(provider)) >= budget.per_minute:
+            return False
+        if budget.per_month:
+            start, end = _month_bounds(now)
+            elapsed = (now - start) / (end - start)
+            if used >= budget.per_month * (elapsed + PACE_HEADROOM):
+                return False
+        return True
+
+    def forecast(self, provider: str) -> Dict:
+        """Usage so far and, at the current month's rate, when the monthly budget runs out."""
+        budget = self.budgets.get(provider, Budget(None, None))
+        now = datetime.now(timezone.utc)
+        start, end = _month_bounds(now)
+        used = self.month_usage(provider, now)
+        elapsed = (now - start).total_seconds()
+        projected = round(used * (end - start).total_seconds() / elapsed) if elapsed > 0 else used
+
+        exhausts_at = None
+        if budget.per_month and used and projected >= budget.per_month:
+            # Past, if the budget is already used up
+            exhausts_at = datetime.fromtimestamp(
+                start.timestamp() + elapsed * budget.per_month / used, timezone.utc
+            )
+        return {
+            "month": start.strftime("%Y-%m"),
+            "calls_this_month": used,
+            "monthly_limit": budget.per_month,
+            "remaining_this_month": max(0, budget.per_month - used) if budget.per_month else None,
+            "projected_this_month": projected,
+            "exhausts_at": exhausts_at.isoformat(timespec="seconds") if exhausts_at else None,
+            "calls_last_minute": len(self.recent_calls(provider)),
+            "per_minute_limit": budget.per_minute,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# Singleton instance (opened on first use)
+quota_ledger: Optional[QuotaLedger] = None
+
+
+def get_quota_ledger(path: str = settings.QUOTA_DB_PATH) -> QuotaLedger:
+    """Get or open the quota ledger singleton."""
+    global quota_ledger
+    if quota_ledger is None:
+        quota_ledger = QuotaLedger(path, {
+            "finnhub": Budget(settings.FINNHUB_CALLS_PER_MINUTE, settings.FINNHUB_CALLS_PER_MONTH),
+            "exchange_rate": Budget(None, settings.EXCHANGE_RATE_CALLS_PER_MONTH),
+        })
+    return quota_ledger
+
+
+def close_quota_ledger():
+    if quota_ledger is not None:
+        quota_ledger.close()
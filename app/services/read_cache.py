@@ -0,0 +1,181 @@
+"""
+Per-user versioned read cache for the dashboard list/statistics endpoints.
+
+Every trade or setup write bumps the user's data version. Cached response
+bodies are keyed on (user, resource) and only served while their version is
+current, so a write invalidates everything for that user at once. ETags are
+derived from the version, which lets a matching If-None-Match be answered
+with 304 without reading any trades.
+
+Versions live in process memory, so this assumes a single worker process
+(the deployment runs one uvicorn worker). They are kept for the most
+recently written users only; a user whose version is evicted comes back at
+a floor above every version handed out before, so a version (and the ETag
+built from it) is never reused for the same user.
+"""
+import gzip
+import hashlib
+import secrets
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+GZIP_MIN_SIZE = 1000
+
+
+class CachedBody:
+    __slots__ = ("version", "etag", "body", "_gzipped")
+
+    def __init__(self, version: int, etag: str, body: bytes):
+        self.version = version
+        self.etag = etag
+        self.body = body
+        self._gzipped: Optional[bytes] = None
+
+    @property
+    def gzipped(self) -> bytes:
+        # Compressed once, on first request that accepts gzip
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+
+class ReadCache:
+    def __init__(self, max_entries: int = 5000, max_users: int = 50000):
+        self.max_entries = max_entries
+        self.max_users = max_users
+        # Distinguishes ETags across restarts, when versions start over
+        self._boot_id = secrets.token_hex(4)
+        # Least recently written user first
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        # Version of users with no entry: above any version that was evicted
+        self._version_floor = 0
+        self._entries: "OrderedDict[Tuple[str, str], CachedBody]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def version(self, user_id: str) -> int:
+        return self._versions.get(user_id, self._version_floor)
+
+    def bump(self, user_id: str):
+        """Invalidate all cached reads for a user. Call after every successful write."""
+        self._versions[user_id] = self.version(user_id) + 1
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > self.max_users:
+            _, evicted = self._versions.popitem(last=False)
+            self._version_floor = max(self._version_floor, evicted + 1)
+
+    def etag(self, user_id: str, key: str, version: int) -> str:
+        """Opaque tag for a (user, resource, version); quoted when sent as a header."""
+        user_tag = hashlib.blake2s(user_id.encode(), digest_size=4).hexdigest()
+        return f"{self._boot_id}-{user_tag}-{version}-{key}"
+
+    @staticmethod
+    def _accepts_gzip(request: Request) -> bool:
+        return "gzip" in request.headers.get("accept-encoding", "")
+
+    @staticmethod
+    def _match(request: Request, etag: str) -> Optional[str]:
+        """Return the matching tag from If-None-Match (plain or gzip variant), if any."""
+        if_none_match = request.headers.get("if-none-match")
+        if not if_none_match:
+            return None
+        if if_none_match.strip() == "*":
+            return etag
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate.startswith("W/"):
+                candidate = candidate[2:]
+            candidate = candidate.strip('"')
+            # The gzip representation carries a suffixed tag of the same version
+            if candidate in (etag, f"{etag}-gzip"):
+                return candidate
+        return None
+
+    @staticmethod
+    def _headers(etag: str) -> Dict[str, str]:
+        return {
+            "ETag": f'"{etag}"',
+            "Cache-Control": "private, no-cache",
+            "Vary": "Accept-Encoding, Authorization",
+        }
+
+    def _build_response(self, request: Request, entry: CachedBody) -> Response:
+        if self._accepts_gzip(request) and len(entry.body) >= GZIP_MIN_SIZE:
+            headers = self._headers(f"{entry.etag}-gzip")
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=entry.gzipped, media_type="application/json", headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=self._headers(entry.etag))
+
+    def respond(self, request: Request, user_id: str, key: str) -> Optional[Response]:
+        """Answer from cache: 304 for a matching ETag, 200 for a current entry, else None."""
+        version = self.version(user_id)
+        etag = self.etag(user_id, key, version)
+        matched = self._match(request, etag)
+        if matched is not None:
+            self.not_modified += 1
+            return Response(status_code=304, headers=self._headers(matched))
+
+        entry = self._entries.get((user_id, key))
+        if entry is not None and entry.version == version:
+            self._entries.move_to_end((user_id, key))
+            self.hits += 1
+            return self._build_response(request, entry)
+
+        self.misses += 1
+        return None
+
+    def get(self, user_id: str, key: str) -> Optional[bytes]:
+        """The cached body for a resource if it is still current, for reuse inside other responses."""
+        entry = self._entries.get((user_id, key))
+        if entry is not None and entry.version == self.version(user_id):
+            self._entries.move_to_end((user_id, key))
+            self.hits += 1
+            return entry.body
+        self.misses += 1
+        return None
+
+    def put(self, user_id: str, key: str, version: int, body: bytes) -> CachedBody:
+        """Cache a body built from data read at `version` (read it *before* querying).
+
+        Entries built from a version that is already outdated are not kept.
+        """
+        entry = CachedBody(version, self.etag(user_id, key, version), body)
+        if version == self.version(user_id):
+            self._entries[(user_id, key)] = entry
+            self._entries.move_to_end((user_id, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def store(self, request: Request, user_id: str, key: str, version: int, body: bytes) -> Response:
+        return self._build_response(request, self.put(user_id, key, version, body))
+
+    def purge(self, user_id: str):
+        """Drop a user's entries that no longer match their current version."""
+        version = self.version(user_id)
+        stale = [
+            cache_key for cache_key, entry in self._entries.items()
+            if cache_key[0] == user_id and entry.version != version
+        ]
+        for cache_key in stale:
+            del self._entries[cache_key]
+
+    def get_status(self) -> Dict:
+        lookups = self.hits + self.misses + self.not_modified
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "versioned_users": len(self._versions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_rate": round((self.hits + self.not_modified) / lookups, 4) if lookups else None,
+        }
+
+
+# Singleton instance
+read_cache = ReadCache()
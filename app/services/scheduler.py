@@ -0,0 +1,204 @@
+"""
+Scheduled background jobs, run once per slot across all workers.
+
+Each job has a schedule (a function giving the next run time after a given
+moment) and runs in its own task on the event loop. Every worker process
+runs the same scheduler, so before running a slot a worker claims it in the
+`job_runs` collection: the claim is an upsert keyed by job and slot, and
+the unique `_id` makes all but one worker fail it with a duplicate key. A
+claim whose worker died mid-run can be taken over once its lease expires;
+while a job runs, its worker keeps extending the lease, so a long run is
+never mistaken for a dead one. On start, the most recent past slot is run
+if nobody claimed it (the process was down at the time) and the job says
+it can still be run correctly now (its `catch_up_until` deadline). The claim
+documents double as a run history (status, duration, error).
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+from zoneinfo import ZoneInfo
+
+from pymongo.errors import DuplicateKeyError
+
+from app.db.database import get_job_runs_collection
+
+logger = logging.getLogger(__name__)
+
+# Identifies this worker in claim documents
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# How far back to look for a missed slot on start
+CATCH_UP_WINDOW = timedelta(days=7)
+
+
+class Job(NamedTuple):
+    name: str
+    next_run: Callable[[datetime], datetime]  # Next slot strictly after the given (UTC) time
+    action: Callable[[datetime], Awaitable[Optional[Dict]]]  # Receives the slot; may return a summary
+    lease_seconds: float
+    # Deadline for running a missed slot late; None never catches up
+    catch_up_until: Optional[Callable[[datetime], datetime]] = None
+
+
+def weekdays_at(clock: str, tz_name: str) -> Callable[[datetime], datetime]:
+    """Schedule firing Monday to Friday at `clock` ("HH:MM") local time."""
+    tz = ZoneInfo(tz_name)
+    hour, minute = (int(part) for part in clock.split(":"))
+
+    def next_run(after: datetime) -> datetime:
+        local = after.astimezone(tz)
+        day = local.date()
+        while True:
+            candidate = datetime.combine(day, dt_time(hour, minute), tzinfo=tz)
+            if candidate > local and candidate.weekday() < 5:
+                return candidate.astimezone(timezone.utc)
+            day += timedelta(days=1)
+
+    return next_run
+
+
+def previous_run(next_run: Callable[[datetime], datetime], now: datetime) -> Optional[datetime]:
+    """Latest slot at or before `now` within CATCH_UP_WINDOW, or None."""
+    slot = None
+    candidate = next_run(now - CATCH_UP_WINDOW)
+    while candidate <= now:
+        slot = candidate
+        candidate = next_run(candidate)
+    return slot
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # job name -> what this worker last saw of it
+        self.state: Dict[str, Dict] = {}
+
+    def add_job(
+        self,
+        name: str,
+        next_run: Callable[[datetime], datetime],
+        action: Callable[[datetime], Awaitable[Optional[Dict]]],
+        lease_seconds: float = 600,
+        catch_up_until: Optional[Callable[[datetime], datetime]] = None,
+    ):
+        self.jobs[name] = Job(name, next_run, action, lease_seconds, catch_up_until)
+        self.state[name] = {"next_run": None, "last_slot": None, "last_result": None, "runs": 0, "skipped": 0}
+
+    def start(self):
+        for job in self.jobs.values():
+            if job.name not in self._tasks:
+                self._tasks[job.name] = asyncio.create_task(self._run(job))
+
+    async def stop(self):
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job: Job):
+        state = self.state[job.name]
+        now = datetime.now(timezone.utc)
+        missed = previous_run(job.next_run, now) if job.catch_up_until is not None else None
+        if missed is not None and now < job.catch_up_until(missed):
+            try:
+                # A slot that already ran (or is running) fails the claim and is skipped
+                await self.run_slot(job, missed)
+            except Exception as e:
+                logger.warning("Scheduled job catch-up failed", extra={"job": job.name, "slot": missed.isoformat(), "error": str(e)})
+        while True:
+            slot = job.next_run(datetime.now(timezone.utc))
+            state["next_run"] = slot
+            await asyncio.sleep(max(0.0, (slot - datetime.now(timezone.utc)).total_seconds()))
+            try:
+                await self.run_slot(job, slot)
+            except Exception as e:
+                # Claim bookkeeping failed (e.g. MongoDB unreachable); try again next slot
+                logger.warning("Scheduled job failed", extra={"job": job.name, "slot": slot.isoformat(), "error": str(e)})
+
+    async def _claim(self, job: Job, slot: datetime) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            # Matches only an abandoned claim; otherwise the upsert collides with the existing _id
+            await get_job_runs_collection().find_one_and_update(
+                {"_id": f"{job.name}:{slot.isoformat()}", "status": "running", "lease_until": {"$lt": now}},
+                {"$set": {
+                    "job": job.name,
+                    "slot": slot,
+                    "status": "running",
+                    "worker": WORKER_ID,
+                    "started_at": now,
+                    "lease_until": now + timedelta(seconds=job.lease_seconds),
+                }},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def _renew_lease(self, job: Job, slot: datetime):
+        """Keep extending this worker's claim while the job runs."""
+        while True:
+            await asyncio.sleep(job.lease_seconds / 3)
+            try:
+                await get_job_runs_collection().update_one(
+                    {"_id": f"{job.name}:{slot.isoformat()}", "worker": WORKER_ID, "status": "running"},
+                    {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=job.lease_seconds)}},
+                )
+            except Exception as e:
+                # Missing one renewal is fine; the lease still has two thirds left
+                logger.warning("Lease renewal failed", extra={"job": job.name, "error": str(e)})
+
+    async def run_slot(self, job: Job, slot: datetime) -> bool:
+        """Run one slot of a job unless another worker has claimed it. True if it ran here."""
+        state = self.state[job.name]
+        if not await self._claim(job, slot):
+            state["skipped"] += 1
+            return False
+
+        start = time.perf_counter()
+        update: Dict = {}
+        renewal = asyncio.create_task(self._renew_lease(job, slot))
+        try:
+            summary = await job.action(slot)
+            update = {"status": "done", "summary": summary}
+        except Exception as e:
+            update = {"status": "failed", "error": str(e)}
+            logger.exception("Scheduled job raised", extra={"job": job.name, "slot": slot.isoformat()})
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        update.update(finished_at=datetime.now(timezone.utc), duration_ms=duration_ms)
+        await get_job_runs_collection().update_one(
+            {"_id": f"{job.name}:{slot.isoformat()}", "worker": WORKER_ID}, {"$set": update}
+        )
+
+        state["runs"] += 1
+        state["last_slot"] = slot
+        state["last_result"] = {"status": update["status"], "duration_ms": duration_ms}
+        logger.info(
+            "Scheduled job finished",
+            extra={"job": job.name, "slot": slot.isoformat(), "status": update["status"], "duration_ms": duration_ms},
+        )
+        return True
+
+    def get_status(self) -> Dict:
+        return {
+            "worker": WORKER_ID,
+            "running": bool(self._tasks),
+            "jobs": {
+                name: {**state, "next_run": state["next_run"].isoformat() if state["next_run"] else None,
+                       "last_slot": state["last_slot"].isoformat() if state["last_slot"] else None}
+                for name, state in self.state.items()
+            },
+        }
+
+
+# Singleton instance
+scheduler = Scheduler()
@@ -0,0 +1,364 @@
+"""
+Full-text search over a user's journal notes.
+
+Each user gets an in-process inverted index over their trades'
+`marketConditions`, `emotions` and `lessonsLearned`, plus the name and
+notes of the setup a trade uses (weighted lower). It is built from MongoDB
+on the user's first search and then kept current by the trade and setup
+events; a search runs entirely in memory. Indexes are tagged with the
+user's read-cache version: an event advances the tag only when it accounts
+for the single write since, so after anything the handlers couldn't follow
+(bulk closes, imports, a dropped event) the next search rebuilds the index
+instead of answering from it.
+
+Ranking is BM25. Every query word (other than stopwords) must match, either exactly or, for words
+of three or more characters, as a prefix ("frustrat" finds "frustrated"),
+a prefix match counting for less. Filters on ticker, setup, entry date and
+outcome apply to the matching trades; results come back a page at a time
+with snippets and the character ranges to highlight in them.
+"""
+import asyncio
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+
+from app.core.config import settings
+from app.core.serialization import DocumentShape
+from app.models.trade import TradeOut
+from app.services.read_cache import read_cache
+
+TRADE_OUT_SHAPE = DocumentShape(TradeOut)
+
+# Field weights; a setup's text describes many trades, so it counts for less
+FIELD_WEIGHTS = {"lessonsLearned": 1.0, "marketConditions": 1.0, "emotions": 1.0, "setup": 0.5}
+TEXT_FIELDS = ("lessonsLearned", "marketConditions", "emotions")
+SEARCH_PROJECTION = {
+    "ticker": 1, "setup_id": 1, "entryDate": 1, "status": 1, "result_pnl": 1,
+    **{field: 1 for field in TEXT_FIELDS},
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_MIN_LENGTH = 3
+PREFIX_WEIGHT = 0.6
+MAX_PREFIX_EXPANSIONS = 50
+SNIPPET_CHARS = 160
+
+OUTCOMES = ("win", "loss", "breakeven", "open")
+
+# Left out of queries that have other words: they match nearly every note and cost the most to score
+STOPWORDS = frozenset(
+    "a an and are as at be but by for i if in is it me my of on or so the to was were with".split()
+)
+
+WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return WORD.findall(text.lower())
+
+
+class _Trade:
+    __slots__ = ("ticker", "setup_id", "entry_date", "outcome", "texts", "weights", "length")
+
+    def __init__(self, doc: Dict):
+        self.ticker = (doc.get("ticker") or "").upper()
+        self.setup_id = str(doc["setup_id"]) if doc.get("setup_id") else None
+        self.entry_date: Optional[datetime] = doc.get("entryDate")
+        pnl = doc.get("result_pnl")
+        if doc.get("status") != "closed":
+            self.outcome = "open"
+        elif pnl is None or pnl == 0:
+            self.outcome = "breakeven"
+        else:
+            self.outcome = "win" if pnl > 0 else "loss"
+        self.texts = {field: doc[field] for field in TEXT_FIELDS if doc.get(field)}
+        self.weights: Dict[str, float] = {}
+        self.length = 0.0
+
+
+class UserIndex:
+    def __init__(self, version: int):
+        self.version = version
+        self.trades: Dict[str, _Trade] = {}
+        # term -> trade_id -> weighted term frequency
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.setups: Dict[str, str] = {}
+        self._total_length = 0.0
+        self._vocabulary: Optional[List[str]] = None  # Sorted, for prefix lookups; rebuilt after changes
+
+    def set_setups(self, setups: Iterable[Dict]):
+        self.setups = {
+            str(setup["_id"]): " ".join(part for part in (setup.get("name"), setup.get("notes")) if part)
+            for setup in setups
+        }
+
+    def add_trade(self, doc: Dict):
+        trade_id = str(doc["_id"])
+        self.remove_trade(trade_id)
+        trade = _Trade(doc)
+        texts = dict(trade.texts)
+        if trade.setup_id in self.setups:
+            texts["setup"] = self.setups[trade.setup_id]
+        for field, text in texts.items():
+            weight = FIELD_WEIGHTS[field]
+            for term in tokenize(text):
+                trade.weights[term] = trade.weights.get(term, 0.0) + weight
+                trade.length += weight
+        for term, weight in trade.weights.items():
+            self.postings.setdefault(term, {})[trade_id] = weight
+        self.trades[trade_id] = trade
+        self._total_length += trade.length
+        self._vocabulary = None
+
+    def remove_trade(self, trade_id: str):
+        trade = self.trades.pop(trade_id, None)
+        if trade is None:
+            return
+        for term in trade.weights:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(trade_id, None)
+                if not posting:
+                    del self.postings[term]
+        self._total_length -= trade.length
+        self._vocabulary = None
+
+    def _expand(self, word: str) -> Dict[str, float]:
+        """Indexed terms a query word matches, with their weight."""
+        terms = {word: 1.0} if word in self.postings else {}
+        if len(word) >= PREFIX_MIN_LENGTH:
+            if self._vocabulary is None:
+                self._vocabulary = sorted(self.postings)
+            start = bisect_left(self._vocabulary, word)
+            for term in self._vocabulary[start:start + MAX_PREFIX_EXPANSIONS + 1]:
+                if not term.startswith(word):
+                    break
+                terms.setdefault(term, PREFIX_WEIGHT)
+        return terms
+
+    def search(self, words: List[str], accept, top: int) -> Tuple[int, List[Tuple[float, str]], Set[str]]:
+        """Count of trades matching every word and `accept`, the best `top` of them as
+        (score, trade_id), best first, and the matched terms (for highlighting).
+        """
+        count = len(self.trades)
+        if count == 0:
+            return 0, [], set()
+        trades = self.trades
+        # BM25 length normalization: k1 * (1 - b + b * length / average), split into constant and per-trade parts
+        base = BM25_K1 * (1 - BM25_B)
+        per_length = BM25_K1 * BM25_B / (self._total_length / count or 1.0)
+
+        scores: Optional[Dict[str, float]] = None
+        matched_terms: Set[str] = set()
+        for word in words:
+            word_scores: Dict[str, float] = {}
+            for term, weight in self._expand(word).items():
+                posting = self.postings[term]
+                factor = weight * math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5)) * (BM25_K1 + 1)
+                if scores is not None and len(scores) < len(posting):
+                    # Later words only narrow the matches, so walk whichever side is smaller
+                    pairs = ((trade_id, posting[trade_id]) for trade_id in scores if trade_id in posting)
+                else:
+                    pairs = posting.items()
+                for trade_id, tf in pairs:
+                    if scores is not None and trade_id not in scores:
+                        continue
+                    word_scores[trade_id] = (
+                        word_scores.get(trade_id, 0.0) + factor * tf / (tf + base + per_length * trades[trade_id].length)
+                    )
+                matched_terms.add(term)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {trade_id: scores[trade_id] + score for trade_id, score in word_scores.items()}
+            if not scores:
+                return 0, [], set()
+
+        hits = [(score, trade_id) for trade_id, score in scores.items() if accept(trades[trade_id])]
+        # Equal scores: most recent trade first
+        best = heapq.nlargest(top, hits, key=lambda hit: (hit[0], trades[hit[1]].entry_date or datetime.min))
+        return len(hits), best, matched_terms
+
+    def snippets(self, trade_id: str, matched_terms: Set[str]) -> List[Dict]:
+        """Per matching field, a window of text around the first match and the ranges to highlight."""
+        trade = self.trades[trade_id]
+        texts = dict(trade.texts)
+        if trade.setup_id in self.setups:
+            texts["setup"] = self.setups[trade.setup_id]
+        snippets = []
+        for field, text in texts.items():
+            spans = [m.span() for m in WORD.finditer(text) if m.group().lower() in matched_terms]
+            if not spans:
+                continue
+            start = max(0, spans[0][0] - SNIPPET_CHARS // 4)
+            end = min(len(text), start + SNIPPET_CHARS)
+            prefix = "…" if start > 0 else ""
+            suffix = "…" if end < len(text) else ""
+            offset = len(prefix) - start
+            snippets.append({
+                "field": field,
+                "text": prefix + text[start:end] + suffix,
+                "highlights": [[s + offset, e + offset] for s, e in spans if s >= start and e <= end],
+            })
+        return snippets
+
+    def __len__(self):
+        return len(self.trades)
+
+
+class SearchIndex:
+    """Per-user indexes, least recently searched evicted first."""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._indexes: "OrderedDict[str, UserIndex]" = OrderedDict()
+        self._building: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.builds = 0
+        self.updates = 0
+
+    async def _build(self, trades_collection, setups_collection, user_id: str) -> UserIndex:
+        # Taken before reading, so a write racing the build leaves the index looking stale
+        index = UserIndex(read_cache.version(user_id))
+        index.set_setups(await setups_collection.find({"user_id": user_id}, {"name": 1, "notes": 1}).to_list(length=None))
+        async for doc in trades_collection.find({"user_id": user_id}, SEARCH_PROJECTION):
+            index.add_trade(doc)
+        self._indexes[user_id] = index
+        self._indexes.move_to_end(user_id)
+        while len(self._indexes) > self.max_users:
+            self._indexes.popitem(last=False)
+        self.builds += 1
+        return index
+
+    async def get(self, trades_collection, setups_collection, user_id: str) -> UserIndex:
+        index = self._indexes.get(user_id)
+        if index is not None and index.version == read_cache.version(user_id):
+            self._indexes.move_to_end(user_id)
+            self.hits += 1
+            return index
+        # Concurrent searches by one user share a single build
+        task = self._building.get(user_id)
+        if task is None:
+            task = self._building[user_id] = asyncio.create_task(
+                self._build(trades_collection, setups_collection, user_id)
+            )
+            task.add_done_callback(lambda _: self._building.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    def _advance(self, user_id: str, index: UserIndex, version: int):
+        # Only when this event is the one write since the index was last current
+        if version == index.version + 1:
+            index.version = version
+        self.updates += 1
+
+    async def refresh_trade(self, collection, user_id: str, trade_id: str):
+        index = self._indexes.get(user_id)
+        if index is None:
+            return
+        version = read_cache.version(user_id)
+        doc = await collection.find_one({"_id": ObjectId(trade_id), "user_id": user_id}, SEARCH_PROJECTION)
+        if doc is None:
+            index.remove_trade(trade_id)
+        else:
+            index.add_trade(doc)
+        self._advance(user_id, index, version)
+
+    def remove_trade(self, user_id: str, trade_id: str):
+        index = self._indexes.get(user_id)
+        if index is None:
+            return
+        index.remove_trade(trade_id)
+        self._advance(user_id, index, read_cache.version(user_id))
+
+    async def refresh_setups(self, collection, user_id: str):
+        index = self._indexes.get(user_id)
+        if index is None:
+            return
+        version = read_cache.version(user_id)
+        # Setups can't be edited, so a new one has no trades to re-index yet
+        index.set_setups(await collection.find({"user_id": user_id}, {"name": 1, "notes": 1}).to_list(length=None))
+        self._advance(user_id, index, version)
+
+    def drop(self, user_id: str):
+        self._indexes.pop(user_id, None)
+
+    def get_status(self) -> Dict:
+        return {
+            "users": len(self._indexes),
+            "max_users": self.max_users,
+            "trades": sum(len(index) for index in self._indexes.values()),
+            "hits": self.hits,
+            "builds": self.builds,
+            "updates": self.updates,
+        }
+
+
+async def search_trades(
+    trades_collection,
+    setups_collection,
+    user_id: str,
+    query: str,
+    ticker: Optional[str] = None,
+    setup_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    outcome: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 20,
+) -> Dict:
+    words = tokenize(query)
+    words = [word for word in words if word not in STOPWORDS] or words
+    index = await search_index.get(trades_collection, setups_collection, user_id)
+    ticker = ticker.upper() if ticker else None
+    # entryDate is stored naive in server local time (datetime.now() in the trades router)
+    start_date, end_date = (
+        value.astimezone().replace(tzinfo=None) if value is not None and value.tzinfo else value
+        for value in (start_date, end_date)
+    )
+
+    def accept(trade: _Trade) -> bool:
+        if ticker is not None and trade.ticker != ticker:
+            return False
+        if setup_id is not None and trade.setup_id != setup_id:
+            return False
+        if outcome is not None and trade.outcome != outcome:
+            return False
+        if start_date is not None and (trade.entry_date is None or trade.entry_date < start_date):
+            return False
+        if end_date is not None and (trade.entry_date is None or trade.entry_date > end_date):
+            return False
+        return True
+
+    total, best, matched_terms = index.search(words, accept, offset + limit) if words else (0, [], set())
+    page = best[offset:]
+
+    docs = {}
+    if page:
+        cursor = trades_collection.find(
+            {"_id": {"$in": [ObjectId(trade_id) for _, trade_id in page]}, "user_id": user_id},
+            TRADE_OUT_SHAPE.projection,
+        )
+        docs = {str(doc["_id"]): TRADE_OUT_SHAPE.apply(doc) for doc in await cursor.to_list(length=None)}
+
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "results": [
+            {"score": round(score, 4), "trade": docs[trade_id], "snippets": index.snippets(trade_id, matched_terms)}
+            for score, trade_id in page
+            # A trade deleted since the index was read is left out of the page
+            if trade_id in docs
+        ],
+    }
+
+
+# Singleton instance
+search_index = SearchIndex(settings.SEARCH_INDEX_MAX_USERS)
@@ -0,0 +1,31 @@
+"""
+Trading statistics computed from a user's closed trades.
+"""
+from typing import Dict
+
+
+async def compute_statistics(collection, user_id: str) -> Dict:
+    """Get trading statistics including win rate."""
+    # Get all closed trades
+    closed_trades = []
+    cursor = collection.find({"user_id": user_id, "status": "closed"}, {"result_pnl": 1})
+    async for doc in cursor:
+        closed_trades.append(doc)
+    
+    total_closed = len(closed_trades)
+    winning_trades = sum(1 for trade in closed_trades if trade.get("result_pnl", 0) > 0)
+    losing_trades = sum(1 for trade in closed_trades if trade.get("result_pnl", 0) < 0)
+    breakeven_trades = sum(1 for trade in closed_trades if trade.get("result_pnl", 0) == 0)
+    
+    win_rate = (winning_trades / total_closed * 100) if total_closed > 0 else 0
+    
+    total_pnl = sum(trade.get("result_pnl", 0) for trade in closed_trades)
+    
+    return {
+        "total_closed_trades": total_closed,
+        "winning_trades": winning_trades,
+        "losing_trades": losing_trades,
+        "breakeven_trades": breakeven_trades,
+        "win_rate": round(win_rate, 2),
+        "total_pnl": round(total_pnl, 2)
+    }
@@ -0,0 +1,161 @@
+"""
+Atomic trade closing.
+
+A full close is a single `find_one_and_update` filtered on `status: "open"`,
+so two concurrent closes can't both succeed. A partial close atomically
+shrinks the open trade and records the closed part as its own trade.
+
+The closed part is written in two steps: the shrink also pushes the part
+(with its pre-assigned `_id`) onto the open trade's `pending_closes`, then
+the part is inserted and the pending entry pulled. If the process dies in
+between, `recover_pending_closes` at the next startup finishes the insert,
+so shares never drop out of the journal. Both steps are idempotent on the
+part's `_id`. If the insert reports an error, the part is looked up by that
+`_id` before the shrink is undone, since the write may have landed anyway
+(e.g. a timeout). Recovery leaves entries younger than PENDING_CLOSE_GRACE
+alone, so it can't race a close that another worker is still finishing.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.services.pnl_service import calculate_result_pnl, result_pnl_expression
+
+PENDING_CLOSE_GRACE = timedelta(minutes=5)
+
+
+class TradeNotFoundError(LookupError):
+    pass
+
+
+class TradeCloseError(ValueError):
+    pass
+
+
+async def _find_close_target(collection, user_id: str, trade_oid: ObjectId) -> Optional[Dict]:
+    """Re-read a trade whose filtered close matched nothing (failure path only)."""
+    return await collection.find_one({"_id": trade_oid, "user_id": user_id}, {"status": 1, "size": 1})
+
+
+def _close_failure(trade: Optional[Dict]) -> Exception:
+    if not trade:
+        return TradeNotFoundError("Trade not found")
+    if trade.get("status") == "closed":
+        return TradeCloseError("Trade is already closed")
+    return TradeCloseError(f"Close size exceeds open size of {trade.get('size')}")
+
+
+async def close_trade(
+    collection,
+    user_id: str,
+    trade_oid: ObjectId,
+    exit_price: float,
+    lessons_learned: Optional[str] = None,
+) -> Dict:
+    """Close an open trade in one round trip and return the updated document."""
+    update = [{
+        "$set": {
+            "exitPrice": exit_price,
+            "lessonsLearned": {"$literal": lessons_learned},
+            "exitDate": datetime.now(),
+            "status": "closed",
+            "result_pnl": result_pnl_expression(exit_price),
+        }
+    }]
+
+    closed = await collection.find_one_and_update(
+        {"_id": trade_oid, "user_id": user_id, "status": "open"},
+        update,
+        return_document=ReturnDocument.AFTER,
+    )
+    if closed is None:
+        raise _close_failure(await _find_close_target(collection, user_id, trade_oid))
+    return closed
+
+
+async def partial_close_trade(
+    collection,
+    user_id: str,
+    trade_oid: ObjectId,
+    exit_price: float,
+    size: int,
+    lessons_learned: Optional[str] = None,
+) -> Dict:
+    """Close `size` shares of an open trade.
+
+    The open trade keeps the remaining size; the closed shares are inserted
+    as a separate closed trade pointing back via `parent_trade_id`. Closing
+    the full size falls through to `close_trade`.
+    """
+    if size <= 0:
+        raise TradeCloseError("Close size must be positive")
+
+    pending = {
+        "_id": ObjectId(),
+        "size": size,
+        "exitPrice": exit_price,
+        "exitDate": datetime.now(),
+        "lessonsLearned": lessons_learned,
+    }
+    remaining = await collection.find_one_and_update(
+        {"_id": trade_oid, "user_id": user_id, "status": "open", "size": {"$gt": size}},
+        {"$inc": {"size": -size}, "$push": {"pending_closes": pending}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if remaining is None:
+        trade = await _find_close_target(collection, user_id, trade_oid)
+        if trade and trade.get("status") == "open" and trade.get("size") == size:
+            return await close_trade(collection, user_id, trade_oid, exit_price, lessons_learned)
+        raise _close_failure(trade)
+
+    closed_part = _closed_part(remaining, pending)
+    try:
+        await _insert_closed_part(collection, closed_part)
+    except Exception:
+        # The insert may have landed despite the error; if this lookup fails too, recovery decides
+        if await collection.find_one({"_id": pending["_id"]}, {"_id": 1}) is None:
+            # Give the shares back to the open trade
+            await collection.update_one(
+                {"_id": trade_oid, "pending_closes._id": pending["_id"]},
+                {"$inc": {"size": size}, "$pull": {"pending_closes": {"_id": pending["_id"]}}},
+            )
+            raise
+    await collection.update_one({"_id": trade_oid}, {"$pull": {"pending_closes": {"_id": pending["_id"]}}})
+    return closed_part
+
+
+def _closed_part(parent: Dict, pending: Dict) -> Dict:
+    closed_part = {key: value for key, value in parent.items() if key not in ("_id", "pending_closes")}
+    closed_part.update({
+        **pending,
+        "status": "closed",
+        "result_pnl": calculate_result_pnl(parent["entryPrice"], pending["exitPrice"], pending["size"]),
+        "parent_trade_id": str(parent["_id"]),
+    })
+    return closed_part
+
+
+async def _insert_closed_part(collection, closed_part: Dict):
+    try:
+        await collection.insert_one(closed_part)
+    except DuplicateKeyError:
+        # Already inserted (by recovery, or before a retried pull)
+        pass
+
+
+async def recover_pending_closes(collection) -> int:
+    """Finish partial closes interrupted between their two writes; returns how many were completed."""
+    recovered = 0
+    cutoff = datetime.now(timezone.utc) - PENDING_CLOSE_GRACE
+    async for parent in collection.find({"pending_closes._id": {"$exists": True}}):
+        for pending in parent["pending_closes"]:
+            if pending["_id"].generation_time > cutoff:
+                # Possibly still in progress on another worker
+                continue
+            await _insert_closed_part(collection, _closed_part(parent, pending))
+            await collection.update_one({"_id": parent["_id"]}, {"$pull": {"pending_closes": {"_id": pending["_id"]}}})
+            recovered += 1
+    return recovered
@@ -0,0 +1,137 @@
+"""
+Streaming export of trades as CSV or NDJSON.
+
+Documents are read straight from a Motor cursor and written into small text
+chunks, so memory use stays flat no matter how many trades are exported.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from bson import ObjectId
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+EXPORT_FIELDS = [
+    "_id",
+    "ticker",
+    "direction",
+    "status",
+    "entryPrice",
+    "stopLoss",
+    "size",
+    "entryDate",
+    "exitPrice",
+    "exitDate",
+    "result_pnl",
+    "setup_id",
+    "marketConditions",
+    "emotions",
+    "lessonsLearned",
+]
+
+CURSOR_BATCH_SIZE = 5000
+FLUSH_SIZE = 64 * 1024
+
+
+def parse_export_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated field list; returns None if any field is unknown."""
+    if not fields:
+        return list(EXPORT_FIELDS)
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    if not selected or any(field not in EXPORT_FIELDS for field in selected):
+        return None
+    return selected
+
+
+def build_export_query(
+    user_id: str,
+    status: Optional[str] = None,
+    ticker: Optional[str] = None,
+    setup_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> Dict:
+    query: Dict = {"user_id": user_id}
+    if status:
+        query["status"] = status
+    if ticker:
+        query["ticker"] = ticker
+    if setup_id:
+        query["setup_id"] = setup_id
+    if start_date or end_date:
+        query["entryDate"] = {}
+        if start_date:
+            query["entryDate"]["$gte"] = start_date
+        if end_date:
+            query["entryDate"]["$lte"] = end_date
+    return query
+
+
+def open_export_cursor(collection, query: Dict, fields: List[str]):
+    """Cursor over the matching trades, projected to the exported fields."""
+    projection = {field: 1 for field in fields}
+    if "_id" not in fields:
+        projection["_id"] = 0
+    return collection.find(query, projection, batch_size=CURSOR_BATCH_SIZE).sort("entryDate", 1)
+
+
+def _to_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def stream_csv(cursor, fields: List[str]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+
+    async for doc in cursor:
+        writer.writerow([_to_text(doc.get(field)) for field in fields])
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def stream_ndjson(cursor, fields: List[str]) -> AsyncIterator[str]:
+    chunk: List[str] = []
+    size = 0
+
+    async for doc in cursor:
+        line = json.dumps({field: doc.get(field) for field in fields}, default=_json_default)
+        chunk.append(line)
+        size += len(line) + 1
+        if size >= FLUSH_SIZE:
+            chunk.append("")
+            yield "\n".join(chunk)
+            chunk, size = [], 0
+
+    if chunk:
+        chunk.append("")
+        yield "\n".join(chunk)
+
+
+def stream_trades(cursor, fields: List[str], file_format: str) -> AsyncIterator[str]:
+    if file_format == "csv":
+        return stream_csv(cursor, fields)
+    return stream_ndjson(cursor, fields)
@@ -0,0 +1,324 @@
+"""
+Bulk import of trade history from broker exports (CSV or NDJSON).
+
+The upload is read in fixed-size chunks and parsed row by row, so the file
+is never held in memory as a whole. Valid rows are written with unordered
+`insert_many` batches while the next batch is being parsed.
+"""
+import asyncio
+import codecs
+import csv
+import heapq
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import UploadFile
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from app.models.trade import TradeImportError, TradeImportResult, TradeImportRow
+from app.services.pnl_service import calculate_result_pnl
+
+READ_CHUNK_SIZE = 64 * 1024
+INSERT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+SUPPORTED_FORMATS = ("csv", "ndjson")
+
+# Column names used by common broker exports, normalized to lowercase
+# alphanumerics, mapped onto our trade fields
+FIELD_ALIASES = {
+    "ticker": "ticker",
+    "symbol": "ticker",
+    "tradingsymbol": "ticker",
+    "instrument": "ticker",
+    "direction": "direction",
+    "side": "direction",
+    "action": "direction",
+    "tradetype": "direction",
+    "buysell": "direction",
+    "entryprice": "entryPrice",
+    "price": "entryPrice",
+    "avgprice": "entryPrice",
+    "averageprice": "entryPrice",
+    "fillprice": "entryPrice",
+    "stoploss": "stopLoss",
+    "stop": "stopLoss",
+    "sl": "stopLoss",
+    "size": "size",
+    "qty": "size",
+    "quantity": "size",
+    "shares": "size",
+    "entrydate": "entryDate",
+    "date": "entryDate",
+    "tradedate": "entryDate",
+    "ordertime": "entryDate",
+    "orderexecutiontime": "entryDate",
+    "exitprice": "exitPrice",
+    "closeprice": "exitPrice",
+    "exitdate": "exitDate",
+    "closedate": "exitDate",
+    "status": "status",
+    "marketconditions": "marketConditions",
+    "emotions": "emotions",
+    "lessonslearned": "lessonsLearned",
+    "setupid": "setup_id",
+}
+
+DIRECTION_ALIASES = {
+    "bullish": "bullish",
+    "buy": "bullish",
+    "long": "bullish",
+    "b": "bullish",
+    "bearish": "bearish",
+    "sell": "bearish",
+    "short": "bearish",
+    "s": "bearish",
+}
+
+
+def resolve_import_format(requested: Optional[str], filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Pick the upload format from the explicit parameter, file extension or content type."""
+    if requested:
+        requested = requested.lower()
+        return requested if requested in SUPPORTED_FORMATS else None
+
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if name.endswith(".csv"):
+        return "csv"
+
+    content_type = (content_type or "").lower()
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    if "csv" in content_type:
+        return "csv"
+    return None
+
+
+def _canonical_field(name: str) -> Optional[str]:
+    key = "".join(ch for ch in str(name).lower() if ch.isalnum())
+    return FIELD_ALIASES.get(key)
+
+
+def _normalize_row(raw: Dict) -> Dict:
+    """Map broker column names and values onto `TradeImportRow` fields."""
+    row = {}
+    for key, value in raw.items():
+        field = _canonical_field(key)
+        if field is None or field in row:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if value == "":
+                continue
+        if value is None:
+            continue
+        row[field] = value
+
+    direction = row.get("direction")
+    if isinstance(direction, str):
+        row["direction"] = DIRECTION_ALIASES.get(direction.lower(), direction)
+
+    status = row.get("status")
+    if isinstance(status, str):
+        row["status"] = status.lower()
+    elif "exitPrice" in row:
+        row["status"] = "closed"
+
+    return row
+
+
+def build_trade_document(raw: Dict, user_id: str, now: datetime) -> Tuple[Optional[Dict], List[str]]:
+    """Validate one imported row and build the document to insert.
+
+    Returns (document, []) for a valid row or (None, errors) otherwise.
+    """
+    try:
+        row = TradeImportRow.model_validate(_normalize_row(raw))
+    except ValidationError as e:
+        return None, [
+            f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+            for err in e.errors()
+        ]
+
+    if row.direction not in ("bullish", "bearish"):
+        return None, [f"direction: unknown value '{row.direction}'"]
+    if row.status not in ("open", "closed"):
+        return None, [f"status: unknown value '{row.status}'"]
+    if row.status == "closed" and row.exitPrice is None:
+        return None, ["exitPrice: required for closed trades"]
+
+    doc = row.model_dump(exclude_none=True)
+    doc["user_id"] = user_id
+    doc.setdefault("entryDate", now)
+
+    if row.status == "closed":
+        doc.setdefault("exitDate", doc["entryDate"])
+        doc["result_pnl"] = calculate_result_pnl(row.entryPrice, row.exitPrice, row.size)
+
+    return doc, []
+
+
+async def _iter_lines(upload: UploadFile) -> AsyncIterator[str]:
+    """Yield decoded lines (with line endings) from the upload, one chunk at a time."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    while True:
+        chunk = await upload.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def _iter_csv_rows(upload: UploadFile) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    header: Optional[List[str]] = None
+    record: List[str] = []
+    quotes = 0
+    row_number = 0
+
+    async for line in _iter_lines(upload):
+        record.append(line)
+        quotes += line.count('"')
+        # An odd number of quotes means a quoted field continues on the next line
+        if quotes % 2:
+            continue
+
+        text = "".join(record)
+        record, quotes = [], 0
+        fields = next(csv.reader([text]), [])
+        if not any(field.strip() for field in fields):
+            continue
+
+        if header is None:
+            header = fields
+            continue
+
+        row_number += 1
+        if len(fields) > len(header):
+            yield row_number, None, f"row has {len(fields)} columns, header has {len(header)}"
+            continue
+        yield row_number, dict(zip(header, fields)), None
+
+    if record:
+        yield row_number + 1, None, "unterminated quoted field at end of file"
+
+
+async def _iter_ndjson_rows(upload: UploadFile) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    row_number = 0
+    async for line in _iter_lines(upload):
+        line = line.strip()
+        if not line:
+            continue
+
+        row_number += 1
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(obj, dict):
+            yield row_number, None, "expected a JSON object"
+            continue
+        yield row_number, obj, None
+
+
+class _ErrorReport:
+    """Per-row error collector, bounded so a bad file can't blow up the response.
+
+    Batches finish out of order, so the report keeps the lowest-numbered
+    failing rows (a max-heap on row number) rather than the first reported.
+    """
+
+    def __init__(self):
+        self.failed = 0
+        self._heap: List[Tuple[int, List[str]]] = []  # (-row, messages)
+
+    def add(self, row: int, messages: List[str]):
+        self.failed += 1
+        if len(self._heap) < MAX_REPORTED_ERRORS:
+            heapq.heappush(self._heap, (-row, messages))
+        elif row < -self._heap[0][0]:
+            heapq.heapreplace(self._heap, (-row, messages))
+
+    @property
+    def errors(self) -> List[TradeImportError]:
+        return [TradeImportError(row=-neg_row, errors=messages) for neg_row, messages in sorted(self._heap, reverse=True)]
+
+
+async def _insert_batch(collection, docs: List[Dict], rows: List[int], report: _ErrorReport) -> int:
+    """Insert a batch unordered; failed documents are reported against their row."""
+    try:
+        result = await collection.insert_many(docs, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            report.add(rows[write_error["index"]], [write_error.get("errmsg", "write failed")])
+        return e.details.get("nInserted", 0)
+
+
+async def import_trades(upload: UploadFile, file_format: str, user_id: str, collection) -> TradeImportResult:
+    """Stream an uploaded broker export into the trades collection."""
+    rows = _iter_csv_rows(upload) if file_format == "csv" else _iter_ndjson_rows(upload)
+    report = _ErrorReport()
+    now = datetime.now()
+    total_rows = 0
+    imported = 0
+
+    batch: List[Dict] = []
+    batch_rows: List[int] = []
+    # At most one batch is being written while the next one is parsed
+    in_flight: Optional[asyncio.Task] = None
+
+    try:
+        async for row_number, raw, error in rows:
+            total_rows += 1
+            if error is not None:
+                report.add(row_number, [error])
+                continue
+
+            doc, errors = build_trade_document(raw, user_id, now)
+            if errors:
+                report.add(row_number, errors)
+                continue
+
+            batch.append(doc)
+            batch_rows.append(row_number)
+            if len(batch) >= INSERT_BATCH_SIZE:
+                if in_flight is not None:
+                    task, in_flight = in_flight, None
+                    imported += await task
+                in_flight = asyncio.create_task(_insert_batch(collection, batch, batch_rows, report))
+                batch, batch_rows = [], []
+
+        if batch:
+            if in_flight is not None:
+                task, in_flight = in_flight, None
+                imported += await task
+            in_flight = asyncio.create_task(_insert_batch(collection, batch, batch_rows, report))
+        if in_flight is not None:
+            task, in_flight = in_flight, None
+            imported += await task
+    finally:
+        if in_flight is not None:
+            # Only reached while another error propagates: let the write finish without masking it
+            await asyncio.gather(in_flight, return_exceptions=True)
+
+    errors = report.errors
+    return TradeImportResult(
+        total_rows=total_rows,
+        imported=imported,
+        failed=report.failed,
+        errors=errors,
+        errors_truncated=report.failed > len(errors),
+    )
@@ -1,6 +1,8 @@
 from fastapi import WebSocket
 from typing import Dict, Set, List
 
+from app.core.metrics import WEBSOCKET_MESSAGES_SENT
+
 
 class ConnectionManager:
     def __init__(self):
@@ -26,6 +28,11 @@ class ConnectionManager:
         # Return all unique tickers currently needed by any user
         return self.get_all_unique_subscriptions()
 
+    def unsubscribe(self, user_id: str, tickers: List[str]):
+        subscriptions = self.user_subscriptions.get(user_id)
+        if subscriptions is not None:
+            subscriptions.difference_update(tickers)
+
     def get_all_unique_subscriptions(self) -> Set[str]:
         all_tickers = set()
         for tickers in self.user_subscriptions.values():
@@ -40,3 +47,4 @@ class ConnectionManager:
                     "ticker": ticker,
                     "price": price
                 })
+                WEBSOCKET_MESSAGES_SENT.inc("price_update")
@@ -0,0 +1,94 @@
+"""
+Benchmark: list endpoint serialization, Pydantic response_model path vs orjson fast path.
+
+Builds 10k trade documents as Motor would return them and times both ways
+of turning them into a JSON response body.
+
+Run from the project root:
+    python -m benchmarks.bench_serialization
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.core.serialization import DocumentShape, documents_response
+from app.models.trade import TradeOut
+
+N_TRADES = 10_000
+ROUNDS = 5
+
+
+def make_trade_documents(n: int) -> List[dict]:
+    start = datetime(2024, 1, 1)
+    docs = []
+    for i in range(n):
+        entry = round(random.uniform(50, 500), 2)
+        doc = {
+            "_id": ObjectId(),
+            "user_id": "user_bench",
+            "ticker": random.choice(["AAPL", "MSFT", "INFY", "TSLA", "NVDA"]),
+            "direction": random.choice(["bullish", "bearish"]),
+            "entryPrice": entry,
+            "stopLoss": round(entry * 0.95, 2),
+            "size": random.randint(1, 500),
+            "status": "open",
+            "entryDate": start + timedelta(minutes=i),
+            "marketConditions": "Trending",
+        }
+        if i % 2:
+            doc.update({
+                "status": "closed",
+                "exitPrice": round(entry * 1.03, 2),
+                "exitDate": start + timedelta(minutes=i, hours=3),
+                "result_pnl": round(entry * 0.03 * doc["size"], 2),
+            })
+        docs.append(doc)
+    return docs
+
+
+async def pydantic_path(docs: List[dict], field) -> bytes:
+    """What the routes did before: model_validate per doc, then response_model serialization."""
+    trades = [TradeOut.model_validate(doc) for doc in docs]
+    content = await serialize_response(field=field, response_content=trades, by_alias=True)
+    return JSONResponse(content).body
+
+
+def fast_path(docs: List[dict], shape: DocumentShape) -> bytes:
+    return documents_response(docs, shape).body
+
+
+def timed(fn, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    import asyncio
+
+    docs = make_trade_documents(N_TRADES)
+    field = create_model_field(name="Response_list", type_=List[TradeOut], mode="serialization")
+    shape = DocumentShape(TradeOut)
+    loop = asyncio.new_event_loop()
+
+    slow = timed(lambda: loop.run_until_complete(pydantic_path(docs, field)), ROUNDS)
+    fast = timed(lambda: fast_path(docs, shape), ROUNDS)
+    loop.close()
+
+    print(f"{N_TRADES} trades, best of {ROUNDS}")
+    print(f"  pydantic response_model: {slow * 1000:8.1f} ms  ({N_TRADES / slow:,.0f} docs/s)")
+    print(f"  orjson fast path:        {fast * 1000:8.1f} ms  ({N_TRADES / fast:,.0f} docs/s)")
+    print(f"  speedup: {slow / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare two benchmark suite result files.
+
+Prints each case's p50/p99 and throughput side by side with the change, and
+flags p99 regressions above the threshold.
+
+    python -m benchmarks.compare before.json after.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def _key(result: dict) -> str:
+    return f"{result['name']} {json.dumps(result['params'], sort_keys=True)}"
+
+
+def _change(old, new) -> str:
+    if not old or new is None:
+        return "    n/a"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before", type=Path)
+    parser.add_argument("after", type=Path)
+    parser.add_argument("--threshold", type=float, default=10.0, help="p99 increase (%%) reported as a regression")
+    args = parser.parse_args(argv)
+
+    before = json.loads(args.before.read_text())
+    after = json.loads(args.after.read_text())
+    print(f"before: {before['meta'].get('commit')} ({before['meta'].get('backend')})")
+    print(f"after:  {after['meta'].get('commit')} ({after['meta'].get('backend')})")
+
+    old_results = {_key(result): result for result in before["results"]}
+    regressions = 0
+    for result in after["results"]:
+        key = _key(result)
+        old = old_results.get(key)
+        if old is None:
+            print(f"  {key:<70} (new case)")
+            continue
+        p99_change = (result["p99_ms"] - old["p99_ms"]) / old["p99_ms"] * 100 if old["p99_ms"] else 0.0
+        flag = "  REGRESSION" if p99_change > args.threshold else ""
+        if flag:
+            regressions += 1
+        print(
+            f"  {key:<70} p50 {old['p50_ms']:9.3f} -> {result['p50_ms']:9.3f} ms {_change(old['p50_ms'], result['p50_ms'])}"
+            f"  p99 {old['p99_ms']:9.3f} -> {result['p99_ms']:9.3f} ms {_change(old['p99_ms'], result['p99_ms'])}"
+            f"  thr {_change(old['throughput_per_s'], result['throughput_per_s'])}{flag}"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+Benchmark suite for the API, price and WebSocket hot paths.
+
+Requests go through the full ASGI app (middleware, routing, dependencies)
+via httpx's in-process transport, so no server or network is involved.
+Authentication is overridden to a fixed benchmark user. Prices come from
+the mock price service.
+
+MongoDB is the one at --mongo-url (or BENCH_MONGO_URL; a throwaway
+`bench_trading_journal` database is created and dropped). Without one, the
+in-memory mongomock-motor stand-in is used if installed
+(`pip install mongomock-motor`); its timings are only comparable with other
+mongomock runs.
+
+Each case reports p50/p95/p99 latency and throughput, and the whole run is
+written to JSON so results can be compared between commits with
+`python -m benchmarks.compare old.json new.json`.
+
+Run from the project root:
+    python -m benchmarks.suite
+    python -m benchmarks.suite --sizes 10,1000 --requests 200 --output before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Settings are read at import time; the suite needs none of the real services
+os.environ.setdefault("MONGO_CONNECTION_STRING", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB_NAME", "bench_trading_journal")
+os.environ.setdefault("FINNHUB_API_KEY", "bench")
+os.environ.setdefault("EXCHANGE_RATE_API_KEY", "bench")
+os.environ.setdefault("USE_MOCK_PRICES", "true")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+from bson import ObjectId  # noqa: E402
+
+from benchmarks.bench_serialization import make_trade_documents  # noqa: E402
+
+BENCH_USER = "user_bench"
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(name: str, params: Dict, latencies: List[float], wall: float) -> Dict:
+    latencies = sorted(latencies)
+    result = {
+        "name": name,
+        "params": params,
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 4),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 4),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 4),
+        "throughput_per_s": round(len(latencies) / wall, 1) if wall else None,
+    }
+    print(
+        f"  {name:<28} {json.dumps(params):<40} "
+        f"p50 {result['p50_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms  "
+        f"p99 {result['p99_ms']:9.3f} ms  {result['throughput_per_s'] or 0:10,.0f}/s"
+    )
+    return result
+
+
+async def measure(
+    operation: Callable[[int], Awaitable[None]],
+    iterations: int,
+    concurrency: int,
+    before: Optional[Callable[[int], None]] = None,
+) -> tuple:
+    """Run `operation(i)` for i in range(iterations) on `concurrency` workers.
+
+    `before(i)` runs untimed ahead of each operation (e.g. to invalidate a cache).
+    """
+    latencies: List[float] = []
+    counter = iter(range(iterations))
+
+    async def worker():
+        for i in counter:
+            if before is not None:
+                before(i)
+            start = time.perf_counter()
+            await operation(i)
+            latencies.append(time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - wall_start
+
+
+class FakeWebSocket:
+    """Accepts messages like a connected client, without any I/O."""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_json(self, data):
+        self.sent += 1
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def connect_database(mongo_url: Optional[str]) -> str:
+    from app.db import database
+
+    if mongo_url:
+        os.environ["MONGO_CONNECTION_STRING"] = mongo_url
+        database.settings.MONGO_CONNECTION_STRING = mongo_url
+        database.init_database()
+        return "mongodb"
+
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("No --mongo-url/BENCH_MONGO_URL given and mongomock-motor is not installed")
+    database.client = AsyncMongoMockClient()
+    database.database = database.client[os.environ["MONGO_DB_NAME"]]
+    return "mongomock"
+
+
+async def seed_trades(collection, n: int) -> List[ObjectId]:
+    """Replace the benchmark user's trades with n documents (half open); returns the open ids."""
+    await collection.delete_many({"user_id": BENCH_USER})
+    docs = make_trade_documents(n)
+    for start in range(0, len(docs), 10_000):
+        await collection.insert_many(docs[start:start + 10_000])
+    return [doc["_id"] for doc in docs if doc["status"] == "open"]
+
+
+async def bench_api(client: httpx.AsyncClient, collection, sizes: List[int], requests: int, concurrency: int) -> List[Dict]:
+    from app.services.read_cache import read_cache
+
+    results = []
+
+    async def get(path: str):
+        response = await client.get(path)
+        response.raise_for_status()
+
+    latencies, wall = await measure(lambda i: get("/api/v1/trades/quotes/TCS?use_mock=true"), requests, concurrency)
+    results.append(summarize("get_quote", {"source": "mock"}, latencies, wall))
+
+    for n in sizes:
+        await seed_trades(collection, n)
+        iterations = requests if n <= 1000 else max(10, requests // 20)
+        for name, path in (("get_open_trades", "/api/v1/trades/open"), ("get_statistics", "/api/v1/trades/statistics")):
+            # Cold: every request misses the read cache and queries MongoDB
+            latencies, wall = await measure(
+                lambda i, path=path: get(path), iterations, concurrency, before=lambda i: read_cache.bump(BENCH_USER)
+            )
+            results.append(summarize(name, {"trades": n, "cache": "cold"}, latencies, wall))
+            latencies, wall = await measure(lambda i, path=path: get(path), iterations, concurrency)
+            results.append(summarize(name, {"trades": n, "cache": "warm"}, latencies, wall))
+
+    open_ids = await seed_trades(collection, max(2 * requests, 1000))
+
+    async def close(i: int):
+        response = await client.put(f"/api/v1/trades/{open_ids[i]}/close", json={"exitPrice": 123.45})
+        response.raise_for_status()
+
+    latencies, wall = await measure(close, min(requests, len(open_ids)), concurrency)
+    results.append(summarize("close_trade", {"open_trades": len(open_ids)}, latencies, wall))
+    await collection.delete_many({"user_id": BENCH_USER})
+    return results
+
+
+async def bench_alerts(open_trades: int, users: int, tickers: int, iterations: int) -> List[Dict]:
+    from app.services.alert_service import StopLossIndex, check_for_alerts, stop_loss_index
+    from app.services.websocket_manager import ConnectionManager
+
+    manager = ConnectionManager()
+    ticker_names = [f"T{t:04d}" for t in range(tickers)]
+    for u in range(users):
+        user_id = f"user_{u}"
+        manager.active_connections[user_id] = FakeWebSocket()
+        manager.user_subscriptions[user_id] = set(random.sample(ticker_names, min(10, tickers)))
+
+    index = StopLossIndex()
+    for i in range(open_trades):
+        direction = random.choice(["bullish", "bearish"])
+        stop = random.uniform(90, 110)
+        index.add(f"user_{i % users}", f"trade_{i}", random.choice(ticker_names), direction, stop)
+    index.loaded = True
+
+    # check_for_alerts reads the module-level index
+    saved = (stop_loss_index._by_ticker, stop_loss_index._ticker_of, stop_loss_index._alerted, stop_loss_index.loaded)
+    stop_loss_index._by_ticker, stop_loss_index._ticker_of, stop_loss_index._alerted, stop_loss_index.loaded = (
+        index._by_ticker, index._ticker_of, index._alerted, True
+    )
+    try:
+        latencies, wall = await measure(
+            lambda i: check_for_alerts(ticker_names[i % tickers], 100.0, manager), iterations, 1
+        )
+    finally:
+        stop_loss_index._by_ticker, stop_loss_index._ticker_of, stop_loss_index._alerted, stop_loss_index.loaded = saved
+    params = {"open_trades": open_trades, "users": users, "tickers": tickers}
+    return [summarize("check_for_alerts", params, latencies, wall)]
+
+
+async def bench_broadcast(sockets: int, iterations: int) -> List[Dict]:
+    from app.services.websocket_manager import ConnectionManager
+
+    manager = ConnectionManager()
+    for u in range(sockets):
+        user_id = f"user_{u}"
+        manager.active_connections[user_id] = FakeWebSocket()
+        manager.user_subscriptions[user_id] = {"TCS"} if u % 2 == 0 else {"INFY"}
+
+    latencies, wall = await measure(lambda i: manager.broadcast_price("TCS", 100.0 + i % 10), iterations, 1)
+    return [summarize("broadcast_price", {"sockets": sockets, "subscribed": (sockets + 1) // 2}, latencies, wall)]
+
+
+async def run(args) -> Dict:
+    backend = connect_database(args.mongo_url)
+
+    from app.core import auth
+    from app.core.resources import resources
+    from app.db.database import get_database, get_trades_collection
+    from app.main import app
+
+    async def bench_user_id():
+        return BENCH_USER
+
+    app.dependency_overrides[auth.get_current_user_id] = bench_user_id
+    await resources.start()
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            print("API")
+            results += await bench_api(client, get_trades_collection(), args.sizes, args.requests, args.concurrency)
+        print("Alerts")
+        results += await bench_alerts(args.alert_trades, users=1000, tickers=500, iterations=args.requests)
+        print("WebSocket")
+        results += await bench_broadcast(args.sockets, iterations=args.requests)
+    finally:
+        if backend == "mongodb":
+            await get_database().client.drop_database(os.environ["MONGO_DB_NAME"])
+        await resources.stop()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": backend,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCH_MONGO_URL"))
+    parser.add_argument("--sizes", default="10,1000,100000", type=lambda s: [int(x) for x in s.split(",")],
+                        help="Trade counts for the list/statistics cases")
+    parser.add_argument("--requests", default=500, type=int, help="Requests per case")
+    parser.add_argument("--concurrency", default=10, type=int)
+    parser.add_argument("--alert-trades", default=100_000, type=int, help="Open trades in the stop-loss index")
+    parser.add_argument("--sockets", default=1000, type=int, help="Connected WebSocket clients for broadcast")
+    parser.add_argument("--output", type=Path, help="Default: benchmarks/results/<timestamp>-<commit>.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = RESULTS_DIR / f"{stamp}-{report['meta']['commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import { WebSocketMessage, PriceUpdate, Alert } from '../types';
+import { authService } from './auth';
 
 type MessageHandler = (message: WebSocketMessage) => void;
 type PriceHandler = (update: PriceUpdate) => void;
@@ -25,7 +26,9 @@ export class WebSocketService {
     }
 
     try {
-      this.ws = new WebSocket(this.wsUrl);
+      // Read on every attempt, so a reconnect uses the current access token
+      const token = authService.getToken();
+      this.ws = new WebSocket(token ? `${this.wsUrl}?token=${encodeURIComponent(token)}` : this.wsUrl);
 
       this.ws.onopen = () => {
         console.log('WebSocket connected');
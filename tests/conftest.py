@@ -0,0 +1,7 @@
+import os
+
+# Settings are required at import time; tests never reach these services
+os.environ.setdefault("MONGO_CONNECTION_STRING", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB_NAME", "trading_journal_test")
+os.environ.setdefault("FINNHUB_API_KEY", "test")
+os.environ.setdefault("EXCHANGE_RATE_API_KEY", "test")
@@ -0,0 +1,34 @@
+from starlette.requests import Request
+
+from app.core.client_ip import client_ip
+
+
+def make_request(peer, forwarded=()):
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded]
+    return Request({"type": "http", "headers": headers, "client": (peer, 50000)})
+
+
+def test_direct_connection_uses_peer_address():
+    request = make_request("203.0.113.7", ["198.51.100.1"])
+    assert client_ip(request, trusted_hops=0) == "203.0.113.7"
+
+
+def test_behind_proxy_uses_forwarded_address():
+    request = make_request("10.0.0.2", ["203.0.113.7"])
+    assert client_ip(request, trusted_hops=1) == "203.0.113.7"
+
+
+def test_behind_proxy_ignores_client_supplied_entries():
+    # The client sent its own X-Forwarded-For; the proxy appended the real address
+    request = make_request("10.0.0.2", ["198.51.100.1, 203.0.113.7"])
+    assert client_ip(request, trusted_hops=1) == "203.0.113.7"
+
+
+def test_two_proxies_read_across_repeated_headers():
+    request = make_request("10.0.0.3", ["198.51.100.1, 203.0.113.7", "10.0.0.2"])
+    assert client_ip(request, trusted_hops=2) == "203.0.113.7"
+
+
+def test_missing_header_falls_back_to_peer():
+    request = make_request("10.0.0.2")
+    assert client_ip(request, trusted_hops=1) == "10.0.0.2"
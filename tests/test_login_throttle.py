@@ -0,0 +1,43 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.login_throttle import LoginThrottle
+from app.routers import auth
+
+
+def make_request(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 50000)})
+
+
+@pytest.fixture
+def throttle(monkeypatch):
+    throttle = LoginThrottle(attempts_per_ip=2, failures_per_username=100, window_seconds=60)
+    monkeypatch.setattr(auth, "login_throttle", throttle)
+    return throttle
+
+
+def test_direct_connections_are_limited_per_peer(throttle, monkeypatch):
+    monkeypatch.setattr(settings, "TRUSTED_PROXY_HOPS", 0)
+    for _ in range(2):
+        auth._admit("alice", make_request("203.0.113.7"))
+    with pytest.raises(HTTPException) as exc:
+        auth._admit("bob", make_request("203.0.113.7"))
+    assert exc.value.status_code == 429
+    # Another address has its own window
+    auth._admit("bob", make_request("203.0.113.8"))
+
+
+def test_clients_behind_proxy_get_their_own_window(throttle, monkeypatch):
+    monkeypatch.setattr(settings, "TRUSTED_PROXY_HOPS", 1)
+    for _ in range(2):
+        auth._admit("alice", make_request("10.0.0.2", "203.0.113.7"))
+    with pytest.raises(HTTPException):
+        auth._admit("alice", make_request("10.0.0.2", "203.0.113.7"))
+    # Same proxy peer, different client: not throttled
+    auth._admit("bob", make_request("10.0.0.2", "203.0.113.8"))
+    # Spoofing an extra entry doesn't escape the limit
+    with pytest.raises(HTTPException):
+        auth._admit("alice", make_request("10.0.0.2", "198.51.100.1, 203.0.113.7"))
@@ -0,0 +1,18 @@
+from app.core.quote_admission import QuoteAdmission
+
+
+def test_ip_rejection_does_not_spend_user_token():
+    admission = QuoteAdmission(per_user_per_minute=60, per_ip_per_minute=60, burst=1, max_upstream=10)
+    assert admission.acquire("alice", "203.0.113.7")
+    admission.release()
+    # The shared IP is out of tokens; bob's own bucket must stay full
+    assert not admission.acquire("bob", "203.0.113.7")
+    assert admission.acquire("bob", "203.0.113.8")
+
+
+def test_concurrency_rejection_charges_nothing():
+    admission = QuoteAdmission(per_user_per_minute=60, per_ip_per_minute=60, burst=1, max_upstream=1)
+    assert admission.acquire("alice", "203.0.113.7")
+    assert not admission.acquire("bob", "203.0.113.8")
+    admission.release()
+    assert admission.acquire("bob", "203.0.113.8")
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from app.core import refresh_tokens
+from app.core.auth import User
+from app.core.refresh_tokens import (
+    RefreshTokenError,
+    issue_refresh_token,
+    revoke_refresh_token,
+    rotate_refresh_token,
+)
+
+USER = User(user_id="u1", username="alice", email=None)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = AsyncMongoMockClient()["test"]["refresh_tokens"]
+    monkeypatch.setattr(refresh_tokens, "get_refresh_tokens_collection", lambda: collection)
+    return collection
+
+
+@pytest.mark.asyncio
+async def test_rotation_issues_a_new_token_of_the_same_family(collection):
+    token = await issue_refresh_token(USER)
+    user, new_token = await rotate_refresh_token(token)
+
+    assert user.user_id == "u1" and user.username == "alice"
+    assert new_token != token
+    docs = await collection.find().to_list(length=None)
+    assert len({doc["family_id"] for doc in docs}) == 1
+    # The new token works once more
+    await rotate_refresh_token(new_token)
+
+
+@pytest.mark.asyncio
+async def test_rotation_keeps_the_family_expiry(collection):
+    token = await issue_refresh_token(USER)
+    first = await collection.find_one({})
+    # Pretend the session started long ago
+    expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+    await collection.update_one({"_id": first["_id"]}, {"$set": {"expires_at": expires_at}})
+
+    _, new_token = await rotate_refresh_token(token)
+    rotated = await collection.find_one({"token_hash": refresh_tokens._token_hash(new_token)})
+    # MongoDB returns naive UTC datetimes
+    assert abs(rotated["expires_at"].replace(tzinfo=timezone.utc) - expires_at) < timedelta(seconds=1)
+
+
+@pytest.mark.asyncio
+async def test_reusing_a_rotated_token_revokes_the_family(collection):
+    token = await issue_refresh_token(USER)
+    _, new_token = await rotate_refresh_token(token)
+
+    with pytest.raises(RefreshTokenError):
+        await rotate_refresh_token(token)
+    # The legitimate holder's newer token is revoked too
+    with pytest.raises(RefreshTokenError):
+        await rotate_refresh_token(new_token)
+
+
+@pytest.mark.asyncio
+async def test_logout_revokes_the_session_only(collection):
+    token = await issue_refresh_token(USER)
+    other_session = await issue_refresh_token(USER)
+
+    assert await revoke_refresh_token(token) is True
+    with pytest.raises(RefreshTokenError):
+        await rotate_refresh_token(token)
+    await rotate_refresh_token(other_session)
+
+
+@pytest.mark.asyncio
+async def test_logout_with_unknown_token(collection):
+    assert await revoke_refresh_token("not-a-token") is False
+
+
+@pytest.mark.asyncio
+async def test_expired_token_is_rejected(collection):
+    token = await issue_refresh_token(USER)
+    await collection.update_many({}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+    with pytest.raises(RefreshTokenError):
+        await rotate_refresh_token(token)
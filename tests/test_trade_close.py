@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from app.services import trade_close_service
+from app.services.trade_close_service import partial_close_trade, recover_pending_closes
+
+
+@pytest_asyncio.fixture
+async def trades():
+    collection = AsyncMongoMockClient()["test"]["trades"]
+    await collection.insert_one({
+        "_id": ObjectId(), "user_id": "u1", "ticker": "TCS", "direction": "bullish",
+        "entryPrice": 100.0, "stopLoss": 90.0, "size": 10, "status": "open",
+    })
+    return collection
+
+
+async def open_trade(trades):
+    return await trades.find_one({"status": "open"})
+
+
+@pytest.mark.asyncio
+async def test_insert_error_after_the_write_landed_keeps_the_close(trades, monkeypatch):
+    async def insert_then_time_out(collection, closed_part):
+        await collection.insert_one(closed_part)
+        raise TimeoutError("no reply")
+
+    monkeypatch.setattr(trade_close_service, "_insert_closed_part", insert_then_time_out)
+    trade = await open_trade(trades)
+    await partial_close_trade(trades, "u1", trade["_id"], 110.0, 4)
+
+    trade = await open_trade(trades)
+    assert trade["size"] == 6 and trade["pending_closes"] == []
+    assert await trades.count_documents({"status": "closed", "size": 4}) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_insert_gives_the_shares_back(trades, monkeypatch):
+    async def fail(collection, closed_part):
+        raise TimeoutError("no reply")
+
+    monkeypatch.setattr(trade_close_service, "_insert_closed_part", fail)
+    trade = await open_trade(trades)
+    with pytest.raises(TimeoutError):
+        await partial_close_trade(trades, "u1", trade["_id"], 110.0, 4)
+
+    trade = await open_trade(trades)
+    assert trade["size"] == 10 and trade["pending_closes"] == []
+    assert await trades.count_documents({"status": "closed"}) == 0
+
+
+@pytest.mark.asyncio
+async def test_recovery_skips_closes_that_may_still_be_in_progress(trades):
+    trade = await open_trade(trades)
+    old_id = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(hours=1))
+    new_id = ObjectId()
+    for pending_id in (old_id, new_id):
+        pending = {"_id": pending_id, "size": 2, "exitPrice": 110.0, "exitDate": datetime.now(), "lessonsLearned": None}
+        await trades.update_one({"_id": trade["_id"]}, {"$inc": {"size": -2}, "$push": {"pending_closes": pending}})
+
+    assert await recover_pending_closes(trades) == 1
+    trade = await open_trade(trades)
+    assert [pending["_id"] for pending in trade["pending_closes"]] == [new_id]
+    assert await trades.count_documents({"_id": old_id, "status": "closed"}) == 1